@@ -0,0 +1,107 @@
+"""
+Coût par ligne de l'analyse de -progress FFmpeg.
+
+    python -m benchmarks.ffprogress_parser [--blocks 20000] [--repeat 5]
+
+ProgressParser.feed (str.partition, un instantané typé par bloc) comparé à
+l'ancienne chaîne de cinq expressions régulières de handle_progress, reprise
+ici telle quelle. Le flux est une suite de blocs de 12 lignes tels qu'écrits
+par FFmpeg ; le meilleur de `repeat` passages est retenu.
+"""
+import argparse
+import re
+import time
+from typing import Callable, List, Optional
+
+from isocode.utils.isoutils.ffprogress import ProgressParser
+
+BLOCK = """frame={frame}
+fps=48.12
+stream_0_0_q=28.0
+bitrate=1843.7kbits/s
+total_size={size}
+out_time_us={us}
+out_time_ms={us}
+out_time=00:{minutes:02d}:{seconds:09.6f}
+dup_frames=0
+drop_frames=0
+speed=2.01x
+progress=continue"""
+
+
+def stream(blocks: int) -> List[str]:
+    lines = []
+    for n in range(blocks):
+        us = n * 500_000
+        lines.extend(BLOCK.format(
+            frame=n * 12,
+            size=n * 115_000,
+            us=us,
+            minutes=us // 60_000_000 % 60,
+            seconds=us % 60_000_000 / 1_000_000,
+        ).splitlines())
+    return lines
+
+
+def parse_partition(lines: List[str]) -> int:
+    parser = ProgressParser()
+    snapshots = 0
+    for line in lines:
+        if parser.feed(line) is not None:
+            snapshots += 1
+    return snapshots
+
+
+def parse_regex(lines: List[str]) -> int:
+    """Ancienne boucle de handle_progress (avant ffprogress)"""
+    frame_count: Optional[int] = None
+    bitrate: Optional[str] = None
+    speed: Optional[float] = None
+    elapsed_time_us: Optional[int] = None
+    snapshots = 0
+    for line in lines:
+        if m := re.match(r"frame=(\d+)", line):
+            frame_count = int(m.group(1))
+        elif m := re.match(r"bitrate=([\d\.kKmM]+k?b/s)", line, re.I):
+            bitrate = m.group(1)
+        elif m := re.match(r"speed=([\d\.]+)x", line):
+            try:
+                speed = float(m.group(1))
+            except ValueError:
+                speed = None
+        elif m := re.match(r"out_time_ms=(\d+)", line):
+            elapsed_time_us = int(m.group(1))
+        elif m := re.match(r"progress=(\w+)", line):
+            snapshots += 1
+    return snapshots
+
+
+def best(func: Callable[[List[str]], int], lines: List[str], repeat: int) -> float:
+    """Meilleure durée par ligne, en µs"""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func(lines)
+        timings.append(time.perf_counter() - started)
+    return min(timings) / len(lines) * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--blocks", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    lines = stream(args.blocks)
+    assert parse_partition(lines) == parse_regex(lines) == args.blocks
+    partition = best(parse_partition, lines, args.repeat)
+    regex = best(parse_regex, lines, args.repeat)
+    per_block = len(lines) // args.blocks
+    print(f"{len(lines)} lignes, {args.blocks} blocs")
+    print(f"  ProgressParser.feed  {partition:6.2f} µs/ligne  {partition * per_block:6.1f} µs/bloc")
+    print(f"  regex (ancien)       {regex:6.2f} µs/ligne  {regex * per_block:6.1f} µs/bloc")
+    print(f"  rapport              {regex / partition:6.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Mémoire occupée par les tâches en file : JobRecord (__slots__ + instantanés
+de réglages partagés) comparé à un dictionnaire par tâche.
+
+    python -m benchmarks.job_memory [--jobs 10000] [--profiles 50]
+
+La référence "dict" reprend les champs simples de l'ancien EncodingTask.data
+avec une copie des réglages par tâche ; elle ne compte pas les objets
+Message/Client de Pyrogram que l'ancien format gardait en plus.
+"""
+import argparse
+import gc
+import tracemalloc
+from types import MappingProxyType
+from typing import Any, Callable, Dict, List
+
+from isocode.utils.isoutils.job import JobRecord, snapshot_settings
+
+BASE_SETTINGS: Dict[str, Any] = {
+    "video_codec": "libx265", "audio_codec": "aac", "preset": "superfast", "crf": 22,
+    "resolution": "original", "audio_bitrate": "192k", "threads": 0, "hwaccel": "auto",
+    "subtitle_action": "embed", "selected_subtitle_track": None, "audio_track_action": "first",
+    "extensions": "mkv", "tune": "film", "aspect": False, "cabac": False, "metadata": True,
+    "watermark": False, "hardsub": False, "subtitles": True, "normalize_audio": True,
+    "smart_remux": False, "low_gain_action": "warn", "pix_fmt": "yuv420p", "channels": "2",
+    "reframe": "0", "daily_limit": 10, "max_file": 2000,
+}
+
+
+def user_settings(n: int, profiles: int) -> Dict[str, Any]:
+    """Réglages tels que lus en base : un nouveau dictionnaire par tâche, `profiles` variantes"""
+    return {**BASE_SETTINGS, "crf": 18 + n % profiles}
+
+
+def fields(n: int) -> Dict[str, Any]:
+    return dict(
+        chat_id=-1001234567890,
+        message_id=100000 + n,
+        status_message_id=200000 + n,
+        user_id=5000000 + n % 500,
+        filepath=f"/app/download/{n:08d}_Episode {n % 24 + 1:02d} [1080p].mkv",
+        file_id=f"BQACAgQAAxkBAAI{n:020d}",
+        file_unique_id=f"AgAD{n:012d}",
+        file_name=f"Episode {n % 24 + 1:02d} [1080p].mkv",
+        file_size=1_400_000_000 + n,
+        duration=1420.5,
+    )
+
+
+def as_dict(n: int, profiles: int) -> Dict[str, Any]:
+    return {**fields(n), "settings": user_settings(n, profiles)}
+
+
+def as_record_unshared(n: int, profiles: int) -> JobRecord:
+    return JobRecord(settings=MappingProxyType(user_settings(n, profiles)), **fields(n))
+
+
+def as_record(n: int, profiles: int) -> JobRecord:
+    return JobRecord(settings=snapshot_settings(user_settings(n, profiles)), **fields(n))
+
+
+def measure(build: Callable[[int, int], Any], jobs: int, profiles: int) -> float:
+    """Octets alloués par tâche encore en file (tracemalloc)"""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    queue: List[Any] = [build(n, profiles) for n in range(jobs)]
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del queue
+    return used / jobs
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--jobs", type=int, default=10000)
+    parser.add_argument("--profiles", type=int, default=50)
+    args = parser.parse_args()
+
+    results = [
+        ("dict + copie des réglages", measure(as_dict, args.jobs, args.profiles)),
+        ("JobRecord, réglages non partagés", measure(as_record_unshared, args.jobs, args.profiles)),
+        ("JobRecord, réglages partagés", measure(as_record, args.jobs, args.profiles)),
+    ]
+    reference = results[0][1]
+    print(f"{args.jobs} tâches, {args.profiles} profils de réglages")
+    for label, per_job in results:
+        print(f"  {label:<34} {per_job:8.0f} o/tâche  {per_job * args.jobs / 1e6:7.2f} Mo  {per_job / reference:6.1%}")
+
+
+if __name__ == "__main__":
+    main()
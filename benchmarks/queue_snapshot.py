@@ -0,0 +1,96 @@
+"""
+Coût des instantanés de la file d'encodage.
+
+    python -m benchmarks.queue_snapshot [--sizes 10 100 1000] [--passes 2000]
+
+Pour chaque taille de file : durée d'une reconstruction complète de
+l'instantané (_publish_snapshot, class_stats compris), débit de l'ordonnanceur
+sans changement d'état (une passe toutes les 0,1 s en production), avec la
+republication systématique d'avant et avec le drapeau `_dirty`, et débit des
+lectures sans verrou (get_task_status). Aucune tâche n'est lancée : chaque
+classe a un slot, déjà occupé.
+"""
+import argparse
+import asyncio
+import time
+from typing import Callable
+
+from isocode.utils.isoutils.job import JobRecord, snapshot_settings
+from isocode.utils.isoutils.queue import EncodingQueue, EncodingTask
+from isocode.utils.isoutils.resources import ResourceClass
+
+SETTINGS = snapshot_settings({"video_codec": "libx264", "preset": "veryfast", "crf": 22})
+
+
+def job(n: int) -> JobRecord:
+    return JobRecord(
+        chat_id=-100123,
+        message_id=n,
+        status_message_id=n + 1,
+        user_id=42,
+        filepath=f"/app/download/42/{n}.mkv",
+        settings=SETTINGS,
+        duration=1400.0,
+    )
+
+
+def build_queue(size: int) -> EncodingQueue:
+    queue = EncodingQueue(max_concurrent=1, class_limits={c: 1 for c in ResourceClass})
+    classes = list(ResourceClass)
+    for n, resource_class in enumerate(classes):
+        task = EncodingTask(id=f"ACTIVE-{n}", job=job(n), status="PROCESSING", resource_class=resource_class)
+        task.start_time = time.time()
+        queue.active_tasks[task.id] = task
+    for n in range(size):
+        queue.queue.append(EncodingTask(
+            id=f"TASK-{n}",
+            job=job(n),
+            position=n + 1,
+            resource_class=classes[n % len(classes)],
+        ))
+    queue.task_counter = size + len(classes)
+    queue._publish_snapshot()
+    return queue
+
+
+def rate(func: Callable[[], None], count: int) -> float:
+    """Appels par seconde"""
+    started = time.perf_counter()
+    for _ in range(count):
+        func()
+    return count / (time.perf_counter() - started)
+
+
+def scheduler_pass_forced(queue: EncodingQueue) -> None:
+    queue._schedule()
+    queue._publish_snapshot()
+
+
+def scheduler_pass(queue: EncodingQueue) -> None:
+    queue._schedule()
+    if queue._dirty:
+        queue._publish_snapshot()
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--passes", type=int, default=2000)
+    args = parser.parse_args()
+
+    print(f"{'file':>6} {'instantané':>12} {'passe forcée':>14} {'passe _dirty':>14} {'lectures':>12}")
+    for size in args.sizes:
+        queue = build_queue(size)
+        count = max(args.passes * 10 // max(size, 1), 50)
+        build = 1e6 / rate(queue._publish_snapshot, count)
+        forced = rate(lambda: scheduler_pass_forced(queue), count)
+        dirty = rate(lambda: scheduler_pass(queue), count)
+        started = time.perf_counter()
+        for n in range(args.passes * 10):
+            await queue.get_task_status(f"TASK-{n % size}")
+        reads = args.passes * 10 / (time.perf_counter() - started)
+        print(f"{size:>6} {build:>9.0f} µs {forced:>10.0f} /s {dirty:>10.0f} /s {reads:>9.0f} /s")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,130 @@
+"""
+Temps CPU des renditions (/multi), en un processus et en processus séparés.
+
+Une même fenêtre de la source est encodée en un processus (décodage unique,
+split vers un scaler par résolution) puis en un processus par résolution.
+
+    python -m benchmarks.renditions_cpu SOURCE [--resolutions 1080p 720p 480p]
+        [--seconds 30] [--settings '{"video_codec": "libx264", "preset": "veryfast"}']
+        [--subtitles sous-titres.ass]
+
+Nécessite ffmpeg et une vraie source. Le temps CPU (utilisateur + système) est
+lu avec le builtin `times` du shell ; les sorties vont dans un répertoire
+temporaire supprimé à la fin.
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import sys
+import tempfile
+from dataclasses import dataclass
+from typing import Any, Dict, List, Sequence
+
+from isocode.utils.isoutils.executor import describe_exit, run_tool
+from isocode.utils.isoutils.ffmpeg import FFmpegCommandBuilder, output_extension
+from isocode.utils.isoutils.probe import probe
+from isocode.utils.isoutils.renditions import parse_renditions, playable_renditions, rendition_label
+
+TIMES_PATTERN = re.compile(r"(\d+)m([\d.]+)s")
+
+
+def timed(command: Sequence[str]) -> List[str]:
+    """Commande enveloppée dans un shell qui rapporte son temps CPU (builtin times)"""
+    return ['sh', '-c', '"$@" > /dev/null; rc=$?; times; exit $rc', 'sh', *command]
+
+
+def cpu_seconds(output: str) -> float:
+    """Temps CPU utilisateur + système des processus enfants, dernière ligne de times"""
+    lines = output.strip().splitlines()
+    if not lines:
+        return 0.0
+    return sum(int(minutes) * 60 + float(seconds) for minutes, seconds in TIMES_PATTERN.findall(lines[-1]))
+
+
+@dataclass(frozen=True)
+class RenditionBenchmark:
+    """Temps CPU d'une même fenêtre encodée en un processus (split) et en processus séparés"""
+    window: float
+    renditions: int
+    shared_cpu: float
+    separate_cpu: float
+
+    @property
+    def saving(self) -> float:
+        """Part du temps CPU économisée par le décodage unique"""
+        return 1 - self.shared_cpu / self.separate_cpu if self.separate_cpu else 0.0
+
+    def describe(self) -> str:
+        return (
+            f"{self.renditions} renditions sur {self.window:g}s: {self.shared_cpu:.1f}s CPU en un processus, "
+            f"{self.separate_cpu:.1f}s séparément ({self.saving:.0%} économisés)"
+        )
+
+
+async def measure(command: List[str], seek: List[str], timeout: float) -> float:
+    position = command.index('-i')
+    command[position:position] = seek
+    result = await run_tool(timed(command), timeout=timeout)
+    if not result.ok:
+        raise SystemExit(f"Encodage impossible ({describe_exit(result.returncode)}): {result.stderr.strip()[-300:]}")
+    return cpu_seconds(result.text)
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("source")
+    parser.add_argument("--resolutions", nargs="*", default=[])
+    parser.add_argument("--seconds", type=float, default=30)
+    parser.add_argument("--settings", type=json.loads, default={})
+    parser.add_argument("--subtitles")
+    args = parser.parse_args()
+
+    info = await probe(args.source)
+    if not info or not info.video:
+        sys.exit(f"{args.source}: aucune piste vidéo")
+    if info.duration < args.seconds * 2:
+        sys.exit(f"{args.source}: source plus courte que deux fenêtres de {args.seconds:g}s")
+    values = parse_renditions(args.resolutions)
+    if values is None:
+        sys.exit(f"Résolution inconnue : {' '.join(args.resolutions)}")
+    resolutions = playable_renditions(values, info)
+
+    user_settings: Dict[str, Any] = {'smart_remux': False, **args.settings}
+    seek = ['-ss', f'{(info.duration - args.seconds) / 2:.3f}', '-t', f'{args.seconds:g}']
+    if args.subtitles or user_settings.get("watermark"):
+        # Les filtres de sous-titres suivent la timeline de la source
+        seek.append('-copyts')
+    timeout = args.seconds * 30
+    extension = output_extension(user_settings)
+
+    with tempfile.TemporaryDirectory(prefix="renditions-") as workdir:
+        shared = await measure(await FFmpegCommandBuilder.build_multi_command(
+            user_settings,
+            args.source,
+            [(r, os.path.join(workdir, f"multi_{n}.{extension}")) for n, r in enumerate(resolutions)],
+            args.subtitles
+        ), seek, timeout)
+        separate = 0.0
+        for n, resolution in enumerate(resolutions):
+            cpu = await measure(await FFmpegCommandBuilder.build_command(
+                {**user_settings, 'resolution': resolution.value},
+                args.source,
+                os.path.join(workdir, f"single_{n}.{extension}"),
+                args.subtitles
+            ), seek, timeout)
+            print(f"  {rendition_label(resolution, info):>6} seule : {cpu:.1f}s CPU")
+            separate += cpu
+
+    benchmark = RenditionBenchmark(
+        window=args.seconds,
+        renditions=len(resolutions),
+        shared_cpu=shared,
+        separate_cpu=separate
+    )
+    print(benchmark.describe())
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,114 @@
+"""
+Durée réelle d'un encodage avec normalisation audio, en ligne ou à part.
+
+    python -m benchmarks.split_audio SOURCE [--settings '{"video_codec": "libx264", "preset": "veryfast"}']
+
+En ligne (LOUDNORM_TWO_PASS=False, défaut) : un seul processus FFmpeg, loudnorm
+en une passe sur chaque piste. À part (LOUDNORM_TWO_PASS=True) : vidéo encodée
+sans audio pendant que chaque piste est mesurée (-vn, analyses en parallèle)
+puis encodée en gain linéaire, et assemblage final sans ré-encodage.
+
+Nécessite ffmpeg et une vraie source, de préférence multi-pistes : toutes les
+pistes audio sont gardées (audio_track_action=all) sauf réglage contraire. Les
+sous-titres sont ignorés ; les sorties vont dans un répertoire temporaire.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List
+
+from isocode.utils.isoutils.executor import describe_exit, run_tool
+from isocode.utils.isoutils.ffmpeg import FFmpegCommandBuilder, _mux_streams, output_extension
+from isocode.utils.isoutils.loudness import measure_tracks, selected_audio
+from isocode.utils.isoutils.probe import probe
+
+DEFAULTS: Dict[str, Any] = {
+    "normalize_audio": True,
+    "audio_track_action": "all",
+    "subtitle_action": "none",
+    "smart_remux": False,
+}
+
+
+async def run(command: List[str], timeout: float) -> float:
+    """Durée réelle d'une commande FFmpeg, en secondes"""
+    started = time.time()
+    result = await run_tool(command, timeout=timeout, capture_stdout=False)
+    if not result.ok:
+        raise SystemExit(f"Encodage impossible ({describe_exit(result.returncode)}): {result.stderr.strip()[-300:]}")
+    return time.time() - started
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("source")
+    parser.add_argument("--settings", type=json.loads, default={})
+    args = parser.parse_args()
+
+    info = await probe(args.source)
+    if not info or not info.video or not info.audio:
+        sys.exit(f"{args.source}: pistes vidéo et audio requises")
+    user_settings = {**DEFAULTS, **args.settings}
+    tracks = selected_audio(user_settings, info)
+    timeout = info.duration * 10
+    extension = output_extension(user_settings)
+
+    with tempfile.TemporaryDirectory(prefix="split-audio-") as workdir:
+        inline = await run(await FFmpegCommandBuilder.build_command(
+            user_settings,
+            args.source,
+            os.path.join(workdir, f"inline.{extension}")
+        ), timeout)
+
+        video_path = os.path.join(workdir, "video.mkv")
+        audio_path = os.path.join(workdir, "audio.mka")
+        elapsed: Dict[str, float] = {}
+        started = time.time()
+
+        async def encode_video() -> None:
+            elapsed["video"] = await run(await FFmpegCommandBuilder.build_command(
+                {**user_settings, "audio_track_action": "none"},
+                args.source,
+                video_path
+            ), timeout)
+
+        async def encode_audio() -> None:
+            loudness = await measure_tracks(args.source, tracks, timeout=timeout)
+            elapsed["analyses"] = time.time() - started
+            await run(await FFmpegCommandBuilder.build_command(
+                user_settings,
+                args.source,
+                audio_path,
+                video=False,
+                loudness=loudness
+            ), timeout)
+            elapsed["audio"] = time.time() - started
+
+        await asyncio.gather(encode_video(), encode_audio())
+        success, error = await _mux_streams(
+            ['-i', video_path],
+            audio_path,
+            args.source,
+            user_settings,
+            os.path.join(workdir, f"split.{extension}"),
+            timeout=timeout
+        )
+        if not success:
+            sys.exit(f"Assemblage impossible : {error}")
+        split = time.time() - started
+
+    print(f"{args.source}: {info.duration:.0f}s, {len(tracks)} piste(s) audio")
+    print(f"  en ligne  {inline:8.1f}s")
+    print(
+        f"  à part    {split:8.1f}s  (vidéo {elapsed['video']:.1f}s, analyses {elapsed['analyses']:.1f}s, "
+        f"audio {elapsed['audio']:.1f}s, assemblage {split - max(elapsed['video'], elapsed['audio']):.1f}s)"
+    )
+    print(f"  écart     {1 - split / inline:8.1%}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
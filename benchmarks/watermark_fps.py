@@ -0,0 +1,97 @@
+"""
+Surcoût en fps du filigrane : libass à chaque image comparé à l'overlay pré-rendu.
+
+    python -m benchmarks.watermark_fps SOURCE [--seconds 30] [--resolution 720p]
+
+Une même fenêtre, prise au début du premier affichage du filigrane, est
+filtrée sans encodage (décodage, redimensionnement, filigrane, sortie null) :
+sans filigrane, avec libass, puis avec l'overlay du cache de filigranes.
+Nécessite ffmpeg (libass) et une vraie source.
+"""
+import argparse
+import asyncio
+import sys
+from dataclasses import dataclass
+
+from isocode.utils.database.database import Resolution
+from isocode.utils.isoutils.executor import describe_exit, run_tool
+from isocode.utils.isoutils.ffprogress import ProgressParser
+from isocode.utils.isoutils.probe import probe
+from isocode.utils.isoutils.watermark import attach, output_size, watermark_cache
+
+
+@dataclass(frozen=True)
+class WatermarkBenchmark:
+    """Débit de filtrage d'une même fenêtre sans filigrane, avec libass à chaque image et avec overlay"""
+    window: float
+    width: int
+    height: int
+    base_fps: float
+    libass_fps: float
+    overlay_fps: float
+
+    def overhead(self, fps: float) -> float:
+        """Part du débit perdue par rapport à la fenêtre sans filigrane"""
+        return 1 - fps / self.base_fps if self.base_fps else 0.0
+
+    def describe(self) -> str:
+        return (
+            f"filigrane {self.width}x{self.height} sur {self.window:g}s: {self.base_fps:.1f} fps sans, "
+            f"{self.libass_fps:.1f} fps libass ({self.overhead(self.libass_fps):+.1%}), "
+            f"{self.overlay_fps:.1f} fps overlay ({self.overhead(self.overlay_fps):+.1%})"
+        )
+
+
+async def measure(filepath: str, start: float, seconds: float, chain: str) -> float:
+    """Images filtrées par seconde réelle"""
+    cmd = [
+        'ffmpeg', '-hide_banner', '-nostats', '-loglevel', 'error', '-progress', 'pipe:1',
+        # -copyts : enable et libass suivent la timeline de la source
+        '-ss', f'{start:.3f}', '-t', f'{seconds:g}', '-copyts', '-i', filepath,
+        '-map', '0:v:0', '-an', '-sn', '-vf', chain or 'null', '-f', 'null', '-'
+    ]
+    result = await run_tool(cmd, timeout=seconds * 30)
+    if not result.ok or result.elapsed <= 0:
+        sys.exit(f"Filtrage impossible ({describe_exit(result.returncode)}): {result.stderr.strip()[-300:]}")
+    parser = ProgressParser()
+    frames = 0
+    for line in result.text.splitlines():
+        snapshot = parser.feed(line)
+        if snapshot:
+            frames = snapshot.frame
+    return frames / result.elapsed
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("source")
+    parser.add_argument("--seconds", type=float, default=30)
+    parser.add_argument("--resolution", default=Resolution.ORIGINAL.value, choices=[r.value for r in Resolution])
+    args = parser.parse_args()
+
+    info = await probe(args.source)
+    if not info or not info.video or info.duration < args.seconds:
+        sys.exit(f"{args.source}: piste vidéo d'au moins {args.seconds:g}s requise")
+    resolution = Resolution(args.resolution)
+    width, height = output_size({"resolution": resolution.value}, info)
+    overlay = await watermark_cache.overlay(width, height)
+    if overlay is None:
+        sys.exit(f"Filigrane impossible à pré-rendre en {width}x{height}")
+
+    start = overlay.windows[0][0] if overlay.windows else 0.0
+    start = min(start, info.duration - args.seconds)
+    scale = f"scale={resolution.ffmpeg_name}" if resolution != Resolution.ORIGINAL else ""
+
+    benchmark = WatermarkBenchmark(
+        window=args.seconds,
+        width=width,
+        height=height,
+        base_fps=await measure(args.source, start, args.seconds, scale),
+        libass_fps=await measure(args.source, start, args.seconds, attach(scale, None)),
+        overlay_fps=await measure(args.source, start, args.seconds, attach(scale, overlay))
+    )
+    print(benchmark.describe())
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -18,6 +18,19 @@ os.makedirs(encode_dir, exist_ok=True)
 download_dir = ensure_abs_path(settings.DOWNLOAD_DIR, "download")
 os.makedirs(download_dir, exist_ok=True)
 
+scratch_dir = ensure_abs_path(settings.SCRATCH_DIR, "scratch")
+os.makedirs(scratch_dir, exist_ok=True)
+
+# Répertoires de travail par tâche, éventuellement sur un support rapide
+jobs_dir = ensure_abs_path(settings.JOB_SCRATCH_DIR, os.path.join(scratch_dir, "jobs"))
+os.makedirs(jobs_dir, exist_ok=True)
+
+font_store_dir = ensure_abs_path(settings.FONT_STORE_DIR, "fonts")
+os.makedirs(font_store_dir, exist_ok=True)
+
+watermark_dir = ensure_abs_path(settings.WATERMARK_CACHE_DIR, "watermarks")
+os.makedirs(watermark_dir, exist_ok=True)
+
 async def get_config():
     return settings
 
@@ -11,6 +11,12 @@ from isocode.plugins.cmd import admin as admin_flt
 from isocode.utils.isoutils.dbutils import initialize_database, get_auth_chat
 from isocode.utils.isoutils.queue import queue_system, shutdown_queue_system
 from isocode.utils.isoutils.routes import web_server
+from isocode.utils.isoutils.disk import disk_manager
+from isocode.utils.isoutils.events import event_bus
+from isocode.utils.isoutils.subscribers import setup_event_subscribers
+from isocode.utils.isoutils.restart import restore_hot_restart
+from isocode.utils.isoutils.watchdog import watchdog
+from isocode.utils.isoutils.capabilities import probe_capabilities
 from isocode.utils.telegram.clients import initialize_clients, shutdown_clients, clients
 from pyrogram.enums import ParseMode
 from pyrogram.handlers import MessageHandler
@@ -41,13 +47,14 @@ ADMIN_GROUP_CMDS = [
     BotCommand("auth_chat", "Autoriser un chat"),
     BotCommand("remove_chat", "Retirer un chat"),
     BotCommand("shutdown", "Arrêter le bot"),
-    BotCommand("restart", "Redémarrer le bot"),
+    BotCommand("restart", "Redémarrer le bot (hot : conserver les encodages)"),
 ]
 
 ADMIN_PRIVATE_CMDS = [
     BotCommand("status", "Voir le statut"),
     BotCommand("ping", "Vérifier le bot"),
     BotCommand("logs", "Voir les logs"),
+    BotCommand("retry", "Relancer une tâche échouée"),
     BotCommand("info", "Infos du bot"),
     BotCommand("about", "À propos"),
     BotCommand("config", "Configurer le bot"),
@@ -88,7 +95,13 @@ async def main():
     logger.info("Démarrage de l'application IsoCode...")
     settings.START_TIME = time.time()
     await initialize_clients()
+    setup_event_subscribers()
+    await event_bus.start()
+    await probe_capabilities()
+    await restore_hot_restart()
     asyncio.create_task(queue_system.start())
+    await disk_manager.start(queue_system.known_task_ids())
+    await watchdog.start()
 
     botclient = clients.get_client()
     user_client = clients.get_client("userbot")
@@ -161,7 +174,10 @@ async def main():
     except asyncio.CancelledError:
         pass
     finally:
+        await watchdog.stop()
         await shutdown_queue_system()
+        await event_bus.stop()
+        await disk_manager.stop()
         logger.info("Arrêt demandé, début du processus d'arrêt...")
 
 if __name__ == "__main__":
@@ -1,5 +1,5 @@
 from pydantic import Field
-from typing import List, Optional
+from typing import Dict, List, Optional
 from pydantic_settings import BaseSettings
 
 import logging
@@ -28,6 +28,96 @@ class Settings(BaseSettings):
 
     DOWNLOAD_DIR: str = ""
     ENCODE_DIR: str = ""
+    SCRATCH_DIR: str = ""
+    JOB_SCRATCH_DIR: str = "" # tmpfs, NVMe... ; <SCRATCH_DIR>/jobs à défaut, même quota que SCRATCH_DIR
+
+    # DISK MANAGEMENT
+    DOWNLOAD_DIR_QUOTA: float = 20 # in GB
+    ENCODE_DIR_QUOTA: float = 20 # in GB
+    SCRATCH_DIR_QUOTA: float = 20 # in GB
+    ARTIFACT_TTL: int = 3600 # in seconds
+    DISK_JANITOR_INTERVAL: int = 300 # in seconds
+
+    # QUEUE & PREEMPTION
+    PREEMPT_ENABLED: bool = True
+    PREEMPT_MIN_REMAINING: int = 1800 # in seconds, reste estimé d'une tâche préemptible
+    PREEMPT_MAX_WAIT: int = 120 # in seconds, attente max d'une tâche courte
+    PREEMPT_SHORT_JOB: int = 600 # in seconds, durée max d'une vidéo "courte"
+
+    # RESOURCE CLASSES
+    IO_SLOTS: int = 3 # remux / copie de flux
+    CPU_LIGHT_SLOTS: int = 2 # x264/x265 en preset rapide (réglage par défaut), NVENC
+    CPU_HEAVY_SLOTS: int = 1 # AV1, VP9, presets lents, 1440p+
+    HEAVY_JOB_DURATION: int = 7200 # in seconds
+
+    # OFF-PEAK SCHEDULING
+    OFFPEAK_WINDOWS: List[str] = Field(default_factory=lambda: ["01:00-07:00"]) # HH:MM-HH:MM, heure locale
+    DEFERRED_CHATS: List[str] = Field(default_factory=list)
+    DEFER_FLAG: str = "#defer" # dans la légende du fichier
+
+    # WATCHDOG
+    WATCHDOG_INTERVAL: int = 30 # in seconds
+    STALL_TIMEOUT: int = 300 # in seconds sans avancée de out_time
+    STALL_ACTION: str = "retry" # retry (paramètres sûrs, hwaccel none) | fail
+    ENCODE_TIMEOUT_FACTOR: float = 3 # x durée attendue (durée vidéo / vitesse attendue)
+    ENCODE_TIMEOUT_MIN: int = 1800 # in seconds
+
+    # RETRIES
+    RETRY_ATTEMPTS: int = 3
+    RETRY_BASE_DELAY: float = 5 # in seconds
+    RETRY_MAX_DELAY: float = 300 # in seconds
+    FAILED_JOB_TTL: int = 86400 # in seconds, conservation des fichiers d'une tâche échouée
+
+    # SEGMENTED ENCODING
+    SEGMENTED_ENCODING: bool = False # opt-in tant que le gain n'est pas mesuré sur l'hôte
+    SEGMENT_MIN_DURATION: int = 1800 # in seconds, durée min d'une vidéo segmentée
+    SEGMENT_DURATION: int = 300 # in seconds, coupe à la première image clé suivante
+    SEGMENT_CORE_BUDGET: int = 0 # cœurs alloués à une tâche segmentée (0 = tous)
+    SEGMENT_THREADS: int = 2 # threads FFmpeg par segment
+    SEGMENT_SYNC_TOLERANCE: float = 0.5 # in seconds, écart toléré à la vérification
+
+    # TARGET SIZE (/compress)
+    TARGET_SIZE_OVERHEAD: float = 0.02 # part de la taille réservée au conteneur
+    TARGET_MIN_VIDEO_BITRATE: int = 150 # in kbps, en dessous la taille cible est refusée
+
+    # SMART REMUX
+    REMUX_VIDEO_BITRATE_CEILING: Dict[int, int] = Field(default_factory=lambda: {480: 2000, 720: 4000, 1080: 8000, 1440: 16000, 2160: 35000}) # in kbps par hauteur, au-delà la vidéo est ré-encodée
+    REMUX_AUDIO_BITRATE_MARGIN: float = 1.1 # débit audio source toléré par rapport au débit demandé
+
+    # COMPRESSION GAIN
+    GAIN_MIN_RATIO: float = 0.10 # gain prévu minimal (part de la taille source) pour ré-encoder
+    GAIN_REFERENCE_BPP: float = 0.08 # bits par pixel et par image de libx264 CRF 23 medium en 1080p
+    GAIN_HISTORY_SIZE: int = 50 # résultats passés consultés par profil
+    GAIN_HISTORY_MIN: int = 3 # résultats minimum pour corriger le modèle
+    GAIN_SAMPLE_COUNT: int = 0 # fenêtres encodées pour affiner la prédiction, 0 = désactivé
+    GAIN_SAMPLE_SECONDS: int = 8 # in seconds
+
+    # PREVIEW (/preview)
+    PREVIEW_WINDOWS: int = 3 # extraits encodés par aperçu
+    PREVIEW_SECONDS: int = 10 # in seconds, durée de chaque extrait
+    PREVIEW_TTL: int = 3600 # in seconds, conservation de la source en attente de confirmation
+
+    # RENDITIONS (/multi)
+    RENDITIONS_DEFAULT: List[str] = Field(default_factory=lambda: ["1080p", "720p", "480p"]) # résolutions sans argument
+
+    # FONTS (hardsub)
+    FONT_STORE_DIR: str = "" # polices jointes, indexées par empreinte
+    FONT_STORE_QUOTA: float = 1 # in GB, éviction LRU
+
+    # WATERMARK
+    WATERMARK_CACHE_DIR: str = "" # filigranes pré-rendus (PNG RGBA), un par résolution de sortie
+
+    # AUDIO LOUDNESS
+    LOUDNORM_TWO_PASS: bool = False # pistes mesurées (-vn) en parallèle de la vidéo puis normalisées en gain linéaire ; l'encodage devient un groupe de processus, non ré-adoptable après un redémarrage à chaud
+    LOUDNORM_I: float = -24 # in LUFS, loudness intégrée visée
+    LOUDNORM_TP: float = -2 # in dBTP, crête vraie max
+    LOUDNORM_LRA: float = 7 # in LU, plage de loudness visée
+
+    # EXTERNAL TOOLS
+    EXEC_LIMITS: Dict[str, int] = Field(default_factory=lambda: {"ffprobe": 4, "ffmpeg": 2, "ffmpeg-long": 6, "mkvextract": 2, "nvidia-smi": 1}) # appels simultanés max par outil ; ffmpeg-long : passes sur tout le fichier (extraction, découpage, assemblage, loudness, extraits)
+    EXEC_DEFAULT_LIMIT: int = 4
+    EXEC_TIMEOUT: int = 300 # in seconds
+    EXEC_STDERR_LIMIT: int = 65536 # in bytes, fin de stderr conservée
 
     # PERMISSIONS & USERS
     OWNER_ID: str
@@ -2,7 +2,13 @@ from pyrogram import Client, filters
 from pyrogram.enums import ParseMode
 from pyrogram import enums
 from pyrogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton
-from isocode.utils.isoutils.progress import stylize_value
+from isocode.utils.isoutils.progress import stylize_value, humanbytes
+from isocode.utils.isoutils.disk import disk_manager
+from isocode.utils.isoutils.queue import queue_system
+from isocode.utils.isoutils.restart import prepare_hot_restart
+from isocode.utils.isoutils.encoder import encoder_flow
+from isocode.utils.isoutils.targetsize import parse_size
+from isocode.utils.isoutils.renditions import parse_renditions
 from isocode import settings, logger
 from isocode.utils.telegram.keyboard import (
     create_web_kb,
@@ -77,8 +83,11 @@ BOT_CMD = [
     "shutdown",
     "restart",
     "health",
+    "retry",
     "encode",
     "compress",
+    "preview",
+    "multi",
     "merge",
     "split",
     "subs",
@@ -193,6 +202,8 @@ async def handle_bot_commands(client: Client, message: Message):
         help_text = "📚 **ᴀɪᴅᴇ ᴇᴛ ᴄᴏᴍᴍᴀɴᴅᴇs**\n\n"
         help_text += "➻ ` /encode ` : ᴇɴᴄᴏᴅᴀɢᴇ ᴠɪᴅᴇ́ᴏ\n"
         help_text += "➻ ` /compress ` : ᴄᴏᴍᴘʀᴇssɪᴏɴ ᴠɪᴅᴇ́ᴏ\n"
+        help_text += "➻ ` /preview ` : ᴀᴘᴇʀᴄ̧ᴜ ᴅᴇs ʀᴇ́ɢʟᴀɢᴇs\n"
+        help_text += "➻ ` /multi ` : ᴘʟᴜsɪᴇᴜʀs ʀᴇ́sᴏʟᴜᴛɪᴏɴs\n"
         help_text += "➻ ` /merge ` : ғᴜsɪᴏɴɴᴇʀ ᴅᴇs ᴠɪᴅᴇ́ᴏs\n"
         help_text += "➻ ` /split ` : ᴅᴇ́ᴄᴏᴜᴘᴇʀ ᴜɴᴇ ᴠɪᴅᴇ́ᴏ\n"
         help_text += "➻ ` /subs ` : ᴍᴀɴᴀɢᴇᴍᴇɴᴛ sᴏᴜs-ᴛɪᴛʀᴇs\n"
@@ -237,6 +248,77 @@ async def handle_bot_commands(client: Client, message: Message):
     # ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
     # COMMANDES DE TRAITEMENT VIDÉO
     # ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+    elif cmd == "compress" and message.reply_to_message and (
+        message.reply_to_message.video or message.reply_to_message.document
+    ):
+        # /compress [taille] en réponse à une vidéo : encodage en mode taille cible
+        if message.chat.type == enums.ChatType.PRIVATE and not sudo_filter(None, None, message):
+            return await message.reply(stylize_value("❌ Commande réservée aux administrateurs."))
+
+        target_size = parse_size(message.command[1]) if len(message.command) > 1 else 0
+        if target_size is None:
+            return await message.reply(
+                stylize_value("❌ Taille invalide. Exemples : /compress 700M, /compress 1.5G")
+            )
+
+        msg = await message.reply(stylize_value("⏳ Traitement du fichier vidéo en cours..."))
+        try:
+            await encoder_flow(
+                message=message.reply_to_message,
+                msg=msg,
+                userbot=userbot,
+                client=client,
+                target_size=target_size,
+            )
+        except Exception as e:
+            await msg.edit(f"❌ Une erreur est survenue : `{e}`")
+
+    elif cmd == "preview":
+        # /preview en réponse à une vidéo : extraits encodés avant l'encodage complet
+        reply = message.reply_to_message
+        if not reply or not (reply.video or reply.document):
+            return await message.reply(stylize_value("❌ Répondez à une vidéo avec /preview."))
+        if message.chat.type == enums.ChatType.PRIVATE and not sudo_filter(None, None, message):
+            return await message.reply(stylize_value("❌ Commande réservée aux administrateurs."))
+
+        msg = await message.reply(stylize_value("⏳ Traitement du fichier vidéo en cours..."))
+        try:
+            await encoder_flow(
+                message=reply,
+                msg=msg,
+                userbot=userbot,
+                client=client,
+                preview=True,
+            )
+        except Exception as e:
+            await msg.edit(f"❌ Une erreur est survenue : `{e}`")
+
+    elif cmd == "multi":
+        # /multi [résolutions] en réponse à une vidéo : un décodage, une vidéo par résolution
+        reply = message.reply_to_message
+        if not reply or not (reply.video or reply.document):
+            return await message.reply(stylize_value("❌ Répondez à une vidéo avec /multi 1080p 720p 480p."))
+        if message.chat.type == enums.ChatType.PRIVATE and not sudo_filter(None, None, message):
+            return await message.reply(stylize_value("❌ Commande réservée aux administrateurs."))
+
+        renditions = parse_renditions(message.command[1:])
+        if not renditions:
+            return await message.reply(
+                stylize_value("❌ Résolution invalide. Exemples : /multi, /multi 1080p 720p 480p")
+            )
+
+        msg = await message.reply(stylize_value("⏳ Traitement du fichier vidéo en cours..."))
+        try:
+            await encoder_flow(
+                message=reply,
+                msg=msg,
+                userbot=userbot,
+                client=client,
+                renditions=renditions,
+            )
+        except Exception as e:
+            await msg.edit(f"❌ Une erreur est survenue : `{e}`")
+
     elif cmd in [
         "encode",
         "compress",
@@ -304,13 +386,53 @@ async def handle_bot_commands(client: Client, message: Message):
                 reply_markup=close_kb,
             )
 
+    elif cmd == "retry" and (
+        admin_filter(None, None, message) or sudo_filter(None, None, message)
+    ):
+        if len(message.command) < 2:
+            failed = queue_system.get_failed_tasks()
+            lines = [
+                f"• `{task.id}` — {task.failed_stage} : {task.error}"
+                for task in failed
+            ]
+            caption = (
+                "♻️ **ᴛᴀ̂ᴄʜᴇs ᴇ́ᴄʜᴏᴜᴇ́ᴇs**\n" + "\n".join(lines) + "\n\nᴜsᴀɢᴇ : `/retry <task_id>`"
+                if lines
+                else "✅ ᴀᴜᴄᴜɴᴇ ᴛᴀ̂ᴄʜᴇ ᴇ́ᴄʜᴏᴜᴇ́ᴇ"
+            )
+        else:
+            task_id = message.command[1].upper()
+            stage = await queue_system.retry_task(task_id)
+            caption = (
+                f"♻️ ᴛᴀ̂ᴄʜᴇ `{task_id}` ʀᴇᴍɪsᴇ ᴇɴ ғɪʟᴇ (ʀᴇᴘʀɪsᴇ : `{stage}`)"
+                if stage
+                else f"❌ ᴛᴀ̂ᴄʜᴇ `{task_id}` ɪɴᴛʀᴏᴜᴠᴀʙʟᴇ ᴏᴜ ғɪᴄʜɪᴇʀs ᴇxᴘɪʀᴇ́s"
+            )
+
+        await send_media(
+            client=client,
+            media_type="photo",
+            chat_id=message.chat.id,
+            media=MEDIA_MAP["status"],
+            caption=caption,
+            parse_mode=ParseMode.MARKDOWN,
+            reply_to=message.id,
+            reply_markup=close_kb,
+        )
+
     elif cmd == "restart" and sudo_filter(None, None, message):
+        # /restart hot : les encodages en cours continuent et sont ré-adoptés au démarrage
+        hot = len(message.command) > 1 and message.command[1].lower() == "hot"
+        caption = "🔄 ʀᴇᴅᴇ́ᴍᴀʀʀᴀɢᴇ ᴅᴜ ʙᴏᴛ..."
+        if hot:
+            preserved = await prepare_hot_restart()
+            caption = f"🔥 ʀᴇᴅᴇ́ᴍᴀʀʀᴀɢᴇ ᴀ̀ ᴄʜᴀᴜᴅ : {preserved} ᴛᴀ̂ᴄʜᴇ(s) ᴄᴏɴsᴇʀᴠᴇ́ᴇ(s)..."
         await send_media(
             client=client,
             media_type="photo",
             chat_id=message.chat.id,
             media=MEDIA_MAP["status"],
-            caption="🔄 ʀᴇᴅᴇ́ᴍᴀʀʀᴀɢᴇ ᴅᴜ ʙᴏᴛ...",
+            caption=caption,
             parse_mode=ParseMode.MARKDOWN,
             reply_to=message.id,
             reply_markup=close_kb,
@@ -381,6 +503,8 @@ async def handle_bot_commands(client: Client, message: Message):
             logger.error(f"Erreur psutil: {e}")
             status_text += "• ᴍᴇ́ᴛʀɪϙᴜᴇs sʏsᴛᴇ̀ᴍᴇ : ɪɴᴅɪsᴘᴏɴɪʙʟᴇ"
 
+        status_text += f"\n\n💾 **ᴅɪsϙᴜᴇ**\n{await get_disk_usage()}"
+
         await send_media(
             client=client,
             media_type="photo",
@@ -758,6 +882,15 @@ def get_uptime() -> str:
     return f"{days}ᴊ {hours}ʜ {minutes}ᴍ {seconds}s"
 
 
+async def get_disk_usage() -> str:
+    """ʀᴇᴛᴏᴜʀɴᴇ ʟ'ᴜᴛɪʟɪsᴀᴛɪᴏɴ ᴅɪsϙᴜᴇ ᴅᴇs ʀᴇ́ᴘᴇʀᴛᴏɪʀᴇs ɢᴇ́ʀᴇ́s"""
+    lines = []
+    for name, info in (await disk_manager.usage()).items():
+        quota = humanbytes(info["quota"]) if info["quota"] else "∞"
+        lines.append(f"• {name} : `{humanbytes(info['used'])} / {quota}` ({info['files']} ғɪᴄʜɪᴇʀs)")
+    return "\n".join(lines)
+
+
 # ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
 # HANDLERS SPÉCIFIQUES POUR LES FILTRES
 # ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
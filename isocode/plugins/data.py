@@ -1,9 +1,10 @@
 from pyrogram import Client
 from pyrogram.types import CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
 from pyrogram.enums import ParseMode
-from isocode.plugins.cmd import MEDIA_MAP, get_uptime
+from isocode.plugins.cmd import MEDIA_MAP, get_uptime, get_disk_usage
 from isocode.utils.database.database import AudioCodec
 from isocode.utils.isoutils.msg import BotMessage
+from isocode.utils.isoutils.capabilities import probe_capabilities
 from isocode.utils.telegram.keyboard import concat_kbs, create_inline_kb, create_web_kb
 from isocode import logger
 from isocode.utils.isoutils.dbutils import (
@@ -32,6 +33,8 @@ from isocode.utils.isoutils.dbutils import (
     get_hardsub,
     get_subtitles,
     get_normalize_audio,
+    get_smart_remux,
+    get_low_gain_action,
     get_pix_fmt,
     get_channels,
     get_reframe,
@@ -41,9 +44,9 @@ from isocode.utils.isoutils.dbutils import (
 from isocode.utils.isoutils.progress import stylize_value
 import psutil
 import os
-import subprocess
 from isocode.config import settings
 from isocode.utils.telegram.media import send_media
+from isocode.utils.isoutils.queue import queue_system
 
 # ==================== Constantes et configurations ====================
 close_kb = create_inline_kb([[("❌ ᴄʟᴏsᴇ", "close")]])
@@ -116,6 +119,7 @@ SETTING_CYCLE_OPTIONS = {
         "track_10",
     ],
     "subtitle_action": ["none", "burn", "extract", "embed"],
+    "low_gain_action": ["encode", "warn", "remux", "skip"],
     "extensions": ["mp4", "mkv", "webm", "mov"],
     "reframe": ["0", "24", "30", "48", "60"],
     "tune": [
@@ -135,96 +139,13 @@ SETTING_NAME_MAP = {
     "audio_track": "audio_track_action",
     "format": "extensions",
     "subs_track": "selected_subtitle_track",
+    "lowgain": "low_gain_action",
 }
 
-# Cache pour la disponibilité des accélérateurs matériels
-_available_hwaccels = None
-
-# ==================== Fonctions de vérification matérielle ====================
-def check_cuda_available() -> bool:
-    """Vérifie physiquement la présence d'un GPU NVIDIA avec CUDA"""
-    try:
-        # Vérifie l'existence du périphérique NVIDIA
-        if os.path.exists("/dev/nvidia0") or os.path.exists("/dev/nvidiactl"):
-            # Vérifie que le driver fonctionne
-            result = subprocess.run(
-                ["nvidia-smi", "-L"],
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True
-            )
-            return "GPU" in result.stdout
-        return False
-    except Exception:
-        return False
-
-def check_vaapi_available() -> bool:
-    """Vérifie physiquement la présence d'un périphérique VA-API"""
-    try:
-        # Liste les périphériques de rendu
-        render_devices = [
-            f for f in os.listdir("/dev/dri")
-            if f.startswith("renderD")
-        ]
-        if not render_devices:
-            return False
-
-        # Vérifie les permissions sur le premier périphérique
-        device = f"/dev/dri/{render_devices[0]}"
-        return os.access(device, os.R_OK | os.W_OK)
-    except Exception:
-        return False
-
-def check_qsv_available() -> bool:
-    """Vérifie physiquement la présence d'un périphérique Intel Quick Sync"""
-    try:
-        # Vérifie les périphériques Intel
-        card_devices = [
-            f for f in os.listdir("/dev/dri")
-            if f.startswith("card")
-        ]
-        if not card_devices:
-            return False
-
-        # Vérifie les permissions sur le premier périphérique
-        device = f"/dev/dri/{card_devices[0]}"
-        return os.access(device, os.R_OK | os.W_OK)
-    except Exception:
-        return False
-
-def check_dxva2_available() -> bool:
-    """Vérifie si DXVA2 est disponible (Windows uniquement)"""
-    try:
-        return os.name == "nt"
-    except Exception:
-        return False
-
 async def get_available_hwaccels() -> list:
-    """Récupère la liste des accélérateurs matériels réellement disponibles"""
-    global _available_hwaccels
-
-    if _available_hwaccels is not None:
-        return _available_hwaccels
-
-    # Toujours disponibles
-    available = {"none", "auto"}
-
-    # Vérifications matérielles
-    if check_cuda_available():
-        available.add("cuda")
-    if check_vaapi_available():
-        available.add("vaapi")
-    if check_qsv_available():
-        available.add("qsv")
-    if check_dxva2_available():
-        available.add("dxva2")
-
-    # Filtre et ordonne les options valides
-    valid_hwaccels = ["none", "auto", "cuda", "vaapi", "dxva2", "qsv"]
-    _available_hwaccels = [accel for accel in valid_hwaccels if accel in available]
-
-    logger.info(f"Accélérateurs matériels détectés: {_available_hwaccels}")
-    return _available_hwaccels
+    """Accélérateurs réellement utilisables : gérés par FFmpeg et matériel présent (sonde mise en cache)"""
+    capabilities = await probe_capabilities()
+    return capabilities.available_hwaccels if capabilities else ["none"]
 
 # ==================== Fonctions utilitaires ====================
 async def get_current_settings(user_id: int) -> dict:
@@ -253,6 +174,8 @@ async def get_current_settings(user_id: int) -> dict:
         "hardsub": await get_hardsub(user_id),
         "subtitles": await get_subtitles(user_id),
         "normalize_audio": await get_normalize_audio(user_id),
+        "smart_remux": await get_smart_remux(user_id),
+        "low_gain_action": await get_low_gain_action(user_id),
         "pix_fmt": await get_pix_fmt(user_id),
         "channels": await get_channels(user_id),
         "reframe": await get_reframe(user_id),
@@ -413,6 +336,16 @@ async def show_setting(callback_query: CallbackQuery):
                     "toggle_watermark",
                 ),
             ],
+            [
+                (
+                    f"sᴍᴀʀᴛ ʀᴇᴍᴜx: {stylize_value(settings_dict['smart_remux'])}",
+                    "toggle_smartremux",
+                ),
+                (
+                    f"ɢᴀɪɴ ꜰᴀɪʙʟᴇ: {stylize_value(settings_dict['low_gain_action'])}",
+                    "set_lowgain",
+                ),
+            ],
             # Boutons de navigation
             [("↩ ʀᴇᴛᴏᴜʀ ", "start"), ("❌ ғᴇʀᴍᴇʀ ", "close")],
         ]
@@ -447,6 +380,8 @@ async def handle_callback_query(client: Client, callback_query: CallbackQuery):
             help_text = "📚 **ᴀɪᴅᴇ ᴇᴛ ᴄᴏᴍᴍᴀɴᴅᴇs**\n\n"
             help_text += "➻ ` /encode ` : ᴇɴᴄᴏᴅᴀɢᴇ ᴠɪᴅᴇ́ᴏ\n"
             help_text += "➻ ` /compress ` : ᴄᴏᴍᴘʀᴇssɪᴏɴ ᴠɪᴅᴇ́ᴏ\n"
+            help_text += "➻ ` /preview ` : ᴀᴘᴇʀᴄ̧ᴜ ᴅᴇs ʀᴇ́ɢʟᴀɢᴇs\n"
+            help_text += "➻ ` /multi ` : ᴘʟᴜsɪᴇᴜʀs ʀᴇ́sᴏʟᴜᴛɪᴏɴs\n"
             help_text += "➻ ` /merge ` : ғᴜsɪᴏɴɴᴇʀ ᴅᴇs ᴠɪᴅᴇ́ᴏs\n"
             help_text += "➻ ` /split ` : ᴅᴇ́ᴄᴏᴜᴘᴇʀ ᴜɴᴇ ᴠɪᴅᴇ́ᴏ\n"
             help_text += "➻ ` /subs ` : ᴍᴀɴᴀɢᴇᴍᴇɴᴛ sᴏᴜs-ᴛɪᴛʀᴇs\n"
@@ -493,6 +428,8 @@ async def handle_callback_query(client: Client, callback_query: CallbackQuery):
                 logger.error(f"Erreur psutil: {e}")
                 status_text += "• ᴍᴇ́ᴛʀɪϙᴜᴇs sʏsᴛᴇ̀ᴍᴇ : ɪɴᴅɪsᴘᴏɴɪʙʟᴇ"
 
+            status_text += f"\n\n💾 **ᴅɪsϙᴜᴇ**\n{await get_disk_usage()}"
+
             await callback_query.message.edit_text(
                 text=status_text, parse_mode=ParseMode.MARKDOWN, reply_markup=close_kb
             )
@@ -581,6 +518,8 @@ async def handle_callback_query(client: Client, callback_query: CallbackQuery):
                 db_field = "subtitle_action"
             elif setting_name == "normalize":
                 db_field = "normalize_audio"
+            elif setting_name == "smartremux":
+                db_field = "smart_remux"
             else:
                 db_field = setting_name
             current_value = await get_setting(user_id, db_field)
@@ -626,6 +565,12 @@ async def handle_callback_query(client: Client, callback_query: CallbackQuery):
 
             if setting_name in SETTING_CYCLE_OPTIONS:
                 options = SETTING_CYCLE_OPTIONS[setting_name]
+                # Codecs absents de FFmpeg (ou NVENC sans GPU) non proposés
+                capabilities = await probe_capabilities()
+                if capabilities and setting_name == "video_codec":
+                    options = [o for o in options if capabilities.video_encoder_ok(o)] or options
+                elif capabilities and setting_name == "audio_codec":
+                    options = [o for o in options if capabilities.audio_encoder_ok(o)] or options
                 current_value = await get_setting(user_id, setting_name)
 
                 try:
@@ -743,6 +688,32 @@ async def handle_callback_query(client: Client, callback_query: CallbackQuery):
             await show_setting(callback_query)
             return
 
+        # Confirmation ou abandon d'un aperçu (/preview)
+        elif query_data.startswith("preview_ok_"):
+            preview_id = query_data.replace("preview_ok_", "")
+            task_id = await queue_system.confirm_preview(preview_id, user_id)
+            if not task_id:
+                await callback_query.answer("⌛ Aperçu expiré, relancez la commande", show_alert=True)
+                return
+            pos = await queue_system.get_task_position(task_id)
+            await message.edit_text(
+                stylize_value(
+                    f"📥 **Encodage complet ajouté à la file d'attente**\n\n"
+                    f"🎬 Position: #{pos}\n"
+                    f"🔍 Suivre: /status_{task_id}"
+                ),
+                parse_mode=ParseMode.MARKDOWN
+            )
+            return
+
+        elif query_data.startswith("preview_no_"):
+            preview_id = query_data.replace("preview_no_", "")
+            if queue_system.drop_preview(preview_id, user_id):
+                await message.edit_text(stylize_value("❌ Aperçu abandonné, fichier supprimé."))
+            else:
+                await callback_query.answer("⌛ Aperçu expiré", show_alert=True)
+            return
+
         else:
             await callback_query.answer(
                 "❌ Action non reconnue ou non implémentée", show_alert=True
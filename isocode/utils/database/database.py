@@ -303,6 +303,23 @@ class AudioTrackAction(str, Enum):
         }
         return names[self.value]
 
+class LowGainAction(str, Enum):
+    """Conduite à tenir quand le gain de compression prévu est trop faible"""
+    ENCODE = "encode"
+    WARN = "warn"
+    REMUX = "remux"
+    SKIP = "skip"
+
+    @property
+    def display_name(self) -> str:
+        names = {
+            "encode": "Encoder quand même",
+            "warn": "Avertir",
+            "remux": "Remuxer sans ré-encodage",
+            "skip": "Ignorer la tâche"
+        }
+        return names[self.value]
+
 class HWAccel(str, Enum):
     """Accélération matérielle"""
     AUTO = "auto"
@@ -441,6 +458,8 @@ class User(BaseModel):
     threads: int = Field(ge=0, default=0)
     extra_args: str = ""
     normalize_audio: bool = True
+    smart_remux: bool = False  # Copie des pistes déjà conformes
+    low_gain_action: LowGainAction = LowGainAction.WARN  # Gain de compression prévu trop faible
     audio_bitrate: str = "192k"
 
     # Gestion des pistes
@@ -525,6 +544,7 @@ class Database:
         self.db = self._client[database_name]
         self.users = self.db.users
         self.status = self.db.status
+        self.history = self.db.history
         asyncio.create_task(self.migrate_old_users())
 
     async def migrate_old_users(self):
@@ -570,6 +590,21 @@ class Database:
         user = await self.get_or_create_user(user_id)
         return getattr(user, setting, None)
 
+    # Historique des tâches
+    async def add_task_history(self, record: Dict[str, Any]):
+        await self.history.insert_one(record)
+
+    async def get_task_history(self, user_id: int, limit: int = 20) -> List[Dict[str, Any]]:
+        cursor = self.history.find({"user_id": user_id}).sort("end_time", -1).limit(limit)
+        return await cursor.to_list(length=limit)
+
+    async def get_gain_history(self, profile: str, limit: int = 50) -> List[Dict[str, Any]]:
+        cursor = self.history.find(
+            {"gain.profile": profile, "gain.encoded": True, "gain.actual_size": {"$exists": True}},
+            {"gain": 1}
+        ).sort("end_time", -1).limit(limit)
+        return await cursor.to_list(length=limit)
+
     # Méthodes pour les paramètres status
     async def get_killed_status(self) -> bool:
         status = await self.status.find_one({"id": "killed"})
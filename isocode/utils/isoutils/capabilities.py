@@ -0,0 +1,236 @@
+import os
+from dataclasses import dataclass
+from typing import Any, Dict, FrozenSet, List, Mapping, Optional, Tuple
+from isocode import logger
+from isocode.utils.isoutils.executor import ToolError, run_tool
+from isocode.utils.isoutils.resources import GPU_CODECS
+from isocode.utils.isoutils.retry import FatalStageError
+from isocode.utils.isoutils.watchdog import SOFTWARE_CODECS
+
+# Accélérateurs proposés, dans l'ordre d'affichage
+HWACCELS = ["cuda", "vaapi", "dxva2", "qsv"]
+# Encodeurs vidéo logiciels de repli, par ordre de préférence
+VIDEO_FALLBACKS = ["libx264", "libx265", "mpeg4"]
+AUDIO_FALLBACK = "aac"
+# Filigrane : rendu libass une fois, puis incrustation de l'image
+WATERMARK_FILTERS = ("subtitles", "movie", "overlay")
+# Encodeurs FFmpeg servant chaque codec audio (-c:a accepte aussi le nom du codec)
+AUDIO_ENCODERS = {
+    "aac": ("aac", "libfdk_aac"),
+    "opus": ("libopus", "opus"),
+    "mp3": ("libmp3lame", "mp3_mf"),
+    "flac": ("flac",),
+    "ac3": ("ac3",),
+}
+
+
+# ==================== Vérifications matérielles ====================
+async def check_cuda_available() -> bool:
+    """Vérifie physiquement la présence d'un GPU NVIDIA avec CUDA"""
+    try:
+        # Vérifie l'existence du périphérique NVIDIA
+        if os.path.exists("/dev/nvidia0") or os.path.exists("/dev/nvidiactl"):
+            # Vérifie que le driver fonctionne
+            result = await run_tool(["nvidia-smi", "-L"], timeout=15)
+            return "GPU" in result.text
+        return False
+    except Exception:
+        return False
+
+
+def _dri_device(prefix: str) -> bool:
+    """Premier périphérique /dev/dri du type demandé, accessible en lecture/écriture"""
+    try:
+        devices = sorted(f for f in os.listdir("/dev/dri") if f.startswith(prefix))
+        return bool(devices) and os.access(f"/dev/dri/{devices[0]}", os.R_OK | os.W_OK)
+    except Exception:
+        return False
+
+
+def check_vaapi_available() -> bool:
+    """Vérifie physiquement la présence d'un périphérique VA-API"""
+    return _dri_device("renderD")
+
+
+def check_qsv_available() -> bool:
+    """Vérifie physiquement la présence d'un périphérique Intel Quick Sync"""
+    return _dri_device("card")
+
+
+def check_dxva2_available() -> bool:
+    """Vérifie si DXVA2 est disponible (Windows uniquement)"""
+    return os.name == "nt"
+
+
+# ==================== Sorties de ffmpeg ====================
+def parse_encoders(text: str) -> FrozenSet[str]:
+    """Noms des encodeurs de ffmpeg -encoders (lignes après le séparateur ------)"""
+    names = set()
+    started = False
+    for line in text.splitlines():
+        parts = line.split()
+        if not started:
+            started = bool(parts) and parts[0].startswith("------")
+        elif len(parts) >= 2:
+            names.add(parts[1])
+    return frozenset(names)
+
+
+def parse_hwaccels(text: str) -> FrozenSet[str]:
+    """Méthodes listées par ffmpeg -hwaccels (une par ligne après l'en-tête)"""
+    lines = [line.strip() for line in text.splitlines()]
+    if "Hardware acceleration methods:" in lines:
+        lines = lines[lines.index("Hardware acceleration methods:") + 1:]
+    return frozenset(line for line in lines if line and " " not in line)
+
+
+def parse_filters(text: str) -> FrozenSet[str]:
+    """Noms des filtres de ffmpeg -filters (lignes "TSC nom E->S description")"""
+    names = set()
+    for line in text.splitlines():
+        parts = line.split()
+        if len(parts) >= 3 and "->" in parts[2]:
+            names.add(parts[1])
+    return frozenset(names)
+
+
+@dataclass(frozen=True)
+class Capabilities:
+    """Encodeurs, filtres et accélérateurs de la build FFmpeg, croisés avec le matériel présent"""
+    encoders: FrozenSet[str]
+    filters: FrozenSet[str]
+    # Accélérateurs gérés par la build et dont le périphérique est présent
+    hwaccels: Tuple[str, ...] = ()
+    # GPU NVIDIA fonctionnel : condition des encodeurs NVENC
+    gpu: bool = False
+
+    @property
+    def available_hwaccels(self) -> List[str]:
+        """Valeurs proposées pour le réglage hwaccel ("auto" seulement si un accélérateur existe)"""
+        return ["none"] + (["auto"] if self.hwaccels else []) + list(self.hwaccels)
+
+    def video_encoder_ok(self, codec: str) -> bool:
+        if codec == "copy":
+            return True
+        if codec in GPU_CODECS and not self.gpu:
+            return False
+        return codec in self.encoders
+
+    def audio_encoder_ok(self, codec: str) -> bool:
+        if codec == "copy":
+            return True
+        return any(name in self.encoders for name in AUDIO_ENCODERS.get(codec, (codec,)))
+
+    def has_filter(self, name: str) -> bool:
+        return name in self.filters
+
+    def describe(self) -> str:
+        video = [codec for codec in VIDEO_FALLBACKS + sorted(GPU_CODECS) if self.video_encoder_ok(codec)]
+        return (
+            f"{len(self.encoders)} encodeurs, {len(self.filters)} filtres ; "
+            f"vidéo utilisable: {', '.join(video) or 'aucun'} ; "
+            f"accélérateurs: {', '.join(self.hwaccels) or 'aucun'}"
+        )
+
+
+_capabilities: Optional[Capabilities] = None
+
+
+async def probe_capabilities(refresh: bool = False) -> Optional[Capabilities]:
+    """
+    Sonde une seule fois la build FFmpeg (-encoders, -hwaccels, -filters) et
+    le matériel présent ; le résultat est mis en cache. None si FFmpeg ne
+    répond pas : les commandes ne sont alors pas adaptées.
+    """
+    global _capabilities
+    if _capabilities is not None and not refresh:
+        return _capabilities
+
+    try:
+        encoders, hwaccels, filters = [
+            (await run_tool(['ffmpeg', '-hide_banner', option], timeout=30, check=True)).text
+            for option in ('-encoders', '-hwaccels', '-filters')
+        ]
+    except ToolError as e:
+        logger.warning(f"Sonde des capacités FFmpeg impossible: {e}")
+        return None
+
+    gpu = await check_cuda_available()
+    devices = {
+        "cuda": gpu,
+        "vaapi": check_vaapi_available(),
+        "qsv": check_qsv_available(),
+        "dxva2": check_dxva2_available(),
+    }
+    build_hwaccels = parse_hwaccels(hwaccels)
+    _capabilities = Capabilities(
+        encoders=parse_encoders(encoders),
+        filters=parse_filters(filters),
+        hwaccels=tuple(accel for accel in HWACCELS if accel in build_hwaccels and devices[accel]),
+        gpu=gpu,
+    )
+    logger.info(f"Capacités FFmpeg: {_capabilities.describe()}")
+    return _capabilities
+
+
+def get_capabilities() -> Optional[Capabilities]:
+    """Capacités sondées au démarrage (None avant la sonde ou si elle a échoué)"""
+    return _capabilities
+
+
+def plan_settings(user_settings: Mapping[str, Any]) -> Tuple[Dict[str, Any], List[str]]:
+    """
+    Adapte les paramètres à la build FFmpeg et au matériel sondés, pour ne
+    jamais lancer une commande vouée à l'échec :
+    - encodeur vidéo absent ou sans GPU -> équivalent logiciel (nvenc -> libx264...) ;
+    - encodeur audio absent -> aac ;
+    - hwaccel indisponible -> none ;
+    - filtre subtitles (libass) ou loudnorm absent -> option désactivée.
+    Retourne les paramètres et les replis appliqués ; inchangés sans sonde.
+    """
+    planned = dict(user_settings)
+    capabilities = _capabilities
+    if capabilities is None:
+        return planned, []
+    fallbacks = []
+
+    def fallback(key: str, value: Any, reason: str) -> None:
+        fallbacks.append(f"{key}: {planned.get(key)} → {value} ({reason})")
+        planned[key] = value
+
+    codec = planned.get("video_codec", "libx265")
+    if not capabilities.video_encoder_ok(codec):
+        candidates = [SOFTWARE_CODECS.get(codec)] + VIDEO_FALLBACKS
+        replacement = next((c for c in candidates if c and capabilities.video_encoder_ok(c)), None)
+        if replacement is None:
+            raise FatalStageError(f"Aucun encodeur vidéo utilisable pour remplacer {codec}")
+        reason = "pas de GPU NVIDIA" if codec in GPU_CODECS and codec in capabilities.encoders else "absent de FFmpeg"
+        fallback("video_codec", replacement, reason)
+
+    audio_codec = planned.get("audio_codec", "aac")
+    if not capabilities.audio_encoder_ok(audio_codec):
+        fallback("audio_codec", AUDIO_FALLBACK, "absent de FFmpeg")
+
+    hwaccel = planned.get("hwaccel", "auto")
+    if hwaccel not in capabilities.available_hwaccels:
+        if hwaccel == "auto":
+            # Hôte sans accélérateur : auto ne ferait que retomber sur le décodage logiciel
+            planned["hwaccel"] = "none"
+        else:
+            fallback("hwaccel", "none", "indisponible sur cet hôte")
+
+    if planned.get("watermark"):
+        missing = [name for name in WATERMARK_FILTERS if not capabilities.has_filter(name)]
+        if missing:
+            fallback("watermark", False, f"filtre(s) {', '.join(missing)} absent(s)")
+
+    if not capabilities.has_filter("subtitles"):
+        if planned.get("hardsub"):
+            fallback("hardsub", False, "filtre subtitles (libass) absent")
+        if planned.get("subtitle_action") == "burn":
+            fallback("subtitle_action", "embed", "filtre subtitles (libass) absent")
+
+    if planned.get("normalize_audio", True) and not capabilities.has_filter("loudnorm"):
+        fallback("normalize_audio", False, "filtre loudnorm absent")
+
+    return planned, fallbacks
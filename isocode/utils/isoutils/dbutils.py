@@ -12,6 +12,7 @@ from isocode.utils.database.database import (
     Database,
     VideoFormat,
     HWAccel,
+    LowGainAction,
     UserRole,
     UserStatus
 )
@@ -222,6 +223,16 @@ async def get_normalize_audio(user_id: int) -> bool:
     user = await get_or_create_user(user_id)
     return user.normalize_audio
 
+async def get_smart_remux(user_id: int) -> bool:
+    """Get whether already-compliant streams are copied instead of re-encoded"""
+    user = await get_or_create_user(user_id)
+    return user.smart_remux
+
+async def get_low_gain_action(user_id: int) -> LowGainAction:
+    """Get what to do when the predicted compression gain is too low"""
+    user = await get_or_create_user(user_id)
+    return user.low_gain_action
+
 async def get_pix_fmt(user_id: int) -> str:
     """Get pixel format for a user"""
     user = await get_or_create_user(user_id)
@@ -557,6 +568,25 @@ async def set_extra_args(user_id: int, value: str):
     await set_setting(user_id, "extra_args", value)
 
 
+# ==================== Task History ====================
+async def add_task_history(record: Dict[str, Any]):
+    """Persist a finished task record"""
+    db = await get_database()
+    await db.add_task_history(record)
+
+
+async def get_task_history(user_id: int, limit: int = 20) -> List[Dict[str, Any]]:
+    """Get the latest task records of a user"""
+    db = await get_database()
+    return await db.get_task_history(user_id, limit)
+
+
+async def get_gain_history(profile: str, limit: int = 50) -> List[Dict[str, Any]]:
+    """Get the latest encoded results recorded for a compression profile"""
+    db = await get_database()
+    return await db.get_gain_history(profile, limit)
+
+
 # ==================== System Settings ====================
 async def get_killed_status() -> bool:
     """Get system kill switch status"""
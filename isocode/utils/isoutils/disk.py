@@ -0,0 +1,355 @@
+import asyncio
+import json
+import os
+import shutil
+import time
+from dataclasses import dataclass, asdict
+from typing import Dict, Iterable, List, Optional, Tuple
+from isocode import logger, settings, download_dir, encode_dir, scratch_dir, jobs_dir
+
+GB = 1024 * 1024 * 1024
+MANIFEST_FILE = ".disk_manifest.json"
+# Les fichiers plus récents que ce délai ne sont jamais considérés orphelins
+# (téléchargement en cours, fichier temporaire de Pyrogram, etc.)
+ORPHAN_GRACE = 600
+# Suffixe d'un répertoire renommé avant suppression (suppression atomique)
+TRASH_SUFFIX = ".deleting"
+# Durée de validité du rapport d'utilisation (/status)
+USAGE_CACHE_TTL = 30 # in seconds
+
+
+@dataclass
+class Artifact:
+    """Fichier produit par une tâche et suivi par le gestionnaire de disque"""
+    path: str
+    job_id: str
+    kind: str
+    created: float
+    expires: Optional[float] = None  # None = épinglé tant que la tâche est active
+
+
+class DiskManager:
+    """
+    Service unique de gestion de l'espace disque.
+
+    - Suit les fichiers de chaque tâche (source, sortie, sous-titres, miniatures...)
+    - Supprime les fichiers expirés et applique les quotas par répertoire (LRU)
+    - Au démarrage, balaie les orphelins et réconcilie avec la file d'attente
+    """
+
+    def __init__(self, roots: Dict[str, str], quotas: Dict[str, float], ttl: int, interval: int, jobs_root: str):
+        self.roots = {name: os.path.abspath(path) for name, path in roots.items()}
+        self.jobs_root = os.path.abspath(jobs_root)
+        self.quotas = {name: int(quotas.get(name, 0) * GB) for name in roots}
+        self.ttl = ttl
+        self.interval = max(interval, 30)
+        self.artifacts: Dict[str, Artifact] = {}
+        self.manifest_path = os.path.join(self.roots["scratch"], MANIFEST_FILE)
+        self._janitor: Optional[asyncio.Task] = None
+        self._usage: Optional[Tuple[float, Dict[str, Dict[str, int]]]] = None
+
+    # ==================== Suivi des artefacts ====================
+    def track(self, job_id: str, path: str, kind: str) -> str:
+        """Enregistre un fichier comme appartenant à une tâche (épinglé)"""
+        path = os.path.abspath(path)
+        self.artifacts[path] = Artifact(path=path, job_id=job_id, kind=kind, created=time.time())
+        self._save_manifest()
+        return path
+
+    def reassign(self, old_job_id: str, new_job_id: str) -> None:
+        """Transfère les fichiers d'un identifiant provisoire vers l'ID définitif"""
+        for artifact in self.artifacts.values():
+            if artifact.job_id == old_job_id:
+                artifact.job_id = new_job_id
+        self._save_manifest()
+
+    def job_artifacts(self, job_id: str, kinds: Optional[Iterable[str]] = None) -> List[Artifact]:
+        kinds = set(kinds) if kinds else None
+        return [
+            a for a in self.artifacts.values()
+            if a.job_id == job_id and (kinds is None or a.kind in kinds)
+        ]
+
+    def release(self, job_id: str, ttl: Optional[int] = None, kinds: Optional[Iterable[str]] = None) -> None:
+        """Désépingle les fichiers d'une tâche : ils expireront après `ttl` secondes"""
+        expires = time.time() + (self.ttl if ttl is None else ttl)
+        for artifact in self.job_artifacts(job_id, kinds):
+            artifact.expires = expires
+        self._save_manifest()
+
+    def pin(self, job_id: str) -> int:
+        """Ré-épingle les fichiers d'une tâche (ex: relance), retourne le nombre de fichiers"""
+        artifacts = [a for a in self.job_artifacts(job_id) if os.path.exists(a.path)]
+        for artifact in artifacts:
+            artifact.expires = None
+        self._save_manifest()
+        return len(artifacts)
+
+    def discard(self, job_id: str, kinds: Optional[Iterable[str]] = None) -> None:
+        """Supprime immédiatement les fichiers d'une tâche"""
+        for artifact in self.job_artifacts(job_id, kinds):
+            self._delete(artifact.path)
+        self._save_manifest()
+
+    def forget(self, path: str) -> None:
+        """Retire un fichier du suivi sans le supprimer (ex: déjà supprimé après envoi)"""
+        if self.artifacts.pop(os.path.abspath(path), None):
+            self._save_manifest()
+
+    def scratch_path(self, name: str) -> str:
+        return os.path.join(self.roots["scratch"], name)
+
+    def job_dir(self, job_id: str, *parts: str) -> str:
+        """
+        Répertoire de travail isolé d'une tâche (JOB_SCRATCH_DIR/<job_id>/...).
+        Tous ses fichiers intermédiaires y sont écrits ; la racine est suivie
+        comme un artefact "workspace", supprimé d'un bloc avec la tâche.
+        """
+        root = os.path.join(self.jobs_root, job_id)
+        if root not in self.artifacts:
+            self.track(job_id, root, "workspace")
+        path = os.path.join(root, *parts)
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    # ==================== Nettoyage ====================
+    def _delete(self, path: str) -> int:
+        self.artifacts.pop(path, None)
+        return _remove_path(path)
+
+    async def _in_thread(self, func, *args):
+        """Parcours et suppressions disque hors de la boucle d'événements"""
+        return await asyncio.get_event_loop().run_in_executor(None, func, *args)
+
+    async def _delete_async(self, path: str) -> int:
+        # Le suivi reste modifié sur la boucle, seul le système de fichiers passe au thread
+        self.artifacts.pop(path, None)
+        return await self._in_thread(_remove_path, path)
+
+    def _root_of(self, path: str) -> Optional[str]:
+        for name, root in self.roots.items():
+            if path == root or path.startswith(root + os.sep):
+                return name
+        return None
+
+    def _iter_files(self, root: str) -> List[Tuple[str, os.stat_result]]:
+        files = []
+        for dirpath, _, filenames in os.walk(root):
+            for filename in filenames:
+                if filename == MANIFEST_FILE:
+                    continue
+                path = os.path.join(dirpath, filename)
+                try:
+                    files.append((path, os.stat(path)))
+                except OSError:
+                    continue
+        return files
+
+    def _remove_empty_dirs(self, root: str) -> None:
+        # Répertoires épinglés gardés même vides : créés d'avance, une tâche active y écrira
+        for dirpath, dirnames, filenames in os.walk(root, topdown=False):
+            if dirpath != root and not dirnames and not filenames and not self._is_pinned(dirpath):
+                try:
+                    os.rmdir(dirpath)
+                except OSError:
+                    pass
+
+    def _is_pinned(self, path: str) -> bool:
+        artifact = self.artifacts.get(path)
+        if artifact and artifact.expires is None:
+            return True
+        # Fichier situé dans un répertoire épinglé
+        parent = os.path.dirname(path)
+        while parent not in self.roots.values() and parent != os.path.dirname(parent):
+            artifact = self.artifacts.get(parent)
+            if artifact and artifact.expires is None:
+                return True
+            parent = os.path.dirname(parent)
+        return False
+
+    async def sweep(self) -> None:
+        """
+        Supprime les fichiers expirés puis applique les quotas par répertoire.
+        Les parcours (os.walk, stat) et suppressions s'exécutent dans un thread.
+        """
+        now = time.time()
+        for artifact in list(self.artifacts.values()):
+            if artifact.expires is not None and artifact.expires <= now:
+                await self._delete_async(artifact.path)
+            elif not os.path.exists(artifact.path):
+                self.artifacts.pop(artifact.path, None)
+
+        for name, root in self.roots.items():
+            quota = self.quotas.get(name, 0)
+            if quota <= 0:
+                continue
+            files = await self._in_thread(self._iter_files, root)
+            used = sum(st.st_size for _, st in files)
+            if used <= quota:
+                continue
+
+            logger.warning(
+                f"Quota dépassé pour {name}: {used / GB:.2f}/{quota / GB:.2f} Go, éviction LRU"
+            )
+            # Les moins récemment utilisés en premier
+            files.sort(key=lambda item: max(item[1].st_atime, item[1].st_mtime))
+            for path, st in files:
+                if used <= quota:
+                    break
+                if self._is_pinned(path) or now - st.st_mtime < ORPHAN_GRACE:
+                    continue
+                used -= await self._delete_async(path)
+
+            if used > quota:
+                logger.warning(f"Quota {name} toujours dépassé: fichiers épinglés par des tâches actives")
+            await self._in_thread(self._remove_empty_dirs, root)
+
+        # Rapport d'utilisation périmé après un passage qui a supprimé des fichiers
+        self._usage = None
+        self._save_manifest()
+
+    async def reconcile(self, active_job_ids: Iterable[str]) -> None:
+        """
+        Balayage de démarrage :
+        - les fichiers du manifeste sans tâche connue sont désépinglés
+        - les fichiers absents du manifeste sont des orphelins et sont supprimés
+        """
+        self._load_manifest()
+        active = set(active_job_ids)
+        now = time.time()
+
+        for artifact in list(self.artifacts.values()):
+            if not os.path.exists(artifact.path):
+                self.artifacts.pop(artifact.path, None)
+            elif artifact.job_id not in active and artifact.expires is None:
+                artifact.expires = artifact.created + self.ttl
+
+        orphans = 0
+        for root in self.roots.values():
+            for path, st in await self._in_thread(self._iter_files, root):
+                if path in self.artifacts or self._is_pinned(path):
+                    continue
+                if now - st.st_mtime < ORPHAN_GRACE:
+                    continue
+                await self._delete_async(path)
+                orphans += 1
+            await self._in_thread(self._remove_empty_dirs, root)
+
+        logger.info(f"Réconciliation disque: {len(self.artifacts)} fichiers suivis, {orphans} orphelins supprimés")
+        await self.sweep()
+
+    # ==================== Statistiques ====================
+    def _scan_usage(self) -> Dict[str, Dict[str, int]]:
+        report = {}
+        for name, root in self.roots.items():
+            files = self._iter_files(root)
+            report[name] = {
+                "used": sum(st.st_size for _, st in files),
+                "quota": self.quotas.get(name, 0),
+                "files": len(files),
+            }
+        return report
+
+    async def usage(self) -> Dict[str, Dict[str, int]]:
+        """Retourne l'utilisation disque par répertoire géré (parcours mis en cache USAGE_CACHE_TTL)"""
+        if self._usage and time.time() - self._usage[0] < USAGE_CACHE_TTL:
+            return self._usage[1]
+        report = await self._in_thread(self._scan_usage)
+        self._usage = (time.time(), report)
+        return report
+
+    # ==================== Persistance ====================
+    def _save_manifest(self) -> None:
+        tmp_path = f"{self.manifest_path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump([asdict(a) for a in self.artifacts.values()], f)
+            os.replace(tmp_path, self.manifest_path)
+        except Exception as e:
+            logger.error(f"Échec d'écriture du manifeste disque: {e}")
+
+    def _load_manifest(self) -> None:
+        if not os.path.exists(self.manifest_path):
+            return
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                for entry in json.load(f):
+                    artifact = Artifact(**entry)
+                    self.artifacts.setdefault(artifact.path, artifact)
+        except Exception as e:
+            logger.error(f"Manifeste disque illisible, ignoré: {e}")
+
+    # ==================== Boucle du concierge ====================
+    async def start(self, active_job_ids: Iterable[str] = ()) -> None:
+        await self.reconcile(active_job_ids)
+        if self._janitor is None or self._janitor.done():
+            self._janitor = asyncio.create_task(self._run(), name="DiskJanitor")
+
+    async def stop(self) -> None:
+        if self._janitor and not self._janitor.done():
+            self._janitor.cancel()
+            try:
+                await self._janitor
+            except asyncio.CancelledError:
+                pass
+        self._save_manifest()
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.sweep()
+            except Exception as e:
+                logger.error(f"Erreur du concierge disque: {e}", exc_info=True)
+
+
+def _remove_path(path: str) -> int:
+    """Supprime un fichier ou un répertoire, retourne la taille libérée"""
+    try:
+        if os.path.isdir(path):
+            size = _dir_size(path)
+            # Renommé d'abord : le répertoire disparaît d'un bloc, même si la
+            # suppression de son contenu est interrompue (reste balayé comme orphelin)
+            trash = f"{path}{TRASH_SUFFIX}-{time.time_ns()}"
+            os.replace(path, trash)
+            shutil.rmtree(trash, ignore_errors=True)
+        elif os.path.exists(path):
+            size = os.path.getsize(path)
+            os.remove(path)
+        else:
+            return 0
+        logger.info(f"Fichier supprimé par le gestionnaire de disque: {path}")
+        return size
+    except Exception as e:
+        logger.error(f"Échec de suppression de {path}: {e}")
+        return 0
+
+
+def _dir_size(path: str) -> int:
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for filename in filenames:
+            try:
+                total += os.path.getsize(os.path.join(dirpath, filename))
+            except OSError:
+                pass
+    return total
+
+
+_roots = {"download": download_dir, "encode": encode_dir, "scratch": scratch_dir}
+# Répertoires de travail sur un autre support (JOB_SCRATCH_DIR) : racine gérée à part
+if not jobs_dir.startswith(scratch_dir + os.sep):
+    _roots["jobs"] = jobs_dir
+
+disk_manager = DiskManager(
+    roots=_roots,
+    quotas={
+        "download": settings.DOWNLOAD_DIR_QUOTA,
+        "encode": settings.ENCODE_DIR_QUOTA,
+        "scratch": settings.SCRATCH_DIR_QUOTA,
+        "jobs": settings.SCRATCH_DIR_QUOTA,
+    },
+    ttl=settings.ARTIFACT_TTL,
+    interval=settings.DISK_JANITOR_INTERVAL,
+    jobs_root=jobs_dir,
+)
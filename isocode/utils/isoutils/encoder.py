@@ -1,6 +1,7 @@
 import os
 import time
 import math
+from typing import List, Optional
 from pyrogram.enums import ParseMode
 from pyrogram.types import Message
 from isocode.utils.isoutils.dbutils import get_or_create_user
@@ -8,8 +9,19 @@ from isocode.utils.isoutils.progress import stylize_value, humanbytes
 from isocode.utils.telegram.media import download_media
 from isocode.utils.telegram.message import send_msg, edit_msg
 from isocode.utils.isoutils.queue import queue_system
-from isocode.utils.isoutils.ffmpeg import get_user_settings
-from isocode import logger, download_dir
+from isocode.utils.isoutils.ffmpeg import get_user_settings, probe_duration
+from isocode.utils.isoutils.disk import disk_manager
+from isocode.utils.isoutils.job import JobRecord
+from isocode.utils.isoutils.retry import run_stage, StageError, FatalStageError
+from isocode.utils.isoutils.resources import ResourceClass
+from isocode.utils.isoutils.offpeak import is_deferrable
+from isocode.utils.isoutils.probe import probe
+from isocode.utils.isoutils.targetsize import TargetSizeError, plan_target_size, size_cap
+from isocode.utils.isoutils.preview import PREVIEW_KEY
+from isocode.utils.isoutils.renditions import RENDITIONS_KEY
+from isocode.utils.isoutils.capabilities import plan_settings
+from isocode.utils.isoutils.metrics import metrics
+from isocode import logger, settings, download_dir
 
 ALOED_EXTENSIONS = ["mp4", "mkv", "avi", "mov", "flv", "webm", "mpeg", "mpg"]
 
@@ -83,7 +95,23 @@ class DownloadProgress:
         self.last_downloaded = current
         self.last_percent = percent
 
-async def encoder_flow(message: Message, msg: Message, userbot, client) -> str:
+async def encoder_flow(
+    message: Message,
+    msg: Message,
+    userbot,
+    client,
+    target_size: Optional[int] = None,
+    preview: bool = False,
+    renditions: Optional[List[str]] = None
+) -> str:
+    """
+    Télécharge la vidéo et l'ajoute à la file d'encodage
+
+    :param target_size: Taille visée en octets (mode /compress, 0 = plafond TG_SPLIT_SIZE)
+    :param preview: Aperçu (/preview) : quelques extraits encodés, l'encodage complet
+        est mis en file après confirmation, sans nouveau téléchargement
+    :param renditions: Résolutions encodées en un seul processus (/multi)
+    """
     user_id = message.from_user.id
     user = await get_or_create_user(user_id)
 
@@ -118,6 +146,10 @@ async def encoder_flow(message: Message, msg: Message, userbot, client) -> str:
     unique_filename = f"{user_id}_{timestamp}_{filename}"
     full_path = os.path.join(user_dir, unique_filename)
 
+    # ID provisoire jusqu'à l'ajout dans la file d'attente
+    pending_id = f"DL-{message.chat.id}-{message.id}"
+    disk_manager.track(pending_id, full_path, "source")
+
     progress_tracker = DownloadProgress(
         client=client,
         chat_id=message.chat.id,
@@ -125,16 +157,23 @@ async def encoder_flow(message: Message, msg: Message, userbot, client) -> str:
         filename=filename
     )
 
-    file_path = await download_media(
-        client=client,
-        message=message,
-        file_path=full_path,
-        progress_callback=progress_tracker.update,
-        userbot=userbot
-    )
+    async def _download() -> str:
+        path = await download_media(
+            client=client,
+            message=message,
+            file_path=full_path,
+            progress_callback=progress_tracker.update,
+            userbot=userbot
+        )
+        if not path or not os.path.isfile(path):
+            raise FileNotFoundError(f"Fichier introuvable après téléchargement : {path}")
+        return path
 
-    if not file_path or not os.path.isfile(file_path):
-        logger.error(f"Fichier introuvable après téléchargement : {file_path}")
+    try:
+        file_path = await run_stage("download", _download)
+    except StageError as e:
+        logger.error(f"Échec du téléchargement : {e}")
+        disk_manager.discard(pending_id)
         try:
             await edit_msg(
                 client,
@@ -163,17 +202,74 @@ async def encoder_flow(message: Message, msg: Message, userbot, client) -> str:
         parse=ParseMode.MARKDOWN
     )
 
-    task_data = {
-        'filepath': file_path,
-        'message': message,
-        'msg': msg,
-        'user_settings': await get_user_settings(user_id),
-        'client': client,
-        'userbot': userbot
-    }
+    # Instantané adapté aux capacités sondées : la classe de ressources et les
+    # prédictions portent sur l'encodeur réellement utilisé
+    try:
+        job_settings, fallbacks = plan_settings(await get_user_settings(user_id))
+    except FatalStageError as e:
+        logger.error(f"Aucun encodeur utilisable pour {filename} : {e}")
+        disk_manager.discard(pending_id)
+        await edit_msg(
+            client,
+            message.chat.id,
+            msg.id,
+            stylize_value(f"❌ Encodage impossible : {e}")
+        )
+        return None
+    target_line = ""
+    for fallback in fallbacks:
+        logger.info(f"Repli pour {filename}: {fallback}")
+        metrics.incr("encoder_fallbacks", setting=fallback.split(":")[0])
+        target_line += f"⚠️ Repli: {fallback}\n"
+    if target_size is not None:
+        job_settings["target_size"] = target_size or size_cap()
+        try:
+            plan = plan_target_size(job_settings, await probe(file_path))
+        except TargetSizeError as e:
+            disk_manager.discard(pending_id)
+            await edit_msg(
+                client,
+                message.chat.id,
+                msg.id,
+                stylize_value(f"❌ Taille cible impossible : {e}")
+            )
+            return None
+        target_line += f"🎯 Taille cible: {humanbytes(plan.target)} (vidéo {plan.video_kbps} kb/s)\n"
+    if preview:
+        job_settings[PREVIEW_KEY] = True
+        target_line += f"🔬 Aperçu: {settings.PREVIEW_WINDOWS} extraits de {settings.PREVIEW_SECONDS}s\n"
+    if renditions:
+        job_settings[RENDITIONS_KEY] = renditions
+        target_line += f"🎞 Renditions: {', '.join(renditions)}\n"
+
+    try:
+        duration = await run_stage("probe", probe_duration, file_path)
+    except StageError as e:
+        logger.error(f"Analyse de {filename} impossible : {e}")
+        disk_manager.discard(pending_id)
+        await edit_msg(
+            client,
+            message.chat.id,
+            msg.id,
+            stylize_value("❌ Fichier illisible : durée de la vidéo introuvable.")
+        )
+        return None
+
+    job = JobRecord.from_messages(
+        message=message,
+        status_msg=msg,
+        filepath=file_path,
+        settings=job_settings,
+        duration=duration,
+        deferrable=is_deferrable(message),
+    )
 
-    task_id = await queue_system.add_task(task_data)
+    task_id = await queue_system.add_task(job)
+    disk_manager.reassign(pending_id, task_id)
     pos = await queue_system.get_task_position(task_id)
+    task_info = await queue_system.get_task_status(task_id) or {}
+    resource_class = ResourceClass(task_info.get("resource_class", ResourceClass.CPU_LIGHT.value))
+    deferred_line = "🌙 Différée: exécution en heures creuses\n" if job.deferrable else ""
 
     await edit_msg(
         client,
@@ -184,6 +280,9 @@ async def encoder_flow(message: Message, msg: Message, userbot, client) -> str:
             f"📁 `{filename}`\n"
             f"📦 Taille: {file_size}\n"
             f"🎬 Position: #{pos}\n"
+            f"⚙️ Classe: {resource_class.display_name}\n"
+            f"{target_line}"
+            f"{deferred_line}"
             f"🔍 Suivre: /status_{task_id}"
         ),
         parse=ParseMode.MARKDOWN
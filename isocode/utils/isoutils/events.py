@@ -0,0 +1,179 @@
+import asyncio
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Deque, Dict, Iterable, List, Optional
+from isocode import logger
+from isocode.utils.isoutils.metrics import metrics
+
+# Types d'événements du cycle de vie d'une tâche
+QUEUED = "queued"
+STARTED = "started"
+PROGRESS = "progress"
+STAGE = "stage"
+FINISHED = "finished"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+# Événements pouvant être abandonnés en priorité quand un abonné est saturé
+LOSSY_EVENTS = {PROGRESS}
+
+
+@dataclass
+class TaskEvent:
+    """Événement du cycle de vie d'une tâche"""
+    type: str
+    task_id: str
+    data: Dict[str, Any] = field(default_factory=dict)
+    timestamp: float = field(default_factory=time.time)
+
+
+Handler = Callable[[TaskEvent], Awaitable[None]]
+
+
+class Subscription:
+    """
+    Abonné du bus : file bornée propre et workers dédiés.
+
+    Quand la file est pleine, l'événement de progression le plus ancien est
+    abandonné (à défaut, le plus ancien tout court) : un abonné lent ne bloque
+    jamais l'émetteur ni les autres abonnés.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        handler: Handler,
+        event_types: Optional[Iterable[str]],
+        maxsize: int,
+        workers: int,
+        timeout: Optional[float],
+    ):
+        self.name = name
+        self.handler = handler
+        self.event_types = set(event_types) if event_types else None
+        self.maxsize = max(maxsize, 1)
+        self.workers = max(workers, 1)
+        self.timeout = timeout
+        self.buffer: Deque[TaskEvent] = deque()
+        self.dropped = 0
+        self._ready: Optional[asyncio.Event] = None
+        self._tasks: List[asyncio.Task] = []
+
+    def accepts(self, event: TaskEvent) -> bool:
+        return self.event_types is None or event.type in self.event_types
+
+    def offer(self, event: TaskEvent) -> None:
+        if len(self.buffer) >= self.maxsize:
+            victim = next((e for e in self.buffer if e.type in LOSSY_EVENTS), None)
+            if victim is not None:
+                self.buffer.remove(victim)
+            else:
+                self.buffer.popleft()
+            self.dropped += 1
+            metrics.incr("events_dropped", subscriber=self.name)
+        self.buffer.append(event)
+        if self._ready:
+            self._ready.set()
+
+    def start(self) -> None:
+        if self._tasks:
+            return
+        self._ready = asyncio.Event()
+        if self.buffer:
+            self._ready.set()
+        self._tasks = [
+            asyncio.create_task(self._worker(), name=f"Events-{self.name}-{i}")
+            for i in range(self.workers)
+        ]
+
+    async def stop(self, drain_timeout: float = 5.0) -> None:
+        if not self._tasks:
+            return
+        deadline = time.time() + drain_timeout
+        while self.buffer and time.time() < deadline:
+            await asyncio.sleep(0.05)
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _worker(self) -> None:
+        while True:
+            if not self.buffer:
+                self._ready.clear()
+                await self._ready.wait()
+                continue
+            event = self.buffer.popleft()
+            started = time.time()
+            try:
+                await asyncio.wait_for(self.handler(event), timeout=self.timeout)
+            except asyncio.CancelledError:
+                raise
+            except asyncio.TimeoutError:
+                logger.warning(f"Abonné {self.name}: délai dépassé pour l'événement {event.type} ({event.task_id})")
+            except Exception as e:
+                logger.error(f"Abonné {self.name}: erreur sur l'événement {event.type} ({event.task_id}): {e}", exc_info=True)
+            metrics.observe("event_handler_seconds", time.time() - started, subscriber=self.name)
+
+
+class EventBus:
+    """
+    Bus d'événements asynchrone en processus.
+
+    `publish` est synchrone et non bloquant : l'ordonnanceur n'attend jamais
+    les notifications Telegram, l'historique ou les métriques.
+    """
+
+    def __init__(self):
+        self.subscriptions: List[Subscription] = []
+        self._running = False
+
+    def subscribe(
+        self,
+        name: str,
+        handler: Handler,
+        event_types: Optional[Iterable[str]] = None,
+        maxsize: int = 100,
+        workers: int = 1,
+        timeout: Optional[float] = 60,
+    ) -> Subscription:
+        """
+        Enregistre un abonné
+
+        :param event_types: Types d'événements reçus (tous si None)
+        :param maxsize: Taille max de la file de l'abonné
+        :param workers: Nombre de workers traitant la file en parallèle
+        :param timeout: Durée max de traitement d'un événement
+        """
+        subscription = Subscription(name, handler, event_types, maxsize, workers, timeout)
+        self.subscriptions.append(subscription)
+        if self._running:
+            subscription.start()
+        return subscription
+
+    def publish(self, event_type: str, task_id: str, **data) -> TaskEvent:
+        event = TaskEvent(type=event_type, task_id=task_id, data=data)
+        metrics.incr("events_published", type=event_type)
+        for subscription in self.subscriptions:
+            if subscription.accepts(event):
+                subscription.offer(event)
+        return event
+
+    async def start(self) -> None:
+        self._running = True
+        for subscription in self.subscriptions:
+            subscription.start()
+
+    async def stop(self) -> None:
+        self._running = False
+        await asyncio.gather(*(s.stop() for s in self.subscriptions), return_exceptions=True)
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        return {
+            s.name: {"pending": len(s.buffer), "dropped": s.dropped, "workers": s.workers}
+            for s in self.subscriptions
+        }
+
+
+event_bus = EventBus()
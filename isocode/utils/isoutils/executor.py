@@ -0,0 +1,237 @@
+import asyncio
+import os
+import shutil
+import signal
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Mapping, Optional, Sequence
+from isocode import logger, settings
+from isocode.utils.isoutils.metrics import metrics
+
+# Codes de sortie usuels (shell, ffmpeg, mkvtoolnix)
+EXIT_CODES = {
+    0: "succès",
+    1: "erreur",
+    2: "avertissement / usage incorrect",
+    126: "non exécutable",
+    127: "commande introuvable",
+}
+# File de concurrence des passes FFmpeg sur tout le fichier (extraction, découpage,
+# assemblage, analyses loudness, extraits) : elles ne bloquent pas les appels courts
+LONG_PASS_POOL = "ffmpeg-long"
+
+
+def describe_exit(returncode: int) -> str:
+    """Libellé lisible d'un code de sortie (les signaux sont nommés)"""
+    signum = -returncode if returncode < 0 else returncode - 128 if returncode > 128 else 0
+    if signum:
+        try:
+            return f"tué par {signal.Signals(signum).name}"
+        except ValueError:
+            pass
+    return EXIT_CODES.get(returncode, f"code {returncode}")
+
+
+class ToolError(Exception):
+    """Échec d'un outil externe (ffmpeg, ffprobe, mkvextract...)"""
+
+    def __init__(self, tool: str, message: str, returncode: Optional[int] = None, stderr: str = ""):
+        super().__init__(f"{tool}: {message}")
+        self.tool = tool
+        self.returncode = returncode
+        self.stderr = stderr
+
+
+class ToolNotFound(ToolError):
+    """Outil absent du PATH"""
+
+
+class ToolTimeout(ToolError):
+    """Outil tué après dépassement du délai"""
+
+
+class ToolFailed(ToolError):
+    """Outil terminé avec un code de sortie non nul"""
+
+
+@dataclass(frozen=True)
+class ToolResult:
+    """Résultat d'une commande externe"""
+    tool: str
+    returncode: int
+    stdout: bytes
+    stderr: str
+    elapsed: float
+
+    @property
+    def ok(self) -> bool:
+        return self.returncode == 0
+
+    @property
+    def text(self) -> str:
+        return self.stdout.decode(errors="ignore")
+
+    def check(self) -> "ToolResult":
+        if not self.ok:
+            message = f"{describe_exit(self.returncode)}: {self.stderr.strip()[-500:]}"
+            raise ToolFailed(self.tool, message, self.returncode, self.stderr)
+        return self
+
+
+async def _read_tail(stream: asyncio.StreamReader, limit: int) -> bytes:
+    """Lit un flux jusqu'au bout en ne gardant que ses `limit` derniers octets"""
+    buffer = bytearray()
+    while True:
+        chunk = await stream.read(65536)
+        if not chunk:
+            return bytes(buffer)
+        buffer += chunk
+        if len(buffer) > limit:
+            del buffer[:len(buffer) - limit]
+
+
+class ToolExecutor:
+    """
+    Exécuteur asynchrone unique des outils externes.
+
+    - Concurrence bornée par outil (sémaphore par nom d'exécutable ou par file nommée)
+    - Délai max par appel : le processus est tué au-delà
+    - stderr conservé dans un tampon borné (fin du flux)
+    - Latence, attente et échecs mesurés par outil
+    Les encodages longs passent par le registre de processus, pas par ici.
+    """
+
+    def __init__(self, limits: Mapping[str, int], default_limit: int, timeout: float, stderr_limit: int):
+        self.limits = dict(limits)
+        self.default_limit = max(default_limit, 1)
+        self.timeout = timeout
+        self.stderr_limit = max(stderr_limit, 1024)
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self.running: Dict[str, int] = {}
+        self.waiting: Dict[str, int] = {}
+
+    def limit(self, tool: str) -> int:
+        return max(self.limits.get(tool, self.default_limit), 1)
+
+    def _semaphore(self, tool: str) -> asyncio.Semaphore:
+        # Créés à la demande : liés à la boucle d'événements en cours
+        if tool not in self._semaphores:
+            self._semaphores[tool] = asyncio.Semaphore(self.limit(tool))
+        return self._semaphores[tool]
+
+    async def run(
+        self,
+        cmd: Sequence[str],
+        timeout: Optional[float] = None,
+        capture_stdout: bool = True,
+        check: bool = False,
+        pool: Optional[str] = None,
+    ) -> ToolResult:
+        """
+        Exécute une commande externe
+
+        :param timeout: Délai max en secondes (EXEC_TIMEOUT si None)
+        :param capture_stdout: Conserver la sortie standard (sinon ignorée)
+        :param check: Lever ToolFailed si le code de sortie est non nul
+        :param pool: File de concurrence (nom de l'outil si None), ex. LONG_PASS_POOL
+        """
+        cmd = [str(arg) for arg in cmd]
+        tool = os.path.basename(cmd[0])
+        if not shutil.which(cmd[0]):
+            metrics.incr("exec_failures", tool=tool, reason="not_found")
+            raise ToolNotFound(tool, "commande introuvable dans le PATH", 127)
+
+        # Limite, attente et durée comptées par file ; échecs par outil
+        pool = pool or tool
+        timeout = timeout or self.timeout
+        queued_at = time.time()
+        self.waiting[pool] = self.waiting.get(pool, 0) + 1
+        try:
+            await self._semaphore(pool).acquire()
+        finally:
+            self.waiting[pool] -= 1
+        metrics.observe("exec_wait_seconds", time.time() - queued_at, tool=pool)
+
+        self.running[pool] = self.running.get(pool, 0) + 1
+        started = time.time()
+        try:
+            result = await self._execute(tool, cmd, timeout, capture_stdout)
+        finally:
+            self.running[pool] -= 1
+            self._semaphore(pool).release()
+            metrics.observe("exec_seconds", time.time() - started, tool=pool)
+
+        if not result.ok:
+            metrics.incr("exec_failures", tool=tool, reason=describe_exit(result.returncode))
+            logger.debug(f"{tool} a échoué ({describe_exit(result.returncode)}): {' '.join(cmd)}")
+        return result.check() if check else result
+
+    async def _execute(self, tool: str, cmd: List[str], timeout: float, capture_stdout: bool) -> ToolResult:
+        started = time.time()
+        proc = await asyncio.create_subprocess_exec(
+            *cmd,
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE if capture_stdout else asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.PIPE
+        )
+        stdout_reader = proc.stdout.read() if capture_stdout else asyncio.sleep(0, b"")
+        try:
+            stdout, stderr = await asyncio.wait_for(
+                asyncio.gather(stdout_reader, _read_tail(proc.stderr, self.stderr_limit)),
+                timeout=timeout
+            )
+            returncode = await proc.wait()
+        except asyncio.TimeoutError:
+            await self._kill(proc)
+            metrics.incr("exec_failures", tool=tool, reason="timeout")
+            raise ToolTimeout(tool, f"délai de {timeout:g}s dépassé", proc.returncode)
+        except BaseException:
+            await self._kill(proc)
+            raise
+
+        return ToolResult(
+            tool=tool,
+            returncode=returncode,
+            stdout=stdout,
+            stderr=stderr.decode(errors="ignore"),
+            elapsed=time.time() - started,
+        )
+
+    @staticmethod
+    async def _kill(proc: asyncio.subprocess.Process) -> None:
+        if proc.returncode is None:
+            try:
+                proc.kill()
+            except ProcessLookupError:
+                pass
+            await proc.wait()
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        tools = set(self.limits) | set(self.running) | set(self.waiting)
+        return {
+            tool: {
+                "limit": self.limit(tool),
+                "running": self.running.get(tool, 0),
+                "waiting": self.waiting.get(tool, 0),
+            }
+            for tool in sorted(tools)
+        }
+
+
+executor = ToolExecutor(
+    limits=settings.EXEC_LIMITS,
+    default_limit=settings.EXEC_DEFAULT_LIMIT,
+    timeout=settings.EXEC_TIMEOUT,
+    stderr_limit=settings.EXEC_STDERR_LIMIT,
+)
+
+
+async def run_tool(
+    cmd: Sequence[str],
+    timeout: Optional[float] = None,
+    capture_stdout: bool = True,
+    check: bool = False,
+    pool: Optional[str] = None,
+) -> ToolResult:
+    """Raccourci vers l'exécuteur partagé"""
+    return await executor.run(cmd, timeout=timeout, capture_stdout=capture_stdout, check=check, pool=pool)
@@ -1,18 +1,44 @@
 import asyncio
 import json
-import shutil
 import math
 import os
-import re
-import subprocess
 import time
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, List, Optional, Sequence, Tuple
 from pyrogram.enums import ParseMode
 from hachoir.metadata import extractMetadata
 from hachoir.parser import createParser
 from isocode.utils.database.database import Database, User
-from isocode import logger, encode_dir, download_dir
-from isocode.utils.isoutils.progress import stylize_value
+from isocode import logger, settings, encode_dir, download_dir
+from isocode.utils.isoutils.progress import stylize_value, humanbytes
+from isocode.utils.isoutils.disk import disk_manager
+from isocode.utils.isoutils.process import process_registry
+from isocode.utils.isoutils.ffprogress import PROGRESS_PUBLISH_INTERVAL, follow_progress
+from isocode.utils.isoutils.events import event_bus, PROGRESS
+from isocode.utils.isoutils.watchdog import EncodeStalled, max_runtime
+from isocode.utils.isoutils.job import JobRecord
+from isocode.utils.isoutils.probe import MediaInfo, ProbeError, probe
+from isocode.utils.isoutils.fonts import escape_filter_path, fonts_dir_for, prepare_fonts
+from isocode.utils.isoutils.executor import LONG_PASS_POOL, ToolError, describe_exit, run_tool
+from isocode.utils.isoutils.metrics import metrics
+from isocode.utils.isoutils.retry import FatalStageError
+from isocode.utils.isoutils.remux import plan_streams, requested_channels, selected_audio
+from isocode.utils.isoutils.loudness import (
+    AUDIO_DIR, LoudnessMeasure, measure_tracks, single_pass_filter, use_split_audio
+)
+from isocode.utils.isoutils.capabilities import plan_settings
+from isocode.utils.isoutils.renditions import (
+    RENDITIONS_KEY, filter_graph, playable_renditions, rendition_label
+)
+from isocode.utils.isoutils.targetsize import (
+    TargetSizeError, TWO_PASS_CODECS, plan_target_size, size_cap
+)
+from isocode.utils.isoutils.segments import (
+    SegmentError, SegmentManifest, CONCAT_LIST, use_segmented, segment_workers,
+    segment_workdir, segment_fingerprint, reset_workdir, split_command,
+    read_segments, misaligned_segments, write_concat_list, verify_output
+)
+from isocode.utils.isoutils.watermark import attach, output_size, watermark_cache
+from isocode.utils.telegram.message import edit_msg
 from isocode.utils.isoutils.dbutils import (
     get_database,
     get_setting,
@@ -35,6 +61,8 @@ from isocode.utils.isoutils.dbutils import (
     get_hardsub,
     get_subtitles,
     get_normalize_audio,
+    get_smart_remux,
+    get_low_gain_action,
     get_pix_fmt,
     get_channels,
     get_reframe,
@@ -46,20 +74,18 @@ from isocode.utils.database.database import (
     VideoCodec, AudioCodec, Preset, Tune, Resolution,
     VideoFormat, SubtitleAction, AudioTrackAction, HWAccel
 )
-import ffmpeg
+
+# Sous-répertoire de travail recevant les sous-titres extraits (et leurs polices)
+SUBTITLES_DIR = "subtitles"
 
 
 async def get_codec(filepath: str, channel: str = 'v:0') -> List[str]:
-    """Get codec information using ffprobe"""
-    try:
-        output = subprocess.check_output([
-            'ffprobe', '-v', 'error', '-select_streams', channel,
-            '-show_entries', 'stream=codec_name,codec_tag_string', '-of',
-            'default=nokey=1:noprint_wrappers=1', filepath
-        ])
-        return output.decode('utf-8').split()
-    except (subprocess.CalledProcessError, FileNotFoundError):
+    """Get codec information (codec name and tag) of a stream"""
+    info = await probe(filepath)
+    stream = info.stream(channel) if info else None
+    if not stream:
         return []
+    return [value for value in (stream.codec_name, stream.codec_tag) if value]
 
 
 async def list_subtitle_streams(filepath: str) -> list:
@@ -67,39 +93,34 @@ async def list_subtitle_streams(filepath: str) -> list:
     Retourne la liste des pistes subtitle dans l'ordre d'apparition.
     Chaque élément est un dict: {'index': <global stream index>, 'codec':..., 'language': ...}
     """
-    try:
-        out = subprocess.check_output([
-            'ffprobe', '-v', 'error',
-            '-select_streams', 's',
-            '-show_entries', 'stream=index,codec_name:stream_tags=language',
-            '-print_format', 'json',
-            filepath
-        ])
-        data = json.loads(out.decode('utf-8') or "{}")
-        streams = data.get('streams', []) or []
-        result = []
-        for s in streams:
-            result.append({
-                'index': s.get('index', None),
-                'codec': s.get('codec_name'),
-                'language': (s.get('tags') or {}).get('language') if isinstance(s.get('tags'), dict) else None
-            })
-        return result
-    except (subprocess.CalledProcessError, FileNotFoundError, json.JSONDecodeError) as e:
-        logger.error(f"list_subtitle_streams error: {e}")
+    info = await probe(filepath)
+    if not info:
         return []
+    return [
+        {'index': stream.index, 'codec': stream.codec_name, 'language': stream.language}
+        for stream in info.subtitles
+    ]
+
 
+async def extract_subs(filepath: str, workdir: str, user_settings: Dict[str, any]) -> Optional[str]:
+    """
+    Extract subtitles and handle fonts — version robuste.
 
-async def extract_subs(filepath: str, msg, user: User) -> Optional[str]:
-    """Extract subtitles and handle fonts — version robuste."""
+    Les sous-titres sont écrits dans le répertoire de travail de la tâche ;
+    les polices jointes sont liées dans fonts_dir_for(sous-titres), lu par le
+    filtre subtitles (fontsdir) ; aucune police système ni fc-cache.
+    """
     subtitle_streams = await list_subtitle_streams(filepath)
     if not subtitle_streams:
         logger.info("Aucune piste subtitle trouvée.")
         return None
 
-    output = os.path.join(encode_dir, f"{msg.id}.ass")
+    output = os.path.join(workdir, "subtitles.ass")
+    # Démultiplexage de tout le fichier : délai proportionnel à la durée
+    info = await probe(filepath)
+    timeout = max(settings.EXEC_TIMEOUT, info.duration / 10 if info else 0)
 
-    sub_track_str = await get_setting(user.user_id, "selected_subtitle_track")
+    sub_track_str = user_settings.get("selected_subtitle_track")
     selected_track = None
     try:
         if sub_track_str is not None:
@@ -122,7 +143,7 @@ async def extract_subs(filepath: str, msg, user: User) -> Optional[str]:
             'ffmpeg', '-y', '-i', filepath,
             '-map', f'0:{chosen_stream["index"]}',
             output
-        ])
+        ], timeout=timeout, pool=LONG_PASS_POOL)
 
         if not success:
             logger.error(f"Subtitle extraction failed for track {chosen_stream['index']}: {error}")
@@ -131,7 +152,7 @@ async def extract_subs(filepath: str, msg, user: User) -> Optional[str]:
                 'ffmpeg', '-y', '-i', filepath,
                 '-map', f'0:{chosen_stream["index"]}',
                 output
-            ])
+            ], timeout=timeout, pool=LONG_PASS_POOL)
             if not success:
                 logger.error(f"Fallback subtitle extraction also failed: {error}")
                 return None
@@ -140,70 +161,56 @@ async def extract_subs(filepath: str, msg, user: User) -> Optional[str]:
         logger.error(f"extract_subs exception during ffmpeg extraction: {e}")
         return None
 
-    # Gestion des polices avec l'ancienne méthode qui fonctionnait
+    # Polices jointes : store partagé, répertoire propre à la tâche passé à libass
     try:
-        # Extraction des pièces jointes avec mkvextract
-        if shutil.which('mkvextract'):
-            await run_async_command([
-                'mkvextract', 'attachments', filepath,
-                *[str(i) for i in range(1, 41)]
-            ])
-            logger.info("mkvextract attachments executed")
-        else:
-            logger.warning("mkvextract n'est pas installé, extraction des polices ignorée")
-
-        # Déplacement des polices - version originale
-        await run_async_command([
-            "sh", "-c",
-            "mv -f *.JFPROJ *.FNT *.PFA *.ETX *.WOFF *.FOT *.TTF *.SFD *.VLW "
-            "*.VFB *.PFB *.OTF *.GXF *.WOFF2 *.ODTTF *.BF *.CHR *.TTC *.BDF "
-            "*.FON *.GF *.PMT *.AMFM  *.MF *.PFM *.COMPOSITEFONT *.PF2 *.GDR "
-            "*.ABF *.VNF *.PCF *.SFP *.MXF *.DFONT *.UFO *.PFR *.TFM *.GLIF "
-            "*.XFN *.AFM *.TTE *.XFT *.ACFM *.EOT *.FFIL *.PK *.SUIT *.NFTR "
-            "*.EUF *.TXF *.CHA *.LWFN *.T65 *.MCF *.YTF *.F3F *.FEA *.SFT *.PFT "
-            "/usr/share/fonts/ 2>/dev/null"
-        ])
-
-        await run_async_command([
-            "sh", "-c",
-            "mv -f *.jfproj *.fnt *.pfa *.etx *.woff *.fot *.ttf *.sfd *.vlw "
-            "*.vfb *.pfb *.otf *.gxf *.woff2 *.odttf *.bf *.chr *.ttc *.bdf "
-            "*.fon *.gf *.pmt *.amfm  *.mf *.pfm *.compositefont *.pf2 *.gdr "
-            "*.abf *.vnf *.pcf *.sfp *.mxf *.dfont *.ufo *.pfr *.tfm *.glif "
-            "*.xfn *.afm *.tte *.xft *.acfm *.eot *.ffil *.pk *.suit *.nftr "
-            "*.euf *.txf *.cha *.lwfn *.t65 *.mcf *.ytf *.f3f *.fea *.sft *.pft "
-            "/usr/share/fonts/ && fc-cache -f"
-        ])
-        logger.info("Fonts déplacées et cache mis à jour")
-
+        await prepare_fonts(filepath, info, output)
     except Exception as e:
         logger.warning(f"Erreur lors de la gestion des polices: {str(e)}")
 
     return output
 
-async def run_async_command(cmd: List[str]) -> Tuple[bool, str]:
-    """Run command asynchronously with error handling"""
-    # Vérifier si la commande est disponible
-    if not shutil.which(cmd[0]):
-        return False, f"Command not found: {cmd[0]}"
-
+async def run_async_command(
+    cmd: List[str],
+    timeout: Optional[float] = None,
+    pool: Optional[str] = None
+) -> Tuple[bool, str]:
+    """Run command through the shared tool executor with error handling"""
     try:
-        process = await asyncio.create_subprocess_exec(
-            *cmd,
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE
-        )
-        stdout, stderr = await process.communicate()
+        result = await run_tool(cmd, timeout=timeout, pool=pool)
+    except ToolError as e:
+        logger.error(f"Command execution error: {e}")
+        return False, str(e)
 
-        if process.returncode != 0:
-            error_msg = stderr.decode().strip()
-            logger.error(f"Command failed: {' '.join(cmd)}\nError: {error_msg}")
-            return False, error_msg
+    if not result.ok:
+        error_msg = result.stderr.strip()
+        logger.error(f"Command failed ({describe_exit(result.returncode)}): {' '.join(cmd)}\nError: {error_msg}")
+        return False, error_msg
 
-        return True, ""
-    except Exception as e:
-        logger.error(f"Command execution error: {str(e)}")
-        return False, str(e)
+    return True, ""
+
+
+def subtitles_filter(subtitle_path: str) -> str:
+    """Filtre d'incrustation, avec le répertoire de polices de la tâche s'il existe"""
+    vf = f"subtitles='{escape_filter_path(subtitle_path)}'"
+    fonts_dir = fonts_dir_for(subtitle_path)
+    if os.path.isdir(fonts_dir):
+        vf += f":fontsdir='{escape_filter_path(fonts_dir)}'"
+    return vf
+
+
+def select_subtitle_index(selected_subtitle_track, subtitle_streams: list) -> int:
+    """Index global de la piste sous-titres choisie (première piste à défaut)"""
+    try:
+        # Convertir le track sélectionné en index global
+        if selected_subtitle_track is not None:
+            selected_track = int(selected_subtitle_track)
+            if any(stream['index'] == selected_track for stream in subtitle_streams):
+                return selected_track
+    except (ValueError, TypeError):
+        pass
+
+    # Fallback sur la première piste si nécessaire
+    return subtitle_streams[0]['index']
 
 
 class FFmpegCommandBuilder:
@@ -212,63 +219,96 @@ class FFmpegCommandBuilder:
         user_settings: Dict[str, any],
         input_file: str,
         output_file: str,
-        subtitle_path: Optional[str] = None
+        subtitle_path: Optional[str] = None,
+        progress_target: str = 'pipe:1',
+        video: bool = True,
+        two_pass: Optional[Tuple[int, str]] = None,
+        loudness: Optional[Sequence[Optional[LoudnessMeasure]]] = None
     ) -> List[str]:
-        """Build FFmpeg command based on user settings"""
+        """
+        Build FFmpeg command based on user settings
+
+        :param video: False pour une commande audio seule (encodage segmenté)
+        :param two_pass: (numéro de passe, préfixe du journal) en mode taille cible
+        :param loudness: mesures par piste de sortie, normalisation en gain linéaire
+        """
+        # Encodeurs, filtres et hwaccel ramenés à ce que la build FFmpeg et l'hôte gèrent
+        user_settings, _ = plan_settings(user_settings)
+
         cmd = [
             'ffmpeg', '-hide_banner', '-loglevel', 'error',
-            '-progress', 'pipe:1', '-y'
+            '-progress', progress_target, '-y'
         ]
 
-        # Hardware acceleration
+        # Détection des pistes (une seule analyse ffprobe, mémorisée)
+        media_info = await probe(input_file)
+        has_video = bool(media_info and media_info.video)
+        has_audio = bool(media_info and media_info.audio)
+        subtitle_streams = await list_subtitle_streams(input_file)
+
+        # Mode "smart" : les pistes déjà conformes à la sortie sont copiées
+        remux_plan = plan_streams(user_settings, media_info)
+        copy_video = bool(remux_plan and remux_plan.copies_video)
+
+        # Hardware acceleration (inutile si la vidéo n'est pas décodée)
         hwaccel = user_settings.get('hwaccel', 'auto')
-        if hwaccel != 'none':
+        if hwaccel != 'none' and not (video and copy_video):
             cmd.extend(['-hwaccel', hwaccel])
 
         # Ajout de l'input file
         cmd.extend(['-i', input_file])
 
-        # Détection des pistes
-        has_video = await get_codec(input_file, channel='v:0')
-        has_audio = await get_codec(input_file, channel='a:0')
-        subtitle_streams = await list_subtitle_streams(input_file)
-
-        if has_video:
+        if not video:
+            cmd.extend(['-vn'])
+        elif has_video:
             cmd.extend(['-map', '0:v:0?'])
         else:
             logger.warning("Aucune piste vidéo détectée dans le fichier source")
 
-        # Video codec
-        video_codec = VideoCodec(user_settings.get('video_codec', 'libx265'))
-        cmd.extend(['-c:v', video_codec.ffmpeg_name])
-
-        # Video settings
-        if video_codec != VideoCodec.COPY:
-            # CRF
-            crf = user_settings.get('crf', 22)
-            cmd.extend(['-crf', str(crf)])
-
-            # Preset
-            preset = Preset(user_settings.get('preset', 'medium'))
-            cmd.extend(['-preset', preset.ffmpeg_name])
-
-            # Tune
-            tune = Tune(user_settings.get('tune', 'none'))
-            if tune != Tune.NONE:
-                cmd.extend(['-tune', tune.ffmpeg_name])
-
-            # Pixel format
-            pix_fmt = user_settings.get('pix_fmt', 'yuv420p')
-            cmd.extend(['-pix_fmt', pix_fmt])
-
-            # Resolution
-            resolution = Resolution(user_settings.get('resolution', 'original'))
-            if resolution != Resolution.ORIGINAL:
-                cmd.extend(['-vf', f'scale={resolution.ffmpeg_name}'])
-
-        # CABAC (if applicable)
-        if user_settings.get('cabac', False) and video_codec in [VideoCodec.H264, VideoCodec.H265]:
-            cmd.extend(['-coder', '1'])
+        if video:
+            # Video codec
+            video_codec = VideoCodec.COPY if copy_video else VideoCodec(user_settings.get('video_codec', 'libx265'))
+            cmd.extend(['-c:v', video_codec.ffmpeg_name])
+
+            # Video settings
+            if video_codec != VideoCodec.COPY:
+                # Débit imposé (mode taille cible) ou CRF
+                video_bitrate = user_settings.get('video_bitrate')
+                if video_bitrate:
+                    cmd.extend(['-b:v', f'{video_bitrate}k'])
+                else:
+                    crf = user_settings.get('crf', 22)
+                    cmd.extend(['-crf', str(crf)])
+
+                # Two-pass : journal de première passe dans le scratch de la tâche
+                if two_pass:
+                    pass_number, passlog = two_pass
+                    if video_codec == VideoCodec.H265:
+                        cmd.extend(['-x265-params', f'pass={pass_number}:stats={passlog}.log'])
+                    else:
+                        cmd.extend(['-pass', str(pass_number), '-passlogfile', passlog])
+
+                # Preset
+                preset = Preset(user_settings.get('preset', 'medium'))
+                cmd.extend(['-preset', preset.ffmpeg_name])
+
+                # Tune
+                tune = Tune(user_settings.get('tune', 'none'))
+                if tune != Tune.NONE:
+                    cmd.extend(['-tune', tune.ffmpeg_name])
+
+                # Pixel format
+                pix_fmt = user_settings.get('pix_fmt', 'yuv420p')
+                cmd.extend(['-pix_fmt', pix_fmt])
+
+                # Resolution
+                resolution = Resolution(user_settings.get('resolution', 'original'))
+                if resolution != Resolution.ORIGINAL:
+                    cmd.extend(['-vf', f'scale={resolution.ffmpeg_name}'])
+
+            # CABAC (if applicable)
+            if user_settings.get('cabac', False) and video_codec in [VideoCodec.H264, VideoCodec.H265]:
+                cmd.extend(['-coder', '1'])
 
         # Audio settings
         audio_track_action = AudioTrackAction(user_settings.get('audio_track_action', 'first'))
@@ -285,28 +325,18 @@ class FFmpegCommandBuilder:
                 cmd.extend(['-map', f'0:a:{track_num - 1}'])
 
             # Audio codec
-            if audio_codec != AudioCodec.COPY:
-                cmd.extend(['-c:a', audio_codec.ffmpeg_name])
-
-                # Audio bitrate
-                audio_bitrate = user_settings.get('audio_bitrate', '192k')
-                cmd.extend(['-b:a', audio_bitrate])
-
-                # Normalize audio
-                if user_settings.get('normalize_audio', True):
-                    cmd.extend(['-af', 'loudnorm'])
-
-                # Channels mapping
-                channels = user_settings.get('channels', 'stereo')
-                channel_mapping = {
-                    "mono": "1",
-                    "stereo": "2",
-                    "2.1": "3",
-                    "5.1": "6",
-                    "7.1": "8"
-                }
-                channels_value = channel_mapping.get(channels.lower(), "2")
-                cmd.extend(['-ac', channels_value])
+            audio_decisions = remux_plan.audio if remux_plan else ()
+            if audio_codec != AudioCodec.COPY and (loudness or any(decision.copy for decision in audio_decisions)):
+                # Décision par piste de sortie : copie, ou ré-encodage au gain mesuré
+                for position, stream in enumerate(selected_audio(user_settings, media_info)):
+                    if audio_decisions and audio_decisions[position].copy:
+                        cmd.extend([f'-c:a:{position}', 'copy'])
+                        continue
+                    measure = loudness[position] if loudness and position < len(loudness) else None
+                    audio_filter = measure.linear_filter(stream.sample_rate) if measure else None
+                    cmd.extend(FFmpegCommandBuilder.audio_options(user_settings, audio_codec, f'a:{position}', audio_filter))
+            elif audio_codec != AudioCodec.COPY:
+                cmd.extend(FFmpegCommandBuilder.audio_options(user_settings, audio_codec))
             else:
                 cmd.extend(['-c:a', 'copy'])
         else:
@@ -317,24 +347,11 @@ class FFmpegCommandBuilder:
         selected_subtitle_track = user_settings.get('selected_subtitle_track')
 
         if subtitle_action != SubtitleAction.NONE and subtitle_streams:
-            selected_global_idx = None
-            try:
-                # Convertir le track sélectionné en index global
-                if selected_subtitle_track is not None:
-                    selected_track = int(selected_subtitle_track)
-                    if any(stream['index'] == selected_track for stream in subtitle_streams):
-                        selected_global_idx = selected_track
-            except (ValueError, TypeError):
-                pass
-
-            # Fallback sur la première piste si nécessaire
-            if selected_global_idx is None:
-                selected_global_idx = subtitle_streams[0]['index']
+            selected_global_idx = select_subtitle_index(selected_subtitle_track, subtitle_streams)
 
             if subtitle_action == SubtitleAction.BURN and subtitle_path:
                 # Hardsub: appliquer via filtre vidéo
-                escaped_path = subtitle_path.replace(':', '\\\\:').replace("'", "\\\\'")
-                vf = f"subtitles='{escaped_path}'"
+                vf = subtitles_filter(subtitle_path)
 
                 if '-vf' in cmd:
                     vf_index = cmd.index('-vf') + 1
@@ -357,21 +374,95 @@ class FFmpegCommandBuilder:
         if threads > 0:
             cmd.extend(['-threads', str(threads)])
 
-        # Watermark
-        if user_settings.get('watermark', False):
-            watermark_filter = "subtitles='isocode/utils/extras/watermark.ass'"
+        # Watermark : PNG pré-rendu pour la définition de sortie, incrusté par overlay
+        if video and user_settings.get('watermark', False):
+            overlay = await watermark_cache.overlay(*output_size(user_settings, media_info))
 
             if '-vf' in cmd:
                 vf_index = cmd.index('-vf') + 1
-                cmd[vf_index] = f"{cmd[vf_index]},{watermark_filter}"
+                cmd[vf_index] = attach(cmd[vf_index], overlay)
             else:
-                cmd.extend(['-vf', watermark_filter])
+                cmd.extend(['-vf', attach('', overlay)])
 
         # Output file
         cmd.append(output_file)
 
         return cmd
 
+    @staticmethod
+    async def build_multi_command(
+        user_settings: Dict[str, any],
+        input_file: str,
+        outputs: List[Tuple[Resolution, str]],
+        subtitle_path: Optional[str] = None,
+        progress_target: str = 'pipe:1'
+    ) -> List[str]:
+        """
+        Build a single-decode FFmpeg command writing one file per resolution
+
+        La source est décodée une fois ; un filtre split alimente un scaler et un
+        encodeur par rendition. Audio et sous-titres suivent les réglages de
+        l'utilisateur, à l'identique dans chaque sortie.
+        """
+        base = await FFmpegCommandBuilder.build_command(
+            {**user_settings, 'resolution': Resolution.ORIGINAL.value, 'smart_remux': False, 'watermark': False},
+            input_file,
+            outputs[0][1],
+            subtitle_path,
+            progress_target=progress_target
+        )
+        position = base.index('-i') + 2
+        cmd, options = base[:position], base[position:-1]
+
+        # Sous-titres incrustés : appliqués avant le split, une seule fois
+        shared_filters = []
+        if '-vf' in options:
+            vf_index = options.index('-vf')
+            shared_filters.append(options[vf_index + 1])
+            del options[vf_index:vf_index + 2]
+        map_index = options.index('0:v:0?')
+        del options[map_index - 1:map_index + 1]
+
+        resolutions = [resolution for resolution, _ in outputs]
+        # Filigrane après le scaler de chaque rendition, pré-rendu à sa définition
+        watermarks = None
+        if user_settings.get('watermark', False):
+            media_info = await probe(input_file)
+            watermarks = [
+                await watermark_cache.overlay(*output_size({'resolution': resolution.value}, media_info))
+                for resolution in resolutions
+            ]
+        cmd.extend(['-filter_complex', filter_graph(shared_filters, resolutions, watermarks)])
+        for n, (_, output_file) in enumerate(outputs):
+            cmd.extend(['-map', f'[v{n}]', *options, output_file])
+        return cmd
+
+    @staticmethod
+    def audio_options(
+        user_settings: Dict[str, any],
+        audio_codec: AudioCodec,
+        stream: str = 'a',
+        audio_filter: Optional[str] = None
+    ) -> List[str]:
+        """
+        Options de ré-encodage audio, pour toutes les pistes ('a') ou une seule ('a:1')
+
+        :param audio_filter: normalisation mesurée de la piste (loudnorm en une passe sinon)
+        """
+        options = [f'-c:{stream}', audio_codec.ffmpeg_name]
+
+        # Audio bitrate
+        options.extend([f'-b:{stream}', user_settings.get('audio_bitrate', '192k')])
+
+        # Normalize audio
+        if user_settings.get('normalize_audio', True):
+            options.extend(['-af' if stream == 'a' else f'-filter:{stream}', audio_filter or single_pass_filter()])
+
+        # Channels mapping
+        channels = requested_channels(user_settings.get('channels', 'stereo'))
+        options.extend(['-ac' if stream == 'a' else f'-ac:{stream}', channels])
+        return options
+
 async def get_user_settings(user_id: int) -> Dict[str, any]:
     """Get all user settings in one call"""
     return {
@@ -395,6 +486,8 @@ async def get_user_settings(user_id: int) -> Dict[str, any]:
         "hardsub": await get_hardsub(user_id),
         "subtitles": await get_subtitles(user_id),
         "normalize_audio": await get_normalize_audio(user_id),
+        "smart_remux": await get_smart_remux(user_id),
+        "low_gain_action": await get_low_gain_action(user_id),
         "pix_fmt": await get_pix_fmt(user_id),
         "channels": await get_channels(user_id),
         "reframe": await get_reframe(user_id),
@@ -403,82 +496,681 @@ async def get_user_settings(user_id: int) -> Dict[str, any]:
     }
 
 
-async def encode_video(filepath: str, message, msg) -> str:
+def output_extension(user_settings: Dict[str, any]) -> str:
+    """Extension du fichier encodé : mp4/avi si demandés, mkv sinon"""
+    ex = user_settings.get("extensions")
+    return ex.lower() if ex and ex.upper() in ['MP4', 'AVI'] else 'mkv'
+
+
+async def encode_video(
+    job: JobRecord,
+    task_id: Optional[str] = None,
+    overrides: Optional[Dict[str, any]] = None
+) -> str:
     """
     Fonction principale d'encodage vidéo avec FFmpeg.
     - Ajoute les sous-titres si activé.
-    - Applique les paramètres de l'utilisateur.
+    - Applique les paramètres de l'utilisateur (instantané pris à la mise en file),
+      éventuellement surchargés (ex: mode sûr après un blocage).
     - Gère l'encodage et la progression.
     """
-    user_id = message.from_user.id
-    ex = await get_extensions(user_id)
+    filepath = job.filepath
+    user_settings = {**job.settings, **overrides} if overrides else job.settings
     path, _ = os.path.splitext(filepath)
     name = os.path.basename(path)
 
-    user = await get_or_create_user(user_id)
-
-    output_ext = ex.lower() if ex and ex.upper() in ['MP4', 'AVI'] else 'mkv'
-    output_filepath = os.path.join(encode_dir, f"{name}.{output_ext}")
+    job_id = task_id or name
+    # Sortie dans un répertoire propre à la tâche : deux sources homonymes ne se heurtent pas
+    output_dir = os.path.join(encode_dir, job_id)
+    output_filepath = os.path.join(output_dir, f"{name}.{output_extension(user_settings)}")
 
     if not os.path.exists(filepath):
         logger.error(f"Fichier introuvable après téléchargement : {filepath}")
         raise FileNotFoundError(f"Fichier non trouvé : {filepath}")
 
     subtitle_path = None
-    if await get_hardsub(user_id):
-        subtitle_path = await extract_subs(filepath, msg, user)
+    if user_settings.get("hardsub"):
+        subtitle_path = await extract_subs(filepath, disk_manager.job_dir(job_id, SUBTITLES_DIR), user_settings)
+        if subtitle_path:
+            disk_manager.track(job_id, subtitle_path, "subtitle")
+
+    # Plusieurs résolutions (/multi) : un décodage, une sortie par rendition
+    if user_settings.get(RENDITIONS_KEY):
+        return await encode_renditions(job, job_id, user_settings, subtitle_path)
+
+    os.makedirs(output_dir, exist_ok=True)
+    disk_manager.track(job_id, output_dir, "output")
+
+    # Mode "smart" : motif de copie ou de ré-encodage de chaque piste
+    remux_plan = plan_streams(user_settings, await probe(filepath))
+    if remux_plan:
+        logger.info(f"Plan de copie {job_id}: {remux_plan.describe()}")
+        for decision in remux_plan.decisions:
+            metrics.incr("remux_decisions", kind=decision.specifier[0], action=decision.action)
+
+    # Vidéo longue : segments encodés en parallèle puis assemblés
+    if use_segmented(user_settings, await probe(filepath)):
+        # Les segments sont conservés en cas d'échec : une nouvelle tentative reprend là
+        try:
+            output = await encode_segmented(job, job_id, user_settings, output_filepath)
+        except SegmentError as e:
+            logger.warning(f"Encodage segmenté abandonné pour {job_id} ({e}), encodage classique")
+            disk_manager.discard(job_id, kinds=["segments"])
+        else:
+            disk_manager.discard(job_id, kinds=["segments"])
+            return output
+
+    # Taille cible (/compress) : débit calculé, two-pass si l'encodeur le permet
+    if user_settings.get("target_size"):
+        return await encode_target_size(job, job_id, user_settings, output_filepath, subtitle_path)
 
-    user_settings = await get_user_settings(user_id)
+    # Normalisation audio : pistes mesurées et encodées à part, en parallèle de la vidéo
+    if use_split_audio(user_settings, await probe(filepath)):
+        return await encode_split_audio(job, job_id, user_settings, output_filepath, subtitle_path)
 
+    # Progression écrite dans un fichier (et non une pipe) : le processus FFmpeg
+    # peut survivre à un redémarrage à chaud et être ré-adopté
+    progress_path = process_registry.runtime_paths(job_id)["progress_path"]
     command = await FFmpegCommandBuilder.build_command(
         user_settings,
         filepath,
         output_filepath,
-        subtitle_path
+        subtitle_path,
+        progress_target=progress_path
     )
+    return await _run_encode(job, job_id, command, user_settings, output_filepath, output_filepath)
 
+
+async def _run_encode(
+    job: JobRecord,
+    job_id: str,
+    command: List[str],
+    user_settings: Dict[str, any],
+    output_filepath: str,
+    deliverable: Optional[str]
+) -> str:
+    """
+    Lance une commande FFmpeg dans le registre de processus et la suit jusqu'au bout.
+    deliverable : résultat remis à la tâche si le processus est ré-adopté après un
+    redémarrage à chaud ; None pour une passe intermédiaire, alors non ré-adoptable.
+    """
     logger.info(f"Commande FFmpeg : {' '.join(command)}")
 
+    # Session dédiée : permet de suspendre/reprendre tout le groupe de processus
     try:
-        proc = await asyncio.create_subprocess_exec(
-            *command,
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE
-        )
+        managed = await process_registry.spawn(job_id, command, deliverable=deliverable)
     except Exception as e:
         # Fallback: écrire la commande dans un script shell
-        command_file = f"/tmp/ffmpeg_cmd_{msg.id}.sh"
+        command_file = os.path.join(disk_manager.job_dir(job_id), "ffmpeg_cmd.sh")
         with open(command_file, 'w') as f:
             f.write("#!/bin/sh\n")
             f.write(" ".join(command) + "\n")
         os.chmod(command_file, 0o755)
         logger.warning(f"Utilisation du script fallback: {command_file}")
-        proc = await asyncio.create_subprocess_exec(
-            command_file,
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE
+        managed = await process_registry.spawn(job_id, [command_file], deliverable=deliverable)
+    managed.max_runtime = max_runtime(user_settings, job.duration)
+    # Fichiers d'exécution épinglés avec la tâche : un encodage ré-adopté après
+    # un redémarrage à chaud les lit encore, la réconciliation ne doit pas les supprimer
+    for path in (managed.progress_path, managed.log_path, managed.exit_path):
+        disk_manager.track(job_id, path, "runtime")
+
+    return await wait_encode(job, job_id, output_filepath, user_settings)
+
+
+async def encode_target_size(
+    job: JobRecord,
+    job_id: str,
+    user_settings: Dict[str, any],
+    output_filepath: str,
+    subtitle_path: Optional[str] = None
+) -> str:
+    """
+    Encodage en mode taille cible.
+    - Débit vidéo déduit de la durée sondée, du débit audio et de la taille
+      demandée (plafonnée à TG_SPLIT_SIZE).
+    - Deux passes pour libx264/libx265, journal de première passe dans le scratch.
+    - Taille prévue et obtenue journalisées.
+    """
+    filepath = job.filepath
+    try:
+        plan = plan_target_size(user_settings, await probe(filepath))
+    except TargetSizeError as e:
+        raise FatalStageError(f"Taille cible impossible : {e}") from e
+
+    encode_settings = {**user_settings, 'video_bitrate': plan.video_kbps}
+    # La copie du flux ne permet pas de viser une taille
+    if encode_settings.get('video_codec') == VideoCodec.COPY.value:
+        encode_settings['video_codec'] = VideoCodec.H264.value
+    progress_path = process_registry.runtime_paths(job_id)["progress_path"]
+    logger.info(
+        f"Taille cible {job_id}: {humanbytes(plan.target)}, vidéo {plan.video_kbps} kb/s, "
+        f"audio {plan.audio_kbps:.0f} kb/s, prévue {humanbytes(plan.predicted)}"
+    )
+
+    two_pass = None
+    if encode_settings['video_codec'] in TWO_PASS_CODECS:
+        passlog_dir = disk_manager.job_dir(job_id, "passlog")
+        disk_manager.track(job_id, passlog_dir, "passlog")
+        passlog = os.path.join(passlog_dir, "ffmpeg2pass")
+
+        # Première passe : vidéo seule, même chaîne de filtres, sortie ignorée
+        first_pass = await FFmpegCommandBuilder.build_command(
+            {
+                **encode_settings,
+                'audio_track_action': AudioTrackAction.NONE.value,
+                'subtitle_action': SubtitleAction.BURN.value if subtitle_path else SubtitleAction.NONE.value,
+            },
+            filepath,
+            os.devnull,
+            subtitle_path,
+            progress_target=progress_path,
+            two_pass=(1, passlog)
         )
+        first_pass[-1:-1] = ['-f', 'null']
+        # Sortie ignorée : rien à remettre à la tâche, passe relancée après un redémarrage à chaud
+        await _run_encode(job, job_id, first_pass, encode_settings, os.devnull, None)
+        two_pass = (2, passlog)
+
+    command = await FFmpegCommandBuilder.build_command(
+        encode_settings,
+        filepath,
+        output_filepath,
+        subtitle_path,
+        progress_target=progress_path,
+        two_pass=two_pass
+    )
+    await _run_encode(job, job_id, command, encode_settings, output_filepath, output_filepath)
+    disk_manager.discard(job_id, kinds=["passlog"])
+
+    actual = os.path.getsize(output_filepath)
+    metrics.observe("target_size_ratio", actual / plan.predicted)
+    logger.info(f"Taille cible {job_id}: prévue {humanbytes(plan.predicted)}, obtenue {humanbytes(actual)}")
+    if actual > size_cap():
+        logger.warning(f"Sortie {job_id} au-delà de TG_SPLIT_SIZE ({humanbytes(actual)})")
+    return output_filepath
 
-    await handle_progress(proc, msg, message, filepath, user_settings)
 
-    stdout, stderr = await proc.communicate()
+async def encode_renditions(
+    job: JobRecord,
+    job_id: str,
+    user_settings: Dict[str, any],
+    subtitle_path: Optional[str] = None
+) -> str:
+    """
+    Encodage multi-rendition (/multi).
+    - Un seul processus FFmpeg : décodage unique, split vers un scaler et un
+      encodeur par résolution demandée (jamais au-delà de la source).
+    - Sorties écrites dans un répertoire propre à la tâche, retourné.
+    """
+    filepath = job.filepath
+    info = await probe(filepath)
+    if not info or not info.video:
+        raise FatalStageError("Renditions impossibles : aucune piste vidéo dans la source")
+    resolutions = playable_renditions(user_settings[RENDITIONS_KEY], info)
+    if not resolutions:
+        raise FatalStageError(f"Renditions impossibles : aucune résolution demandée sous la source ({info.height}p)")
+
+    encode_settings = {**user_settings, 'smart_remux': False}
+    # Chaque rendition est redimensionnée : la copie du flux est impossible
+    if encode_settings.get('video_codec') == VideoCodec.COPY.value:
+        encode_settings['video_codec'] = VideoCodec.H264.value
+
+    name = os.path.splitext(os.path.basename(filepath))[0]
+    extension = output_extension(encode_settings)
+    output_dir = os.path.join(encode_dir, job_id)
+    os.makedirs(output_dir, exist_ok=True)
+    disk_manager.track(job_id, output_dir, "output")
+    outputs = [
+        (resolution, os.path.join(output_dir, f"{name} [{rendition_label(resolution, info)}].{extension}"))
+        for resolution in resolutions
+    ]
+
+    started = time.time()
+    progress_path = process_registry.runtime_paths(job_id)["progress_path"]
+    command = await FFmpegCommandBuilder.build_multi_command(
+        encode_settings,
+        filepath,
+        outputs,
+        subtitle_path,
+        progress_target=progress_path
+    )
+    # Tâche ré-adoptée : c'est le répertoire des renditions qui est envoyé
+    await _run_encode(job, job_id, command, encode_settings, outputs[-1][1], output_dir)
+
+    missing = [os.path.basename(path) for _, path in outputs if not os.path.exists(path)]
+    if missing:
+        raise FileNotFoundError(f"Renditions introuvables après encodage : {', '.join(missing)}")
+    elapsed = time.time() - started
+    metrics.incr("renditions_encoded", len(outputs))
+    logger.info(
+        f"Renditions {job_id} ({', '.join(rendition_label(r, info) for r in resolutions)}) "
+        f"encodées en {format_duration(int(elapsed))}"
+    )
+    return output_dir
 
-    if proc.returncode != 0:
-        error_msg = stderr.decode().strip()
+
+async def encode_segmented(
+    job: JobRecord,
+    job_id: str,
+    user_settings: Dict[str, any],
+    output_filepath: str
+) -> str:
+    """
+    Encodage segmenté d'une vidéo longue.
+    - Découpe la piste vidéo sur les images clés, sans ré-encodage.
+    - Encode les segments en parallèle dans le budget de cœurs (SEGMENT_CORE_BUDGET).
+    - Encode l'audio une seule fois, en parallèle des segments.
+    - Assemble avec le démultiplexeur concat et vérifie durée et synchro A/V.
+    - Reprend une tentative précédente : seuls les segments absents du manifeste
+      sont encodés.
+    Lève SegmentError si le découpage ou la vérification échoue.
+    """
+    started = time.time()
+    filepath = job.filepath
+    source = await probe(filepath)
+    workdir = segment_workdir(job_id)
+    disk_manager.track(job_id, workdir, "segments")
+
+    fingerprint = segment_fingerprint(filepath, user_settings)
+    manifest = SegmentManifest.load(workdir, fingerprint)
+    if manifest:
+        logger.info(f"Reprise de l'encodage segmenté {job_id}: {len(manifest.completed)} fichier(s) déjà encodé(s)")
+    else:
+        reset_workdir(workdir)
+        success, error = await run_async_command(
+            split_command(filepath, workdir),
+            timeout=max(settings.EXEC_TIMEOUT, source.duration / 10),
+            pool=LONG_PASS_POOL
+        )
+        if not success:
+            raise SegmentError(f"découpage impossible: {error}")
+        segments = read_segments(workdir)
+        if len(segments) < 2:
+            raise SegmentError("découpage en un seul segment")
+        misaligned = await misaligned_segments(segments)
+        if misaligned:
+            raise SegmentError(f"segments {misaligned} non alignés sur une image clé")
+        manifest = SegmentManifest(workdir, fingerprint, segments)
+        manifest.save()
+    segments = manifest.segments
+
+    audio_action = AudioTrackAction(user_settings.get('audio_track_action', 'first'))
+    audio_path = os.path.join(workdir, "audio.mka") if audio_action != AudioTrackAction.NONE and source.audio else None
+    video_settings = {
+        **user_settings,
+        'audio_track_action': AudioTrackAction.NONE.value,
+        'subtitle_action': SubtitleAction.NONE.value,
+        'threads': settings.SEGMENT_THREADS,
+    }
+    workers = segment_workers()
+    semaphore = asyncio.Semaphore(workers)
+    done = {segment.index: segment.duration for segment in segments if manifest.is_done(segment.output)}
+    pending = [segment for segment in segments if segment.index not in done]
+    if done:
+        metrics.incr("segments_resumed", len(done))
+
+    # La tâche devient un groupe : pause, reprise et chien de garde couvrent tous les segments
+    leader = process_registry.open_group(job_id)
+    leader.max_runtime = max_runtime(user_settings, source.duration)
+
+    async def encode_segment(segment) -> None:
+        async with semaphore:
+            while leader.is_paused:
+                await asyncio.sleep(1)
+            if leader.kill_reason:
+                raise EncodeStalled(job_id, leader.kill_reason)
+            key = f"{job_id}.seg{segment.index:03d}"
+            command = await FFmpegCommandBuilder.build_command(
+                video_settings,
+                segment.source,
+                segment.output,
+                progress_target=process_registry.runtime_paths(key)["progress_path"]
+            )
+            await _run_group_process(job_id, key, command)
+            manifest.mark_done(segment.output)
+            done[segment.index] = segment.duration
+
+    async def encode_audio() -> None:
+        await _encode_audio_tracks(job_id, filepath, user_settings, audio_path, source)
+        manifest.mark_done(audio_path)
+
+    logger.info(f"Encodage segmenté {job_id}: {len(pending)}/{len(segments)} segments à encoder, {workers} en parallèle")
+    tasks = [asyncio.ensure_future(encode_segment(segment)) for segment in pending]
+    if audio_path and not manifest.is_done(audio_path):
+        tasks.append(asyncio.ensure_future(encode_audio()))
+    reporter = asyncio.ensure_future(_report_group_progress(job, job_id, segments, done, workers))
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks + [reporter]:
+            task.cancel()
+        await asyncio.gather(*tasks, reporter, return_exceptions=True)
+        process_registry.unregister(job_id)
+
+    # Assemblage : vidéo concaténée, audio encodé une fois, sous-titres de la source
+    concat_path = write_concat_list([segment.output for segment in segments], os.path.join(workdir, CONCAT_LIST))
+    success, error = await _mux_streams(
+        ['-f', 'concat', '-safe', '0', '-i', concat_path],
+        audio_path,
+        filepath,
+        user_settings,
+        output_filepath,
+        timeout=max(settings.EXEC_TIMEOUT, source.duration / 20)
+    )
+    if not success:
+        raise Exception(f"Échec de l'assemblage des segments : {error}")
+
+    problem = verify_output(source, await probe(output_filepath), settings.SEGMENT_SYNC_TOLERANCE)
+    if problem:
+        raise SegmentError(f"vérification de la sortie: {problem}")
+
+    # Vitesse sur la seule durée encodée par cette tentative (hors segments repris)
+    elapsed = time.time() - started
+    encoded = sum(segment.duration for segment in pending)
+    metrics.observe("segmented_speed", encoded / elapsed if elapsed > 0 else 0)
+    logger.info(f"Encodage segmenté {job_id} terminé en {format_duration(int(elapsed))} ({encoded / max(elapsed, 1):.2f}x)")
+    return output_filepath
+
+
+async def encode_split_audio(
+    job: JobRecord,
+    job_id: str,
+    user_settings: Dict[str, any],
+    output_filepath: str,
+    subtitle_path: Optional[str] = None
+) -> str:
+    """
+    Encodage avec l'audio normalisé à part.
+    - Vidéo (sous-titres incrustés, filigrane) encodée sans audio.
+    - En parallèle : chaque piste audio mesurée par une analyse -vn, puis
+      toutes les pistes encodées en une passe de normalisation linéaire.
+    - Vidéo, audio et sous-titres de la source assemblés sans ré-encodage.
+    """
+    started = time.time()
+    filepath = job.filepath
+    source = await probe(filepath)
+    workdir = disk_manager.job_dir(job_id, AUDIO_DIR)
+    disk_manager.track(job_id, workdir, "audio")
+    video_path = os.path.join(workdir, "video.mkv")
+    audio_path = os.path.join(workdir, "audio.mka")
+
+    # Sous-titres incrustés dans la vidéo ; intégrés ou copiés à l'assemblage
+    subtitle_action = SubtitleAction(user_settings.get('subtitle_action', 'embed'))
+    video_settings = {
+        **user_settings,
+        'audio_track_action': AudioTrackAction.NONE.value,
+        'subtitle_action': (subtitle_action if subtitle_action == SubtitleAction.BURN else SubtitleAction.NONE).value,
+    }
+    elapsed: Dict[str, float] = {}
+
+    leader = process_registry.open_group(job_id)
+    leader.max_runtime = max_runtime(user_settings, source.duration)
+
+    async def encode_video_track() -> None:
+        key = f"{job_id}.video"
+        command = await FFmpegCommandBuilder.build_command(
+            video_settings,
+            filepath,
+            video_path,
+            subtitle_path,
+            progress_target=process_registry.runtime_paths(key)["progress_path"]
+        )
+        await _run_group_process(job_id, key, command, job=job, user_settings=video_settings)
+        elapsed["video"] = time.time() - started
+
+    async def encode_audio() -> None:
+        await _encode_audio_tracks(job_id, filepath, user_settings, audio_path, source)
+        elapsed["audio"] = time.time() - started
+
+    tasks = [asyncio.ensure_future(encode_video_track()), asyncio.ensure_future(encode_audio())]
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        process_registry.unregister(job_id)
+
+    success, error = await _mux_streams(
+        ['-i', video_path],
+        audio_path,
+        filepath,
+        user_settings,
+        output_filepath,
+        timeout=max(settings.EXEC_TIMEOUT, source.duration / 20),
+        subtitle_path=subtitle_path
+    )
+    disk_manager.discard(job_id, kinds=["audio"])
+    if not success:
+        raise Exception(f"Échec de l'assemblage audio/vidéo : {error}")
+
+    # Gain de temps : l'audio (analyse + encodage) s'exécute pendant la vidéo au lieu de la suivre
+    total = time.time() - started
+    serial = elapsed["video"] + elapsed["audio"]
+    tracks = len(selected_audio(user_settings, source))
+    metrics.observe("split_audio_saving", 1 - total / serial if serial > 0 else 0, tracks=tracks)
+    logger.info(
+        f"Audio normalisé à part {job_id}: {tracks} piste(s) en {elapsed['audio']:.0f}s, "
+        f"vidéo en {elapsed['video']:.0f}s, total {total:.0f}s (≈{serial:.0f}s en série)"
+    )
+    return output_filepath
+
+
+async def _encode_audio_tracks(
+    group: str,
+    filepath: str,
+    user_settings: Dict[str, any],
+    audio_path: str,
+    source: MediaInfo
+) -> None:
+    """
+    Encode les pistes audio gardées dans un fichier à part (processus enfant du
+    groupe). Avec la normalisation, chaque piste est d'abord mesurée (analyses
+    en parallèle, mémorisées) puis encodée en gain linéaire.
+    """
+    leader = process_registry.get(group)
+    loudness = None
+    if use_split_audio(user_settings, source):
+        # Les analyses passent par l'exécuteur, hors du groupe : SIGSTOP ne les
+        # atteint pas, elles ne démarrent donc pas pendant une pause
+        while leader.is_paused:
+            await asyncio.sleep(1)
+        loudness = await measure_tracks(
+            filepath,
+            selected_audio(user_settings, source),
+            timeout=max(settings.EXEC_TIMEOUT, source.duration / 10)
+        )
+    while leader.is_paused:
+        await asyncio.sleep(1)
+    if leader.kill_reason:
+        raise EncodeStalled(group, leader.kill_reason)
+    key = f"{group}.audio"
+    command = await FFmpegCommandBuilder.build_command(
+        {**user_settings, 'subtitle_action': SubtitleAction.NONE.value},
+        filepath,
+        audio_path,
+        progress_target=process_registry.runtime_paths(key)["progress_path"],
+        video=False,
+        loudness=loudness
+    )
+    await _run_group_process(group, key, command)
+
+
+async def _mux_streams(
+    video_input: List[str],
+    audio_path: Optional[str],
+    filepath: str,
+    user_settings: Dict[str, any],
+    output_filepath: str,
+    timeout: float,
+    subtitle_path: Optional[str] = None
+) -> Tuple[bool, str]:
+    """Assemble la vidéo encodée, l'audio encodé à part et les sous-titres de la source (copie des flux)"""
+    cmd = ['ffmpeg', '-hide_banner', '-loglevel', 'error', '-y', *video_input]
+    maps = ['-map', '0:v:0']
+    codecs = ['-c:v', 'copy']
+    if audio_path:
+        cmd.extend(['-i', audio_path])
+        maps.extend(['-map', '1:a'])
+        codecs.extend(['-c:a', 'copy'])
+
+    subtitle_action = SubtitleAction(user_settings.get('subtitle_action', 'embed'))
+    subtitle_streams = await list_subtitle_streams(filepath)
+    burned = subtitle_action == SubtitleAction.BURN and subtitle_path
+    if subtitle_action != SubtitleAction.NONE and subtitle_streams and not burned:
+        selected_global_idx = select_subtitle_index(user_settings.get('selected_subtitle_track'), subtitle_streams)
+        cmd.extend(['-i', filepath])
+        maps.extend(['-map', f'{2 if audio_path else 1}:{selected_global_idx}'])
+        if subtitle_action == SubtitleAction.EMBED:
+            codecs.extend(['-c:s', 'mov_text'])
+        elif subtitle_action == SubtitleAction.COPY:
+            codecs.extend(['-c:s', 'copy'])
+
+    return await run_async_command(cmd + maps + codecs + [output_filepath], timeout=timeout, pool=LONG_PASS_POOL)
+
+
+async def _run_group_process(
+    group: str,
+    key: str,
+    command: List[str],
+    job: Optional[JobRecord] = None,
+    user_settings: Optional[Dict[str, any]] = None
+) -> None:
+    """
+    Lance un processus enfant d'un groupe (segment, vidéo, audio) et suit sa
+    progression. Avec job, elle est publiée et affichée au nom du groupe,
+    avec les réglages effectifs de l'encodage (user_settings).
+    """
+    managed = await process_registry.spawn(key, command, group=group)
+    try:
+        if job:
+            await handle_progress(job, user_settings or job.settings, key, group=group)
+        else:
+            async for snapshot in follow_progress(key):
+                if snapshot.ended:
+                    break
+        returncode = await process_registry.wait(key)
+        error_msg = process_registry.error_tail(key)
+    except asyncio.CancelledError:
+        # Les segments ne sont pas ré-adoptables : arrêt même en cas de redémarrage à chaud
+        process_registry.kill(key)
+        raise
+    finally:
+        process_registry.remove_runtime_files(key)
+        process_registry.unregister(key)
+
+    if managed.kill_reason:
+        raise EncodeStalled(group, managed.kill_reason)
+    if returncode != 0:
+        logger.error(f"Erreur d'encodage ({key}) : {error_msg}")
+        raise Exception(f"Échec d'encodage FFmpeg ({key}) : {error_msg}")
+
+
+async def _report_group_progress(job: JobRecord, job_id: str, segments: list, done: Dict[int, float], workers: int):
+    """Progression agrégée d'un encodage segmenté (segments terminés + en cours)"""
+    client = job.get_client()
+    filename = os.path.basename(job.filepath)
+    total_time = sum(segment.duration for segment in segments)
+    last_message_text = None
+
+    while True:
+        await asyncio.sleep(10)
+        leader = process_registry.get(job_id)
+        if not leader or total_time <= 0:
+            continue
+
+        running = sum(m.out_time for m in process_registry.children(job_id) if ".seg" in m.task_id)
+        processed = min(total_time, sum(done.values()) + running)
+        process_registry.update_progress(job_id, processed, None)
+
+        active_time = leader.active_seconds()
+        speed = processed / active_time if active_time > 0 else None
+        percentage = processed / total_time * 100
+        remaining_time = math.floor((total_time - processed) / speed) if speed else None
+        event_bus.publish(PROGRESS, job_id, progress=percentage, speed=speed, eta=remaining_time)
+
+        bar_len = 10
+        filled_len = int(bar_len * percentage / 100)
+        progress_bar = '━' * filled_len + '─' * (bar_len - filled_len)
+        speed_str = f"{speed:.1f}x" if speed else "N/A"
+        remaining_str = format_duration(remaining_time) if remaining_time and remaining_time > 0 else "Calcul..."
+
+        new_message_text = (
+            f"<b>🎬 Encodage segmenté de:</b> <code>{filename}</code>\n\n"
+            f"<b>{percentage:.1f}%</b> |{progress_bar}|\n\n"
+            f"<b>⏱ Progress:</b> {format_duration(int(processed))} / {format_duration(int(total_time))}\n"
+            f"<b>⏳ Lapsis:</b> {remaining_str} | <b>🚀 Speed:</b> {speed_str}\n"
+            f"<b>🧩 Segments:</b> {len(done)}/{len(segments)} | <b>⚙️ Parallèles:</b> {workers}\n"
+        )
+        if new_message_text != last_message_text:
+            try:
+                await edit_msg(
+                    client,
+                    job.chat_id,
+                    job.status_message_id,
+                    stylize_value(new_message_text),
+                    parse=ParseMode.HTML
+                )
+                last_message_text = new_message_text
+            except Exception as e:
+                if "MESSAGE_NOT_MODIFIED" not in str(e):
+                    logger.debug(f"Progression segmentée non publiée: {e}")
+
+
+async def wait_encode(
+    job: JobRecord,
+    job_id: str,
+    output_filepath: str,
+    user_settings: Optional[Dict[str, any]] = None
+) -> str:
+    """
+    Suit un encodage enregistré dans le registre (lancé ici ou ré-adopté après
+    un redémarrage à chaud) jusqu'à sa fin. user_settings : réglages effectifs
+    (mode sûr, surcharges), ceux de la tâche par défaut.
+    """
+    try:
+        await handle_progress(job, user_settings or job.settings, job_id)
+        returncode = await process_registry.wait(job_id)
+        error_msg = process_registry.error_tail(job_id)
+        kill_reason = process_registry.get(job_id).kill_reason
+    except asyncio.CancelledError:
+        managed = process_registry.get(job_id)
+        if not (managed and managed.detached):
+            process_registry.kill(job_id)
+        raise
+    finally:
+        managed = process_registry.get(job_id)
+        if not (managed and managed.detached):
+            process_registry.remove_runtime_files(job_id)
+            disk_manager.discard(job_id, kinds=["runtime"])
+        process_registry.unregister(job_id)
+
+    if kill_reason:
+        raise EncodeStalled(job_id, kill_reason)
+
+    if returncode != 0:
         logger.error(f"Erreur d'encodage : {error_msg}")
         raise Exception(f"Échec d'encodage FFmpeg : {error_msg}")
 
-    if not os.path.exists(output_filepath):
+    if not output_filepath or not os.path.exists(output_filepath):
         logger.error(f"Fichier manquant après encodage : {output_filepath}")
         raise FileNotFoundError("Fichier de sortie introuvable après encodage")
 
     return output_filepath
 
 
-async def handle_progress(proc, msg, message, filepath, user_settings: dict):
-    """Handle progress updates during encoding with rich information"""
+async def handle_progress(job: JobRecord, user_settings: dict, task_id: str, group: Optional[str] = None):
+    """
+    Suit la progression d'un encodage : instantanés typés publiés aux abonnés
+    (file d'attente, métriques) toutes les PROGRESS_PUBLISH_INTERVAL secondes,
+    message de statut mis à jour toutes les 10 secondes. Pour un processus
+    enfant, la progression est reportée sur la tâche du groupe.
+    """
+    publish_id = group or task_id
     COMPRESSION_START_TIME = time.time()
-    total_time = await get_duration(filepath) or 0
+    filepath = job.filepath
+    client = job.get_client()
+    total_time = job.duration or await get_duration(filepath) or 0
     file_size = os.path.getsize(filepath)
     filename = os.path.basename(filepath)
 
@@ -488,54 +1180,54 @@ async def handle_progress(proc, msg, message, filepath, user_settings: dict):
     resolution = Resolution(user_settings.get("resolution", "original")).display_name
 
     last_update = 0
-    frame_count = None
-    bitrate = None
-    speed = None
-    elapsed_time_us = None
+    last_publish = 0
     last_message_text = None
 
-    while True:
-        if proc.returncode is not None:
+    async for snapshot in follow_progress(task_id):
+        if snapshot.ended:
             break
+        if group:
+            process_registry.update_progress(group, snapshot.out_time, snapshot.speed)
 
-        line = await proc.stdout.readline()
-        if not line:
-            if proc.returncode is not None:
-                break
-            await asyncio.sleep(0.1)
+        now = time.time()
+        if now - last_publish < PROGRESS_PUBLISH_INTERVAL:
             continue
+        last_publish = now
 
-        line = line.decode(errors="ignore").strip()
+        # Temps d'exécution réel : les périodes de suspension sont exclues
+        managed = process_registry.get(publish_id)
+        active_time = managed.active_seconds(now) if managed else (now - COMPRESSION_START_TIME)
 
-        if m := re.match(r"frame=(\d+)", line):
-            frame_count = int(m.group(1))
-        elif m := re.match(r"bitrate=([\d\.kKmM]+k?b/s)", line, re.I):
-            bitrate = m.group(1)
-        elif m := re.match(r"speed=([\d\.]+)x", line):
-            try:
-                speed = float(m.group(1))
-            except:
-                speed = None
-        elif m := re.match(r"out_time_ms=(\d+)", line):
-            elapsed_time_us = int(m.group(1))
-        elif m := re.match(r"progress=(\w+)", line):
-            if m.group(1) == "end":
-                break
+        elapsed_time = snapshot.out_time or active_time
+        percentage = (elapsed_time / total_time * 100) if total_time > 0 else 0
+        percentage = min(percentage, 100.0)
+
+        # La vitesse rapportée par FFmpeg inclut le temps suspendu, on la recalcule
+        effective_speed = snapshot.speed
+        if managed and snapshot.out_time and active_time > 0:
+            effective_speed = elapsed_time / active_time
+
+        remaining_time = math.floor((total_time - elapsed_time) / effective_speed) if effective_speed and effective_speed > 0 else None
+
+        event_bus.publish(
+            PROGRESS,
+            publish_id,
+            progress=percentage,
+            speed=effective_speed,
+            eta=remaining_time,
+            frame=snapshot.frame,
+            fps=snapshot.fps,
+            bitrate=snapshot.bitrate,
+            total_size=snapshot.total_size,
+            out_time=snapshot.out_time,
+        )
 
-        now = time.time()
         if now - last_update < 10:
             continue
         last_update = now
 
-        elapsed_time = (elapsed_time_us / 1_000_000) if elapsed_time_us else (now - COMPRESSION_START_TIME)
-        percentage = (elapsed_time / total_time * 100) if total_time > 0 else 0
-        percentage = min(percentage, 100.0)
-
-        remaining_time = math.floor((total_time - elapsed_time) / speed) if speed and speed > 0 else None
-
-        if speed and elapsed_time > 0:
-            processed_size = min(file_size, (elapsed_time / total_time) * file_size) if total_time > 0 else 0
-            size_progress = f"{processed_size / (1024*1024):.1f}/{file_size / (1024*1024):.1f} MB"
+        if snapshot.total_size:
+            size_progress = f"{humanbytes(snapshot.total_size)} (source {humanbytes(file_size)})"
         else:
             size_progress = "Calculating..."
 
@@ -543,13 +1235,12 @@ async def handle_progress(proc, msg, message, filepath, user_settings: dict):
         filled_len = int(bar_len * percentage / 100)
         progress_bar = '━' * filled_len + '─' * (bar_len - filled_len)
 
-        speed_str = f"{speed:.1f}x" if speed is not None else "N/A"
+        speed_str = f"{effective_speed:.1f}x" if effective_speed is not None else "N/A"
         remaining_str = format_duration(remaining_time) if remaining_time and remaining_time > 0 else "Calcul..."
 
         elapsed_str = format_duration(int(elapsed_time))
         total_str = format_duration(int(total_time))
 
-
         new_message_text = (
             f"<b>🎬 Encodage de:</b> <code>{filename}</code>\n"
             f"<b>⚙️ Param:</b> {video_codec} | {audio_codec} | {resolution}\n\n"
@@ -557,14 +1248,17 @@ async def handle_progress(proc, msg, message, filepath, user_settings: dict):
             f"<b>⏱ Progress:</b> {elapsed_str} / {total_str}\n"
             f"<b>⏳ Lapsis:</b> {remaining_str} | <b>🚀 Speed:</b> {speed_str}\n"
             f"<b>📊 Taille:</b> {size_progress}\n"
-            f"<b>🔢 Frames:</b> {frame_count if frame_count is not None else 'N/A'} | <b>📶 Débit:</b> {bitrate or 'N/A'}\n"
+            f"<b>🔢 Frames:</b> {snapshot.frame} ({snapshot.fps:.1f} fps) | <b>📶 Débit:</b> {snapshot.bitrate_text}\n"
         )
 
         if new_message_text != last_message_text:
             try:
-                await msg.edit(
-                    text=stylize_value(new_message_text),
-                    parse_mode=ParseMode.HTML
+                await edit_msg(
+                    client,
+                    job.chat_id,
+                    job.status_message_id,
+                    stylize_value(new_message_text),
+                    parse=ParseMode.HTML
                 )
                 last_message_text = new_message_text
             except Exception as e:
@@ -586,33 +1280,50 @@ def format_duration(seconds: int) -> str:
 async def get_thumbnail(in_filename: str, path: str, ttl: int) -> str:
     """Generate thumbnail from video"""
     out_filename = os.path.join(path, f"{time.time()}.jpg")
-    try:
-        (
-            ffmpeg
-            .input(in_filename, ss=ttl)
-            .output(out_filename, vframes=1)
-            .overwrite_output()
-            .run(capture_stdout=True, capture_stderr=True)
-        )
-        return out_filename
-    except ffmpeg.Error as e:
-        logger.error(f"Thumbnail generation error: {e.stderr.decode()}")
+    success, error = await run_async_command([
+        'ffmpeg', '-hide_banner', '-loglevel', 'error', '-y',
+        '-ss', str(ttl), '-i', in_filename,
+        '-frames:v', '1', out_filename
+    ], timeout=60)
+    if not success:
+        logger.error(f"Thumbnail generation error: {error}")
         return ""
+    return out_filename
 
 
-async def get_duration(filepath: str) -> float:
-    """Get video duration in seconds"""
+async def probe_duration(filepath: str) -> float:
+    """
+    Durée de la vidéo en secondes.
+
+    :raises ProbeError: si ni ffprobe ni hachoir ne la lisent (étape "probe" retentée)
+    """
+    info = await probe(filepath)
+    if info and info.duration:
+        return info.duration
+    # Repli hachoir si ffprobe est indisponible
     try:
         metadata = extractMetadata(createParser(filepath))
-        if metadata and metadata.has("duration"):
-            return metadata.get('duration').seconds
-        return 0
     except Exception as e:
+        raise ProbeError(f"durée illisible pour {filepath}: {e}") from e
+    if metadata and metadata.has("duration"):
+        return metadata.get('duration').seconds
+    raise ProbeError(f"durée introuvable pour {filepath}")
+
+
+async def get_duration(filepath: str) -> float:
+    """Get video duration in seconds (0 si illisible)"""
+    try:
+        return await probe_duration(filepath)
+    except ProbeError as e:
         logger.error(f"Duration detection error: {str(e)}")
         return 0
 
 async def get_video_width_and_height(filepath: str) -> Tuple[int, int]:
     """Get video width and height"""
+    info = await probe(filepath)
+    if info and info.width and info.height:
+        return info.width, info.height
+    # Repli hachoir si ffprobe est indisponible
     try:
         metadata = extractMetadata(createParser(filepath))
         if metadata and metadata.has("width") and metadata.has("height"):
@@ -623,26 +1334,8 @@ async def get_video_width_and_height(filepath: str) -> Tuple[int, int]:
         return 0, 0
 
 async def get_ffmpeg_video_width_and_height(filepath: str) -> Tuple[int, int]:
-    try:
-        cmd = [
-            "ffprobe", "-v", "error",
-            "-select_streams", "v:0",
-            "-show_entries", "stream=width,height",
-            "-of", "csv=p=0:s=x",
-            filepath
-        ]
-        proc = await asyncio.create_subprocess_exec(
-            *cmd,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE
-        )
-        stdout, _ = await proc.communicate()
-        if proc.returncode == 0:
-            dims = stdout.decode().strip()
-            if dims:
-                width, height = dims.split('x')
-                return int(width), int(height)
-        return 0, 0
-    except Exception as e:
-        logger.error(f"Width/Height detection error: {str(e)}")
-        return 0, 0
\ No newline at end of file
+    """Get video width and height from the shared ffprobe analysis"""
+    info = await probe(filepath)
+    if info:
+        return info.width, info.height
+    return 0, 0
\ No newline at end of file
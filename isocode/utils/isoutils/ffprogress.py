@@ -0,0 +1,147 @@
+import asyncio
+import os
+from dataclasses import dataclass
+from typing import AsyncIterator, Dict, Optional
+from isocode.utils.isoutils.process import process_registry
+
+# Attente entre deux lectures sans nouvelles données (progression et stderr)
+POLL_INTERVAL = 0.5
+READ_CHUNK = 65536
+# Intervalle min entre deux instantanés publiés aux abonnés (file, métriques)
+PROGRESS_PUBLISH_INTERVAL = 2.0
+
+
+def _float(value: Optional[str], suffix: str = "") -> Optional[float]:
+    """Valeur numérique d'un champ -progress ("N/A" et champs absents -> None)"""
+    if not value:
+        return None
+    try:
+        return float(value[:-len(suffix)] if suffix and value.endswith(suffix) else value)
+    except ValueError:
+        return None
+
+
+def _clock(value: Optional[str]) -> Optional[float]:
+    """Durée HH:MM:SS.micro en secondes"""
+    try:
+        hours, minutes, seconds = (value or "").split(":")
+        return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+    except ValueError:
+        return None
+
+
+@dataclass(frozen=True)
+class ProgressSnapshot:
+    """Un bloc de -progress (lignes key=value jusqu'à progress=continue|end)"""
+    frame: int = 0
+    fps: float = 0.0
+    # Débit de sortie en kb/s, None tant que FFmpeg l'ignore
+    bitrate: Optional[float] = None
+    # Octets écrits dans la sortie
+    total_size: int = 0
+    # Position dans la vidéo en secondes
+    out_time: float = 0.0
+    speed: Optional[float] = None
+    ended: bool = False
+
+    @property
+    def bitrate_text(self) -> str:
+        return f"{self.bitrate:.1f}kbits/s" if self.bitrate is not None else "N/A"
+
+    @classmethod
+    def from_block(cls, block: Dict[str, str], ended: bool = False) -> "ProgressSnapshot":
+        # out_time_us et out_time_ms sont tous deux en microsecondes (historique FFmpeg)
+        micro = block.get("out_time_us") or block.get("out_time_ms") or ""
+        out_time = int(micro) / 1_000_000 if micro.isdigit() else _clock(block.get("out_time"))
+        return cls(
+            frame=int(_float(block.get("frame")) or 0),
+            fps=_float(block.get("fps")) or 0.0,
+            bitrate=_float(block.get("bitrate"), "kbits/s"),
+            total_size=int(_float(block.get("total_size")) or 0),
+            out_time=max(out_time or 0.0, 0.0),
+            speed=_float(block.get("speed"), "x"),
+            ended=ended,
+        )
+
+
+class ProgressParser:
+    """Assemble les lignes key=value de -progress en un instantané par bloc"""
+
+    def __init__(self):
+        self.block: Dict[str, str] = {}
+
+    def feed(self, line: str) -> Optional[ProgressSnapshot]:
+        """Instantané complet quand la ligne ferme un bloc (progress=...), None sinon"""
+        key, sep, value = line.partition("=")
+        if not sep:
+            return None
+        key, value = key.strip(), value.strip()
+        if key != "progress":
+            self.block[key] = value
+            return None
+        snapshot = ProgressSnapshot.from_block(self.block, ended=value == "end")
+        self.block = {}
+        return snapshot
+
+
+async def read_progress_lines(task_id: str) -> AsyncIterator[str]:
+    """
+    Lit le fichier de progression FFmpeg au fil de l'eau, par blocs : toutes
+    les lignes déjà écrites sont traitées avant la prochaine attente.
+    """
+    managed = process_registry.get(task_id)
+    progress_file = None
+    pending = ""
+    try:
+        while True:
+            if progress_file is None:
+                if managed and managed.progress_path and os.path.exists(managed.progress_path):
+                    progress_file = open(managed.progress_path, "r", errors="ignore")
+                    continue
+                if not process_registry.is_running(task_id):
+                    return
+                await asyncio.sleep(POLL_INTERVAL)
+                continue
+
+            chunk = progress_file.read(READ_CHUNK)
+            if not chunk:
+                if not process_registry.is_running(task_id):
+                    return
+                await asyncio.sleep(POLL_INTERVAL)
+                continue
+
+            *lines, pending = (pending + chunk).split("\n")
+            for line in lines:
+                yield line
+    finally:
+        if progress_file:
+            progress_file.close()
+
+
+async def _drain_stderr(task_id: str) -> None:
+    """Vide stderr en continu pendant l'encodage (tampon borné du registre)"""
+    while True:
+        process_registry.drain_stderr(task_id)
+        await asyncio.sleep(POLL_INTERVAL)
+
+
+async def follow_progress(task_id: str) -> AsyncIterator[ProgressSnapshot]:
+    """
+    Instantanés de progression d'un processus du registre, un par bloc
+    -progress, jusqu'à progress=end ou la fin du processus. stderr est vidé
+    en parallèle dans le tampon circulaire du processus.
+    """
+    parser = ProgressParser()
+    drainer = asyncio.ensure_future(_drain_stderr(task_id))
+    try:
+        async for line in read_progress_lines(task_id):
+            snapshot = parser.feed(line)
+            if snapshot is None:
+                continue
+            process_registry.update_progress(task_id, snapshot.out_time, snapshot.speed)
+            yield snapshot
+            if snapshot.ended:
+                return
+    finally:
+        drainer.cancel()
+        process_registry.drain_stderr(task_id)
@@ -0,0 +1,198 @@
+import hashlib
+import os
+import shutil
+import time
+from typing import Dict, List, Optional, Tuple
+from isocode import logger, settings, font_store_dir
+from isocode.utils.isoutils.executor import ToolError, run_tool
+from isocode.utils.isoutils.metrics import metrics
+from isocode.utils.isoutils.probe import MediaInfo, StreamInfo
+
+GB = 1024 * 1024 * 1024
+# Formats lus par libass (FreeType)
+FONT_EXTENSIONS = {".ttf", ".otf", ".ttc", ".otc", ".pfb", ".pfa", ".woff", ".woff2"}
+FONT_MIMETYPES = {
+    "application/x-truetype-font", "application/x-font-ttf", "application/x-font-otf",
+    "application/x-font", "application/font-sfnt", "application/vnd.ms-opentype",
+    "application/vnd.ms-fontobject", "font/ttf", "font/otf", "font/sfnt", "font/collection",
+    "font/woff", "font/woff2",
+}
+# Sous-répertoire du store recevant les extractions en cours
+INCOMING_DIR = ".incoming"
+EXTRACT_TIMEOUT = 120 # in seconds
+
+
+def is_font(stream: StreamInfo) -> bool:
+    """Pièce jointe de police, d'après son type MIME ou son extension"""
+    mimetype = (stream.mimetype or "").lower()
+    extension = os.path.splitext(stream.filename or "")[1].lower()
+    return mimetype in FONT_MIMETYPES or extension in FONT_EXTENSIONS
+
+
+def font_attachments(info: Optional[MediaInfo]) -> List[Tuple[int, StreamInfo]]:
+    """Polices jointes au fichier, avec leur identifiant mkvextract (rang parmi les pièces jointes, à partir de 1)"""
+    if not info:
+        return []
+    return [(rank, stream) for rank, stream in enumerate(info.attachments, 1) if is_font(stream)]
+
+
+def fonts_dir_for(subtitle_path: str) -> str:
+    """Répertoire des polices d'une tâche, à côté de ses sous-titres extraits"""
+    return f"{os.path.splitext(subtitle_path)[0]}.fonts"
+
+
+def escape_filter_path(path: str) -> str:
+    """Chemin utilisable entre quotes dans une option de filtre FFmpeg"""
+    return path.replace(':', '\\\\:').replace("'", "\\\\'")
+
+
+def _file_hash(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class FontStore:
+    """
+    Polices indexées par empreinte SHA-256 de leur contenu. Une police déjà
+    vue n'est stockée qu'une fois ; chaque tâche reçoit un répertoire de liens
+    vers le store, passé à libass (fontsdir) : ni fc-cache ni /usr/share/fonts.
+    """
+
+    def __init__(self, root: str, quota: float):
+        self.root = root
+        self.quota = int(quota * GB)
+        # (chemin, taille, mtime) -> polices (nom d'origine, empreinte) déjà extraites
+        self.index: Dict[Tuple[str, int, float], List[Tuple[str, str]]] = {}
+
+    def path(self, digest: str, filename: str) -> str:
+        return os.path.join(self.root, digest[:2], f"{digest}{os.path.splitext(filename)[1].lower()}")
+
+    def add(self, path: str, filename: str) -> str:
+        """Range un fichier extrait dans le store (rename atomique), retourne son empreinte"""
+        digest = _file_hash(path)
+        target = self.path(digest, filename)
+        if os.path.exists(target):
+            os.remove(path)
+            metrics.incr("font_store_hits")
+        else:
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.replace(path, target)
+            metrics.incr("font_store_misses")
+        return digest
+
+    async def _extract(self, filepath: str, fonts: List[Tuple[int, StreamInfo]]) -> List[Tuple[str, str]]:
+        """Extrait les seules pièces jointes de police listées par la sonde"""
+        incoming = os.path.join(self.root, INCOMING_DIR, f"{os.getpid()}-{time.time_ns()}")
+        os.makedirs(incoming, exist_ok=True)
+        targets = [
+            (rank, stream, os.path.join(incoming, f"{rank}{os.path.splitext(stream.filename or '')[1]}"))
+            for rank, stream in fonts
+        ]
+        try:
+            if shutil.which('mkvextract'):
+                cmd = ['mkvextract', 'attachments', filepath, *[f"{rank}:{target}" for rank, _, target in targets]]
+            else:
+                # Repli : FFmpeg écrit les pièces jointes à l'ouverture de l'entrée puis échoue faute de sortie
+                cmd = ['ffmpeg', '-hide_banner', '-loglevel', 'error', '-y']
+                for _, stream, target in targets:
+                    cmd.extend([f'-dump_attachment:{stream.index}', target])
+                cmd.extend(['-i', filepath])
+            try:
+                await run_tool(cmd, timeout=EXTRACT_TIMEOUT)
+            except ToolError as e:
+                logger.warning(f"Extraction des polices impossible pour {filepath}: {e}")
+
+            extracted = []
+            for _, stream, target in targets:
+                if os.path.exists(target) and os.path.getsize(target) > 0:
+                    name = stream.filename or os.path.basename(target)
+                    extracted.append((name, self.add(target, name)))
+            return extracted
+        finally:
+            shutil.rmtree(incoming, ignore_errors=True)
+
+    async def fonts_for(self, filepath: str, info: Optional[MediaInfo]) -> List[Tuple[str, str]]:
+        """Polices d'un fichier (nom d'origine, empreinte), extraites une seule fois par source"""
+        fonts = font_attachments(info)
+        if not fonts:
+            return []
+        key = (info.path, info.size, info.mtime)
+        cached = self.index.get(key)
+        if cached is not None and all(os.path.exists(self.path(digest, name)) for name, digest in cached):
+            return cached
+        extracted = await self._extract(filepath, fonts)
+        self.index[key] = extracted
+        self.prune()
+        return extracted
+
+    def link(self, fonts: List[Tuple[str, str]], directory: str) -> int:
+        """Peuple le répertoire de polices d'une tâche (liens physiques, copie à défaut)"""
+        # Nouvelle tentative : le répertoire est reconstruit à partir du store
+        shutil.rmtree(directory, ignore_errors=True)
+        os.makedirs(directory)
+        linked = set()
+        for position, (name, digest) in enumerate(fonts):
+            # Même police jointe deux fois : un seul lien
+            if digest in linked:
+                continue
+            source = self.path(digest, name)
+            # Noms d'origine gardés ; deux pièces jointes homonymes sont préfixées par leur rang
+            base = os.path.basename(name) or digest
+            target = os.path.join(directory, base)
+            if os.path.exists(target):
+                target = os.path.join(directory, f"{position}-{base}")
+            try:
+                os.link(source, target)
+            except OSError:
+                try:
+                    shutil.copyfile(source, target)
+                except OSError as e:
+                    logger.warning(f"Police {name} non disponible pour la tâche: {e}")
+                    continue
+            # Police utilisée : remontée dans l'ordre LRU du store
+            os.utime(source)
+            linked.add(digest)
+        return len(linked)
+
+    def prune(self) -> None:
+        """Évince les polices les moins récemment utilisées au-delà de FONT_STORE_QUOTA"""
+        if self.quota <= 0:
+            return
+        files = []
+        for directory, dirnames, filenames in os.walk(self.root):
+            dirnames[:] = [name for name in dirnames if name != INCOMING_DIR]
+            for filename in filenames:
+                path = os.path.join(directory, filename)
+                try:
+                    files.append((path, os.stat(path)))
+                except OSError:
+                    continue
+        used = sum(st.st_size for _, st in files)
+        for path, st in sorted(files, key=lambda item: item[1].st_mtime):
+            if used <= self.quota:
+                break
+            try:
+                os.remove(path)
+                used -= st.st_size
+            except OSError:
+                continue
+
+
+font_store = FontStore(font_store_dir, settings.FONT_STORE_QUOTA)
+
+
+async def prepare_fonts(filepath: str, info: Optional[MediaInfo], subtitle_path: str) -> Optional[str]:
+    """
+    Répertoire de polices de la tâche (fontsdir du filtre subtitles), peuplé
+    depuis le store à partir des pièces jointes sondées. None sans police jointe.
+    """
+    fonts = await font_store.fonts_for(filepath, info)
+    if not fonts:
+        return None
+    directory = fonts_dir_for(subtitle_path)
+    linked = font_store.link(fonts, directory)
+    logger.info(f"Polices de {os.path.basename(filepath)}: {linked} liée(s) dans {directory}")
+    return directory
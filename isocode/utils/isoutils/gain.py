@@ -0,0 +1,279 @@
+import math
+import os
+import statistics
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, Mapping, Optional, Tuple
+from isocode import logger, settings
+from isocode.utils.database.database import Resolution
+from isocode.utils.isoutils.disk import disk_manager
+from isocode.utils.isoutils.dbutils import get_gain_history
+from isocode.utils.isoutils.executor import LONG_PASS_POOL, ToolError, run_tool
+from isocode.utils.isoutils.ffmpeg import FFmpegCommandBuilder
+from isocode.utils.isoutils.metrics import metrics
+from isocode.utils.isoutils.probe import MediaInfo
+from isocode.utils.isoutils.remux import VIDEO_CODEC_NAMES, plan_streams
+from isocode.utils.isoutils.targetsize import audio_kbps
+
+ENCODE = "encode"
+WARN = "warn"
+REMUX = "remux"
+SKIP = "skip"
+
+# Paramètres appliqués quand un gain trop faible conduit à remuxer
+REMUX_OVERRIDES = {"video_codec": "copy"}
+
+# Efficacité relative des codecs : débit nécessaire à qualité égale, h264 = 1
+CODEC_EFFICIENCY = {
+    "mpeg2video": 0.5,
+    "mpeg4": 0.7,
+    "vp8": 0.9,
+    "h264": 1.0,
+    "vp9": 1.35,
+    "hevc": 1.45,
+    "av1": 1.7,
+}
+# Débit relatif des presets x264/x265 par rapport à medium
+PRESET_FACTOR = {
+    "ultrafast": 1.6,
+    "superfast": 1.35,
+    "veryfast": 1.2,
+    "faster": 1.1,
+    "fast": 1.05,
+    "medium": 1.0,
+    "slow": 0.95,
+    "slower": 0.92,
+    "veryslow": 0.9,
+}
+REFERENCE_CRF = 23
+# +6 de CRF divise le débit par deux environ
+CRF_HALVING = 6
+REFERENCE_PIXELS = 1920 * 1080
+# Sous-répertoire de scratch des encodages d'échantillons
+SAMPLES_DIR = "gain"
+
+
+def _video_kbps(info: MediaInfo) -> float:
+    """Débit de la piste vidéo, à défaut celui du fichier moins l'audio"""
+    stream = info.video[0]
+    if stream.bit_rate:
+        return stream.bit_rate / 1000
+    return max(info.bit_rate - sum(s.bit_rate for s in info.audio), 0) / 1000
+
+
+def output_pixels(job_settings: Mapping[str, Any], info: MediaInfo) -> int:
+    resolution = Resolution(job_settings.get("resolution", "original"))
+    if resolution != Resolution.ORIGINAL:
+        return resolution.width * resolution.height
+    return info.width * info.height
+
+
+def model_bpp(job_settings: Mapping[str, Any], pixels: int) -> float:
+    """
+    Bits par pixel et par image attendus en sortie : référence libx264 CRF 23
+    medium en 1080p, ajustée par codec, CRF, preset et définition (les grandes
+    définitions demandent moins de bits par pixel).
+    """
+    codec = VIDEO_CODEC_NAMES.get(job_settings.get("video_codec"), "h264")
+    crf = int(job_settings.get("crf", 22))
+    bpp = settings.GAIN_REFERENCE_BPP / CODEC_EFFICIENCY.get(codec, 1.0)
+    bpp *= 2 ** ((REFERENCE_CRF - crf) / CRF_HALVING)
+    bpp *= PRESET_FACTOR.get(job_settings.get("preset"), 1.0)
+    return bpp * (REFERENCE_PIXELS / max(pixels, 1)) ** 0.25
+
+
+def gain_profile(job_settings: Mapping[str, Any], info: MediaInfo, source_bpp: float) -> str:
+    """Clé des encodages comparables : codecs, réglages, définition et tranche de bpp source"""
+    return ":".join([
+        f"{info.video[0].codec_name}>{job_settings.get('video_codec')}",
+        str(job_settings.get("preset")),
+        f"crf{job_settings.get('crf')}",
+        str(job_settings.get("resolution", "original")),
+        f"h{info.height}",
+        f"b{round(math.log2(source_bpp) * 2)}",
+    ])
+
+
+@dataclass
+class GainPrediction:
+    """Taille de sortie prévue d'un encodage et décision associée"""
+    profile: str
+    method: str
+    source_size: int
+    source_bpp: float
+    video_bytes: float
+    audio_bytes: float
+    correction: float = 1.0
+    samples: int = 0
+    action: str = ENCODE
+    reason: str = ""
+
+    @property
+    def predicted_size(self) -> int:
+        return int(self.video_bytes * self.correction + self.audio_bytes)
+
+    @property
+    def gain(self) -> float:
+        """Part de la taille source économisée (négative si la sortie grossit)"""
+        return 1 - self.predicted_size / self.source_size
+
+    def to_record(self) -> Dict[str, Any]:
+        record = asdict(self)
+        record.update(
+            predicted_size=self.predicted_size,
+            gain=round(self.gain, 4),
+            encoded=self.action in (ENCODE, WARN),
+        )
+        return record
+
+
+def estimate(job_settings: Mapping[str, Any], info: Optional[MediaInfo]) -> Optional[GainPrediction]:
+    """
+    Prédiction par le modèle seul. None quand la sortie n'est pas ré-encodée
+    ou que la taille n'est pas l'objectif (copie, taille cible, incrustation).
+    """
+    if not info or not info.video or info.duration <= 0 or not info.size:
+        return None
+    if job_settings.get("video_codec") == "copy" or job_settings.get("target_size"):
+        return None
+    if job_settings.get("hardsub") or job_settings.get("watermark"):
+        return None
+    plan = plan_streams(job_settings, info)
+    if plan and plan.copies_video:
+        return None
+
+    kbps = _video_kbps(info)
+    pixels = info.width * info.height
+    if not kbps or not pixels or not info.fps:
+        return None
+    source_bpp = kbps * 1000 / (pixels * info.fps)
+
+    pixels = output_pixels(job_settings, info)
+    video_bytes = model_bpp(job_settings, pixels) * pixels * info.fps * info.duration / 8
+    return GainPrediction(
+        profile=gain_profile(job_settings, info, source_bpp),
+        method="modèle",
+        source_size=info.size,
+        source_bpp=round(source_bpp, 4),
+        video_bytes=video_bytes,
+        audio_bytes=audio_kbps(job_settings, info) * 1000 / 8 * info.duration,
+    )
+
+
+async def history_correction(profile: str) -> Tuple[Optional[float], int]:
+    """Écart médian obtenu/prévu des encodages passés du même profil"""
+    try:
+        records = await get_gain_history(profile, settings.GAIN_HISTORY_SIZE)
+    except Exception as e:
+        logger.warning(f"Historique de compression indisponible: {e}")
+        return None, 0
+    ratios = [
+        (r["gain"]["actual_size"] - r["gain"]["audio_bytes"]) / r["gain"]["video_bytes"]
+        for r in records
+        if r.get("gain", {}).get("video_bytes")
+    ]
+    ratios = [ratio for ratio in ratios if ratio > 0]
+    if len(ratios) < settings.GAIN_HISTORY_MIN:
+        return None, len(ratios)
+    return statistics.median(ratios), len(ratios)
+
+
+async def sample_correction(
+    job_settings: Mapping[str, Any],
+    info: MediaInfo,
+    job_id: str
+) -> Optional[float]:
+    """
+    Encode GAIN_SAMPLE_COUNT courtes fenêtres réparties sur la vidéo avec les
+    réglages de la tâche, et rapporte leur taille à celle prévue par le modèle.
+    """
+    count = settings.GAIN_SAMPLE_COUNT
+    length = settings.GAIN_SAMPLE_SECONDS
+    if count <= 0 or info.duration < count * length * 2:
+        return None
+
+    sample_settings = {
+        **job_settings,
+        "audio_track_action": "none",
+        "subtitle_action": "none",
+        "smart_remux": False,
+    }
+    pixels = output_pixels(job_settings, info)
+    window_bytes = model_bpp(job_settings, pixels) * pixels * info.fps * length / 8
+    workdir = disk_manager.job_dir(job_id, SAMPLES_DIR)
+    disk_manager.track(job_id, workdir, "gain_samples")
+    encoded = 0
+    try:
+        for n in range(count):
+            start = info.duration * (n + 1) / (count + 1)
+            output = os.path.join(workdir, f"sample_{n}.mkv")
+            cmd = await FFmpegCommandBuilder.build_command(sample_settings, info.path, output)
+            position = cmd.index('-i')
+            cmd[position:position] = ['-ss', f'{start:.2f}', '-t', str(length)]
+            result = await run_tool(
+                cmd,
+                timeout=max(settings.EXEC_TIMEOUT, length * 20),
+                capture_stdout=False,
+                pool=LONG_PASS_POOL
+            )
+            if not result.ok or not os.path.exists(output):
+                logger.warning(f"Échantillon {n} de {job_id} non encodé: {result.stderr.strip()[-200:]}")
+                return None
+            encoded += os.path.getsize(output)
+    except ToolError as e:
+        logger.warning(f"Échantillons de {job_id} impossibles: {e}")
+        return None
+    finally:
+        disk_manager.discard(job_id, kinds=["gain_samples"])
+    return encoded / (window_bytes * count)
+
+
+async def predict_gain(
+    job_settings: Mapping[str, Any],
+    info: Optional[MediaInfo],
+    job_id: str
+) -> Optional[GainPrediction]:
+    """
+    Taille de sortie prévue : modèle bits/pixel/image, corrigé par les
+    résultats passés du même profil ou, si activés, par des échantillons encodés.
+    La décision (encoder, avertir, remuxer, ignorer) suit le réglage low_gain_action.
+    """
+    prediction = estimate(job_settings, info)
+    if prediction is None:
+        return None
+
+    correction, history = await history_correction(prediction.profile)
+    if correction is not None:
+        prediction.correction = correction
+        prediction.samples = history
+        prediction.method = "historique"
+
+    action = job_settings.get("low_gain_action", WARN)
+    if action != ENCODE and prediction.gain < settings.GAIN_MIN_RATIO:
+        # Sous le seuil : des échantillons réellement encodés confirment avant de renoncer
+        measured = await sample_correction(job_settings, info, job_id)
+        if measured is not None:
+            prediction.correction = measured
+            prediction.samples = settings.GAIN_SAMPLE_COUNT
+            prediction.method = "échantillons"
+
+    if prediction.gain < settings.GAIN_MIN_RATIO:
+        prediction.action = action
+        prediction.reason = f"gain prévu {prediction.gain:+.0%} sous le seuil de {settings.GAIN_MIN_RATIO:.0%}"
+    else:
+        prediction.reason = f"gain prévu {prediction.gain:+.0%}"
+
+    metrics.incr("gain_decisions", action=prediction.action)
+    logger.info(
+        f"Gain de compression {job_id} ({prediction.method}, bpp source {prediction.source_bpp:.3f}): "
+        f"{prediction.reason} -> {prediction.action}"
+    )
+    return prediction
+
+
+def record_result(record: Dict[str, Any], output_path: str) -> Dict[str, Any]:
+    """Complète la décision enregistrée avec la taille obtenue"""
+    actual = os.path.getsize(output_path)
+    record.update(actual_size=actual, actual_gain=round(1 - actual / record["source_size"], 4))
+    if record.get("encoded") and record.get("predicted_size"):
+        metrics.observe("gain_prediction_ratio", actual / record["predicted_size"])
+    return record
@@ -0,0 +1,136 @@
+from enum import Enum
+from types import MappingProxyType
+from typing import Any, Dict, Mapping, Optional
+from pyrogram import Client
+from pyrogram.types import Message
+
+
+class JobRecord:
+    """
+    Enregistrement compact d'une tâche d'encodage.
+
+    Ne conserve que des identifiants et des valeurs simples (aucun objet Pyrogram) :
+    la file reste légère et sérialisable. Les messages et clients sont
+    réhydratés à la demande via les méthodes `get_*`.
+    """
+
+    __slots__ = (
+        "chat_id",
+        "message_id",
+        "status_message_id",
+        "user_id",
+        "file_id",
+        "file_unique_id",
+        "file_name",
+        "file_size",
+        "filepath",
+        "duration",
+        "settings",
+        "deferrable",
+    )
+
+    def __init__(
+        self,
+        chat_id: int,
+        message_id: int,
+        status_message_id: int,
+        user_id: int,
+        filepath: str,
+        settings: Mapping[str, Any],
+        file_id: Optional[str] = None,
+        file_unique_id: Optional[str] = None,
+        file_name: Optional[str] = None,
+        file_size: int = 0,
+        duration: float = 0,
+        deferrable: bool = False,
+    ):
+        self.chat_id = chat_id
+        self.message_id = message_id
+        self.status_message_id = status_message_id
+        self.user_id = user_id
+        self.file_id = file_id
+        self.file_unique_id = file_unique_id
+        self.file_name = file_name
+        self.file_size = file_size
+        self.filepath = filepath
+        self.duration = duration
+        self.settings = settings
+        self.deferrable = deferrable
+
+    @classmethod
+    def from_messages(
+        cls,
+        message: Message,
+        status_msg: Message,
+        filepath: str,
+        settings: Dict[str, Any],
+        duration: float = 0,
+        deferrable: bool = False,
+    ) -> "JobRecord":
+        """Construit l'enregistrement à partir du message source et du message de statut"""
+        media = message.video or message.document
+        return cls(
+            chat_id=message.chat.id,
+            message_id=message.id,
+            status_message_id=status_msg.id,
+            user_id=message.from_user.id,
+            filepath=filepath,
+            settings=snapshot_settings(settings),
+            file_id=getattr(media, "file_id", None),
+            file_unique_id=getattr(media, "file_unique_id", None),
+            file_name=getattr(media, "file_name", None),
+            file_size=getattr(media, "file_size", 0) or 0,
+            duration=duration,
+            deferrable=deferrable,
+        )
+
+    # ==================== Sérialisation ====================
+    def to_dict(self) -> Dict[str, Any]:
+        data = {name: getattr(self, name) for name in self.__slots__}
+        data["settings"] = dict(self.settings)
+        return data
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "JobRecord":
+        data = {name: data[name] for name in cls.__slots__ if name in data}
+        data["settings"] = snapshot_settings(data.get("settings") or {})
+        return cls(**data)
+
+    # ==================== Réhydratation ====================
+    @staticmethod
+    def get_client(client_type: str = "clientbot") -> Optional[Client]:
+        from isocode.utils.telegram.clients import clients
+        return clients.get_client(client_type)
+
+    async def get_message(self) -> Optional[Message]:
+        """Récupère le message source depuis Telegram"""
+        return await self.get_client().get_messages(self.chat_id, self.message_id)
+
+    async def get_status_message(self) -> Optional[Message]:
+        """Récupère le message de statut/progression depuis Telegram"""
+        return await self.get_client().get_messages(self.chat_id, self.status_message_id)
+
+
+# Les instantanés identiques (même utilisateur, mêmes réglages) sont partagés
+_SNAPSHOT_CACHE: Dict[tuple, Mapping[str, Any]] = {}
+_SNAPSHOT_CACHE_SIZE = 1024
+
+
+def snapshot_settings(settings: Mapping[str, Any]) -> Mapping[str, Any]:
+    """Copie figée (lecture seule) des paramètres utilisateur, enums converties en valeurs simples"""
+    values = {
+        key: value.value if isinstance(value, Enum) else value
+        for key, value in settings.items()
+    }
+    try:
+        key = tuple(sorted(values.items()))
+        hash(key)
+    except TypeError:
+        return MappingProxyType(values)
+
+    snapshot = _SNAPSHOT_CACHE.get(key)
+    if snapshot is None:
+        if len(_SNAPSHOT_CACHE) >= _SNAPSHOT_CACHE_SIZE:
+            _SNAPSHOT_CACHE.clear()
+        snapshot = _SNAPSHOT_CACHE[key] = MappingProxyType(values)
+    return snapshot
@@ -0,0 +1,155 @@
+import asyncio
+import json
+import math
+import os
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, List, Mapping, Optional, Sequence, Tuple
+from isocode import logger, settings
+from isocode.utils.isoutils.capabilities import get_capabilities
+from isocode.utils.isoutils.executor import LONG_PASS_POOL, ToolError, run_tool
+from isocode.utils.isoutils.metrics import metrics
+from isocode.utils.isoutils.probe import MediaInfo, StreamInfo
+from isocode.utils.isoutils.remux import selected_audio
+
+# Nombre de mesures (piste d'un fichier) gardées en mémoire
+CACHE_SIZE = 256
+# Sous-répertoire de scratch de l'audio encodé à part
+AUDIO_DIR = "audio"
+# Fréquence de sortie quand la source ne l'indique pas
+DEFAULT_SAMPLE_RATE = 48000
+
+
+def target() -> str:
+    """Cible EBU R128 commune à la mesure et à la normalisation"""
+    return f"I={settings.LOUDNORM_I:g}:TP={settings.LOUDNORM_TP:g}:LRA={settings.LOUDNORM_LRA:g}"
+
+
+def single_pass_filter() -> str:
+    """loudnorm dynamique en une passe (piste non mesurée)"""
+    return f"loudnorm={target()}"
+
+
+@dataclass(frozen=True)
+class LoudnessMeasure:
+    """Mesures d'une piste audio par la première passe de loudnorm"""
+    input_i: float
+    input_tp: float
+    input_lra: float
+    input_thresh: float
+    target_offset: float
+
+    def linear_filter(self, sample_rate: int = 0) -> str:
+        """
+        Seconde passe : gain linéaire calculé d'après les mesures (pas de
+        compression dynamique). loudnorm sort en 192 kHz, la fréquence de la
+        source est rétablie.
+        """
+        return (
+            f"loudnorm={target()}"
+            f":measured_I={self.input_i:g}:measured_TP={self.input_tp:g}"
+            f":measured_LRA={self.input_lra:g}:measured_thresh={self.input_thresh:g}"
+            f":offset={self.target_offset:g}:linear=true"
+            f",aresample={sample_rate or DEFAULT_SAMPLE_RATE}"
+        )
+
+
+def parse_loudnorm(stderr: str) -> Optional[LoudnessMeasure]:
+    """Bloc JSON imprimé par loudnorm=print_format=json (None si absent ou piste muette)"""
+    start, end = stderr.rfind("{"), stderr.rfind("}")
+    if start < 0 or end < start:
+        return None
+    try:
+        data = json.loads(stderr[start:end + 1])
+        values = [float(data[key]) for key in ("input_i", "input_tp", "input_lra", "input_thresh", "target_offset")]
+    except (ValueError, KeyError, TypeError):
+        return None
+    # Piste muette : loudness -inf, aucun gain linéaire possible
+    if not all(math.isfinite(value) for value in values):
+        return None
+    return LoudnessMeasure(*values)
+
+
+def analysis_command(path: str, stream: StreamInfo) -> List[str]:
+    """Première passe : décodage de la seule piste audio, aucune sortie"""
+    return [
+        'ffmpeg', '-hide_banner', '-nostats', '-loglevel', 'info',
+        '-i', path,
+        '-map', f'0:{stream.index}', '-vn', '-sn', '-dn',
+        '-af', f'loudnorm={target()}:print_format=json',
+        '-f', 'null', '-'
+    ]
+
+
+def use_split_audio(job_settings: Mapping[str, Any], info: Optional[MediaInfo]) -> bool:
+    """
+    Audio normalisé à part : mesuré piste par piste puis encodé en gain
+    linéaire, en parallèle de la vidéo, et multiplexé à la fin.
+    """
+    if not settings.LOUDNORM_TWO_PASS or not info or not info.video:
+        return False
+    if not job_settings.get("normalize_audio", True) or job_settings.get("audio_codec", "aac") == "copy":
+        return False
+    capabilities = get_capabilities()
+    if capabilities and not capabilities.has_filter("loudnorm"):
+        return False
+    return bool(selected_audio(job_settings, info))
+
+
+class LoudnessCache:
+    """
+    Mesures mémorisées par (chemin, taille, mtime, piste, cible) : une nouvelle
+    tentative ou un autre encodage de la même source ne refait pas l'analyse.
+    """
+
+    def __init__(self, cache_size: int = CACHE_SIZE):
+        self.cache_size = cache_size
+        self.cache: "OrderedDict[Tuple, Optional[LoudnessMeasure]]" = OrderedDict()
+
+    @staticmethod
+    def _key(path: str, stream: StreamInfo) -> Optional[Tuple]:
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return os.path.abspath(path), st.st_size, st.st_mtime, stream.index, target()
+
+    async def measure(self, path: str, stream: StreamInfo, timeout: float) -> Optional[LoudnessMeasure]:
+        key = self._key(path, stream)
+        if key in self.cache:
+            self.cache.move_to_end(key)
+            metrics.incr("loudness_cache_hits")
+            return self.cache[key]
+
+        metrics.incr("loudness_cache_misses")
+        try:
+            result = await run_tool(
+                analysis_command(path, stream),
+                timeout=timeout,
+                capture_stdout=False,
+                check=True,
+                pool=LONG_PASS_POOL
+            )
+        except ToolError as e:
+            logger.warning(f"Analyse loudness impossible ({path}, piste {stream.index}): {e}")
+            return None
+        metrics.observe("loudness_analysis_seconds", result.elapsed)
+
+        measure = parse_loudnorm(result.stderr)
+        if key is not None:
+            self.cache[key] = measure
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return measure
+
+
+loudness_cache = LoudnessCache()
+
+
+async def measure_tracks(path: str, streams: Sequence[StreamInfo], timeout: float) -> List[Optional[LoudnessMeasure]]:
+    """
+    Mesure les pistes en parallèle (une analyse -vn par piste, dans la limite
+    d'appels FFmpeg de l'exécuteur). None pour une piste non mesurable : elle
+    garde loudnorm en une passe.
+    """
+    return list(await asyncio.gather(*(loudness_cache.measure(path, stream, timeout) for stream in streams)))
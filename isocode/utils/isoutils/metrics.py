@@ -0,0 +1,69 @@
+import time
+from collections import defaultdict, deque
+from typing import Any, Deque, Dict, Tuple
+
+# Nombre d'échantillons conservés par série pour les percentiles
+WINDOW_SIZE = 512
+
+
+def _key(name: str, labels: Dict[str, Any]) -> Tuple:
+    return (name,) + tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_key(key: Tuple) -> str:
+    name, labels = key[0], key[1:]
+    if not labels:
+        return name
+    return f"{name}{{{','.join(f'{k}={v}' for k, v in labels)}}}"
+
+
+class Metrics:
+    """
+    Registre de métriques en mémoire (compteurs et séries d'observations).
+
+    Les étiquettes (ex: resource_class="io") distinguent les séries d'une même métrique.
+    """
+
+    def __init__(self, window: int = WINDOW_SIZE):
+        self.started_at = time.time()
+        self.counters: Dict[Tuple, float] = defaultdict(float)
+        self.samples: Dict[Tuple, Deque[float]] = defaultdict(lambda: deque(maxlen=window))
+        self.totals: Dict[Tuple, Tuple[int, float]] = defaultdict(lambda: (0, 0.0))
+
+    def incr(self, name: str, value: float = 1, **labels) -> None:
+        self.counters[_key(name, labels)] += value
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        key = _key(name, labels)
+        self.samples[key].append(value)
+        count, total = self.totals[key]
+        self.totals[key] = (count + 1, total + value)
+
+    def counter(self, name: str, **labels) -> float:
+        return self.counters.get(_key(name, labels), 0.0)
+
+    def summary(self, name: str, **labels) -> Dict[str, float]:
+        return self._summarize(_key(name, labels))
+
+    def _summarize(self, key: Tuple) -> Dict[str, float]:
+        count, total = self.totals.get(key, (0, 0.0))
+        values = sorted(self.samples.get(key, ()))
+        if not values:
+            return {"count": count, "avg": 0.0, "p50": 0.0, "p95": 0.0, "max": 0.0}
+        return {
+            "count": count,
+            "avg": total / count,
+            "p50": values[len(values) // 2],
+            "p95": values[min(len(values) - 1, int(len(values) * 0.95))],
+            "max": values[-1],
+        }
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "uptime": time.time() - self.started_at,
+            "counters": {_format_key(k): v for k, v in self.counters.items()},
+            "timings": {_format_key(k): self._summarize(k) for k in self.totals},
+        }
+
+
+metrics = Metrics()
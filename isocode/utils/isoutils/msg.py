@@ -23,6 +23,8 @@ class BotMessage:
       ᴀᴠ1 • ᴍᴘ4 • ᴍᴋᴠ • ʜ.265 • ᴠᴘ9 • ᴡᴇʙᴍ
     ➻ ʀᴇ́sᴏʟᴜᴛɪᴏɴs :
       1440ᴘ • 1080ᴘ • 720ᴘ • 480ᴘ
+    ➻ ᴘʟᴜsɪᴇᴜʀs ʀᴇ́sᴏʟᴜᴛɪᴏɴs ᴇɴ ᴜɴ ᴇɴᴄᴏᴅᴀɢᴇ (ʀᴇ́ᴘᴏɴsᴇ ᴀ̀ ᴜɴᴇ ᴠɪᴅᴇ́ᴏ) :
+      /multi • /multi 1080ᴘ 720ᴘ 480ᴘ
     ➻ ᴄᴏɴᴛʀᴏ̂ʟᴇ ᴅᴇ ǫᴜᴀʟɪᴛᴇ́ :
       ʙɪᴛʀᴀᴛᴇ • ᴄʀғ • ғᴘs
     ➻ ᴘʀᴏᴄᴇssᴜs ᴘᴀʀ ғɪᴄʜɪᴇʀ ᴏᴜ ʟɪᴇɴ
@@ -36,6 +38,10 @@ class BotMessage:
     ➻ ᴘʀᴇ́sᴇᴛs ᴏᴘᴛɪᴍɪsᴇ́s :
       ᴡᴇʙ • ᴍᴏʙɪʟᴇ • ᴀʀᴄʜɪᴠᴀɢᴇ
     ➻ ᴇsᴛɪᴍᴀᴛɪᴏɴ ᴛᴀɪʟʟᴇ ғɪɴᴀʟᴇ
+    ➻ ᴛᴀɪʟʟᴇ ᴄɪʙʟᴇ (ʀᴇ́ᴘᴏɴsᴇ ᴀ̀ ᴜɴᴇ ᴠɪᴅᴇ́ᴏ) :
+      /compress 700M • /compress 1.5G
+    ➻ ᴀᴘᴇʀᴄ̧ᴜ ᴀᴠᴀɴᴛ ᴇɴᴄᴏᴅᴀɢᴇ (ʀᴇ́ᴘᴏɴsᴇ ᴀ̀ ᴜɴᴇ ᴠɪᴅᴇ́ᴏ) :
+      /preview
     """
 
     SUBTITLES = """
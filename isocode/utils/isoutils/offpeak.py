@@ -0,0 +1,46 @@
+import time
+from typing import List, Optional, Tuple
+from pyrogram.types import Message
+from isocode import logger, settings
+
+
+def _parse_minutes(value: str) -> int:
+    hours, minutes = value.strip().split(":")
+    return (int(hours) % 24) * 60 + int(minutes)
+
+
+def parse_windows(windows: List[str]) -> List[Tuple[int, int]]:
+    """Convertit des fenêtres "HH:MM-HH:MM" en minutes depuis minuit (peut enjamber minuit)"""
+    parsed = []
+    for window in windows:
+        try:
+            start, end = window.split("-")
+            parsed.append((_parse_minutes(start), _parse_minutes(end)))
+        except ValueError:
+            logger.error(f"Fenêtre heures creuses invalide ignorée: {window!r}")
+    return parsed
+
+
+OFFPEAK_WINDOWS = parse_windows(settings.OFFPEAK_WINDOWS)
+
+
+def is_offpeak(now: Optional[float] = None) -> bool:
+    """Indique si l'heure locale du serveur est dans une fenêtre d'heures creuses"""
+    local = time.localtime(now)
+    minute = local.tm_hour * 60 + local.tm_min
+    for start, end in OFFPEAK_WINDOWS:
+        if start <= end:
+            if start <= minute < end:
+                return True
+        elif minute >= start or minute < end:
+            return True
+    return False
+
+
+def is_deferrable(message: Message) -> bool:
+    """Tâche différable : chat configuré ou drapeau dans la légende du fichier"""
+    chat = message.chat
+    if str(chat.id) in settings.DEFERRED_CHATS or (chat.username and chat.username in settings.DEFERRED_CHATS):
+        return True
+    caption = message.caption or ""
+    return settings.DEFER_FLAG.lower() in caption.lower().split()
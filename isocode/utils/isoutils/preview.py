@@ -0,0 +1,157 @@
+import json
+import os
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, List, Tuple
+from isocode import logger, settings
+from isocode.utils.isoutils.disk import disk_manager
+from isocode.utils.isoutils.executor import LONG_PASS_POOL, describe_exit, run_tool
+from isocode.utils.isoutils.ffmpeg import (
+    SUBTITLES_DIR, FFmpegCommandBuilder, extract_subs, format_duration, output_extension
+)
+from isocode.utils.isoutils.job import JobRecord
+from isocode.utils.isoutils.probe import probe
+from isocode.utils.isoutils.progress import humanbytes
+from isocode.utils.isoutils.retry import FatalStageError
+from isocode.utils.isoutils.targetsize import TargetSizeError, plan_target_size
+
+# Clé des paramètres marquant une tâche d'aperçu
+PREVIEW_KEY = "preview"
+# Sous-répertoire de scratch contenant les extraits de chaque aperçu
+PREVIEW_DIR = "preview"
+REPORT_FILE = "preview.json"
+
+
+def preview_windows(duration: float) -> List[Tuple[float, float]]:
+    """
+    Fenêtres (début, durée) réparties sur la vidéo, hors début et fin
+    (génériques) : aux 1/4, 2/4 et 3/4 pour trois extraits.
+    """
+    count = max(settings.PREVIEW_WINDOWS, 1)
+    length = min(float(settings.PREVIEW_SECONDS), duration / (count + 1))
+    return [(duration * (n + 1) / (count + 1) - length / 2, length) for n in range(count)]
+
+
+def full_settings(job_settings: Dict[str, Any]) -> Dict[str, Any]:
+    """Paramètres de l'encodage complet correspondant à un aperçu"""
+    return {key: value for key, value in job_settings.items() if key != PREVIEW_KEY}
+
+
+@dataclass
+class PreviewClip:
+    """Extrait encodé avec les paramètres de la tâche"""
+    path: str
+    start: float
+    length: float
+    size: int
+    elapsed: float
+
+
+@dataclass
+class PreviewReport:
+    """Extraits d'un aperçu et extrapolations à la vidéo complète"""
+    duration: float
+    source_size: int
+    clips: List[PreviewClip] = field(default_factory=list)
+
+    @property
+    def predicted_size(self) -> int:
+        seconds = sum(clip.length for clip in self.clips)
+        return int(sum(clip.size for clip in self.clips) / seconds * self.duration) if seconds else 0
+
+    @property
+    def speed(self) -> float:
+        """Secondes de vidéo encodées par seconde"""
+        elapsed = sum(clip.elapsed for clip in self.clips)
+        return sum(clip.length for clip in self.clips) / elapsed if elapsed else 0.0
+
+    @property
+    def eta(self) -> float:
+        return self.duration / self.speed if self.speed else 0.0
+
+    def save(self, workdir: str) -> None:
+        with open(os.path.join(workdir, REPORT_FILE), "w", encoding="utf-8") as f:
+            json.dump(asdict(self), f)
+
+    @classmethod
+    def load(cls, workdir: str) -> "PreviewReport":
+        with open(os.path.join(workdir, REPORT_FILE), "r", encoding="utf-8") as f:
+            data = json.load(f)
+        data["clips"] = [PreviewClip(**clip) for clip in data.get("clips", [])]
+        return cls(**data)
+
+    def describe(self) -> str:
+        change = self.predicted_size / self.source_size - 1 if self.source_size else 0.0
+        return (
+            f"🔬 **Aperçu : {len(self.clips)} extraits de {self.clips[0].length:.0f}s**\n\n"
+            f"📦 Taille prévue : {humanbytes(self.predicted_size)} "
+            f"(source {humanbytes(self.source_size)}, {change:+.0%})\n"
+            f"⚡ Vitesse : {self.speed:.2f}x\n"
+            f"⏱ Durée prévue : {format_duration(int(self.eta))}"
+        )
+
+
+async def encode_preview(job: JobRecord, job_id: str) -> str:
+    """
+    Encode quelques fenêtres courtes avec les paramètres de la tâche (recherche
+    rapide avant -i) et mesure taille et vitesse. Retourne le répertoire des
+    extraits, rapport compris.
+    """
+    info = await probe(job.filepath)
+    if not info or info.duration <= 0:
+        raise FatalStageError("Aperçu impossible : durée de la vidéo inconnue")
+
+    job_settings = full_settings(dict(job.settings))
+    if job_settings.get("target_size"):
+        # Mode taille cible : débit calculé, une seule passe suffit pour l'aperçu
+        try:
+            job_settings["video_bitrate"] = plan_target_size(job_settings, info).video_kbps
+        except TargetSizeError as e:
+            raise FatalStageError(f"Taille cible impossible : {e}") from e
+
+    workdir = disk_manager.job_dir(job_id, PREVIEW_DIR)
+    disk_manager.track(job_id, workdir, "preview")
+
+    subtitle_path = None
+    if job_settings.get("hardsub"):
+        subtitle_path = await extract_subs(job.filepath, disk_manager.job_dir(job_id, SUBTITLES_DIR), job_settings)
+        if subtitle_path:
+            disk_manager.track(job_id, subtitle_path, "subtitle")
+
+    report = PreviewReport(duration=info.duration, source_size=info.size)
+    extension = output_extension(job_settings)
+    for n, (start, length) in enumerate(preview_windows(info.duration), start=1):
+        output = os.path.join(workdir, f"apercu_{n}.{extension}")
+        cmd = await FFmpegCommandBuilder.build_command(job_settings, job.filepath, output, subtitle_path)
+        seek = ['-ss', f'{start:.3f}', '-t', f'{length:g}']
+        if subtitle_path or job_settings.get("watermark"):
+            # Les filtres de sous-titres suivent la timeline de la source
+            seek.append('-copyts')
+        position = cmd.index('-i')
+        cmd[position:position] = seek
+
+        started = time.time()
+        result = await run_tool(
+            cmd,
+            timeout=max(settings.EXEC_TIMEOUT, length * 30),
+            capture_stdout=False,
+            pool=LONG_PASS_POOL
+        )
+        if not result.ok or not os.path.exists(output):
+            raise Exception(
+                f"Échec de l'extrait {n} ({describe_exit(result.returncode)}): {result.stderr.strip()[-300:]}"
+            )
+        report.clips.append(PreviewClip(
+            path=output,
+            start=start,
+            length=length,
+            size=os.path.getsize(output),
+            elapsed=time.time() - started,
+        ))
+
+    report.save(workdir)
+    logger.info(
+        f"Aperçu {job_id}: {humanbytes(report.predicted_size)} prévus, "
+        f"{report.speed:.2f}x, {format_duration(int(report.eta))} estimés"
+    )
+    return workdir
@@ -0,0 +1,250 @@
+import asyncio
+import json
+import os
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+from isocode import logger
+from isocode.utils.isoutils.executor import run_tool
+from isocode.utils.isoutils.metrics import metrics
+
+# Nombre de fichiers dont la description est gardée en mémoire
+CACHE_SIZE = 256
+# Délai max d'une analyse ffprobe
+PROBE_TIMEOUT = 60 # in seconds
+
+CODEC_TYPES = {"v": "video", "a": "audio", "s": "subtitle", "d": "data", "t": "attachment"}
+
+
+class ProbeError(Exception):
+    """Fichier dont la durée ne peut être lue (ffprobe et hachoir en échec)"""
+
+
+def _to_float(value: Any) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _to_int(value: Any) -> int:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return 0
+
+
+def _parse_clock(value: Optional[str]) -> float:
+    """Convertit une durée "HH:MM:SS.fffffffff" (tag DURATION de Matroska) en secondes"""
+    if not value:
+        return 0.0
+    seconds = 0.0
+    for part in value.split(":"):
+        seconds = seconds * 60 + _to_float(part)
+    return seconds
+
+
+def _parse_rate(value: Optional[str]) -> float:
+    """Convertit un débit d'images ffprobe ("24000/1001") en nombre"""
+    if not value or value == "0/0":
+        return 0.0
+    if "/" in value:
+        num, den = value.split("/", 1)
+        return _to_float(num) / _to_float(den) if _to_float(den) else 0.0
+    return _to_float(value)
+
+
+@dataclass(frozen=True)
+class StreamInfo:
+    """Description d'une piste (vidéo, audio, sous-titre, pièce jointe...)"""
+    index: int
+    codec_type: str
+    codec_name: Optional[str] = None
+    codec_tag: Optional[str] = None
+    profile: Optional[str] = None
+    language: Optional[str] = None
+    title: Optional[str] = None
+    width: int = 0
+    height: int = 0
+    fps: float = 0.0
+    pix_fmt: Optional[str] = None
+    bit_rate: int = 0
+    channels: int = 0
+    channel_layout: Optional[str] = None
+    sample_rate: int = 0
+    duration: float = 0.0
+    default: bool = False
+    forced: bool = False
+    filename: Optional[str] = None
+    mimetype: Optional[str] = None
+
+    @classmethod
+    def from_ffprobe(cls, data: Dict[str, Any]) -> "StreamInfo":
+        tags = data.get("tags") or {}
+        disposition = data.get("disposition") or {}
+        return cls(
+            index=_to_int(data.get("index")),
+            codec_type=data.get("codec_type") or "unknown",
+            codec_name=data.get("codec_name"),
+            codec_tag=data.get("codec_tag_string"),
+            profile=data.get("profile"),
+            language=tags.get("language"),
+            title=tags.get("title"),
+            width=_to_int(data.get("width")),
+            height=_to_int(data.get("height")),
+            fps=_parse_rate(data.get("avg_frame_rate") or data.get("r_frame_rate")),
+            pix_fmt=data.get("pix_fmt"),
+            bit_rate=_to_int(data.get("bit_rate") or tags.get("BPS")),
+            channels=_to_int(data.get("channels")),
+            channel_layout=data.get("channel_layout"),
+            sample_rate=_to_int(data.get("sample_rate")),
+            duration=_to_float(data.get("duration")) or _parse_clock(tags.get("DURATION")),
+            default=bool(disposition.get("default")),
+            forced=bool(disposition.get("forced")),
+            filename=tags.get("filename"),
+            mimetype=tags.get("mimetype"),
+        )
+
+
+@dataclass(frozen=True)
+class MediaInfo:
+    """Résultat typé d'un unique appel ffprobe sur un fichier"""
+    path: str
+    size: int
+    mtime: float
+    format_name: Optional[str]
+    duration: float
+    bit_rate: int
+    streams: Tuple[StreamInfo, ...]
+
+    def streams_of(self, codec_type: str) -> Tuple[StreamInfo, ...]:
+        codec_type = CODEC_TYPES.get(codec_type, codec_type)
+        return tuple(s for s in self.streams if s.codec_type == codec_type)
+
+    def stream(self, specifier: str) -> Optional[StreamInfo]:
+        """Piste selon un spécificateur FFmpeg simple ("v:0", "a:1", "s")"""
+        codec_type, _, position = specifier.partition(":")
+        streams = self.streams_of(codec_type)
+        position = _to_int(position)
+        return streams[position] if position < len(streams) else None
+
+    @property
+    def video(self) -> Tuple[StreamInfo, ...]:
+        return self.streams_of("video")
+
+    @property
+    def audio(self) -> Tuple[StreamInfo, ...]:
+        return self.streams_of("audio")
+
+    @property
+    def subtitles(self) -> Tuple[StreamInfo, ...]:
+        return self.streams_of("subtitle")
+
+    @property
+    def attachments(self) -> Tuple[StreamInfo, ...]:
+        return self.streams_of("attachment")
+
+    @property
+    def width(self) -> int:
+        return self.video[0].width if self.video else 0
+
+    @property
+    def height(self) -> int:
+        return self.video[0].height if self.video else 0
+
+    @property
+    def fps(self) -> float:
+        return self.video[0].fps if self.video else 0.0
+
+    @classmethod
+    def from_ffprobe(cls, data: Dict[str, Any], path: str, size: int, mtime: float) -> "MediaInfo":
+        fmt = data.get("format") or {}
+        streams = tuple(StreamInfo.from_ffprobe(s) for s in data.get("streams") or [])
+        duration = _to_float(fmt.get("duration")) or max((s.duration for s in streams), default=0.0)
+        return cls(
+            path=path,
+            size=size,
+            mtime=mtime,
+            format_name=fmt.get("format_name"),
+            duration=duration,
+            bit_rate=_to_int(fmt.get("bit_rate")),
+            streams=streams,
+        )
+
+
+class MediaProbe:
+    """
+    Sonde ffprobe unique et mémorisée par (chemin, taille, mtime).
+
+    Les appels concurrents sur un même fichier partagent le même ffprobe.
+    """
+
+    def __init__(self, cache_size: int = CACHE_SIZE):
+        self.cache_size = cache_size
+        self.cache: "OrderedDict[Tuple[str, int, float], MediaInfo]" = OrderedDict()
+        self.pending: Dict[Tuple[str, int, float], asyncio.Future] = {}
+
+    @staticmethod
+    def _key(path: str) -> Optional[Tuple[str, int, float]]:
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return os.path.abspath(path), st.st_size, st.st_mtime
+
+    async def probe(self, path: str) -> Optional[MediaInfo]:
+        key = self._key(path)
+        if key is None:
+            return None
+
+        info = self.cache.get(key)
+        if info is not None:
+            self.cache.move_to_end(key)
+            metrics.incr("probe_cache_hits")
+            return info
+
+        if key in self.pending:
+            return await asyncio.shield(self.pending[key])
+
+        future = asyncio.get_event_loop().create_future()
+        self.pending[key] = future
+        try:
+            info = await self._run_ffprobe(*key)
+            if info is not None:
+                self.cache[key] = info
+                if len(self.cache) > self.cache_size:
+                    self.cache.popitem(last=False)
+            future.set_result(info)
+            return info
+        except BaseException as e:
+            future.set_result(None)
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            logger.error(f"Analyse ffprobe impossible pour {path}: {e}")
+            return None
+        finally:
+            self.pending.pop(key, None)
+
+    async def _run_ffprobe(self, path: str, size: int, mtime: float) -> Optional[MediaInfo]:
+        metrics.incr("probe_cache_misses")
+        result = await run_tool(
+            ["ffprobe", "-v", "error", "-show_format", "-show_streams", "-of", "json", path],
+            timeout=PROBE_TIMEOUT
+        )
+        if not result.ok:
+            logger.error(f"ffprobe a échoué pour {path}: {result.stderr.strip()}")
+            return None
+        return MediaInfo.from_ffprobe(json.loads(result.text or "{}"), path, size, mtime)
+
+    def invalidate(self, path: str) -> None:
+        path = os.path.abspath(path)
+        for key in [k for k in self.cache if k[0] == path]:
+            self.cache.pop(key, None)
+
+
+media_probe = MediaProbe()
+
+
+async def probe(path: str) -> Optional[MediaInfo]:
+    """Description typée et mémorisée d'un fichier média (None si illisible)"""
+    return await media_probe.probe(path)
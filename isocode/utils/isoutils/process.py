@@ -0,0 +1,369 @@
+import asyncio
+import os
+import shlex
+import signal
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, List, Optional
+from isocode import logger, scratch_dir
+
+# Fichiers d'exécution des encodages (progression, stderr, code de sortie) :
+# ils survivent à un redémarrage à chaud du bot
+RUNTIME_DIR = os.path.join(scratch_dir, "ffmpeg")
+ERROR_TAIL_SIZE = 4000
+# Lignes de stderr gardées en mémoire par processus, et lecture max par vidage
+STDERR_TAIL_LINES = 50
+STDERR_READ_LIMIT = 65536
+
+
+@dataclass
+class ManagedProcess:
+    """Processus FFmpeg rattaché à une tâche, avec comptabilité des pauses"""
+    task_id: str
+    pid: int
+    started_at: float
+    paused_at: Optional[float] = None
+    paused_total: float = 0.0
+    resumed_at: Optional[float] = None
+    out_time: float = 0.0
+    speed: Optional[float] = None
+    progress_path: Optional[str] = None
+    log_path: Optional[str] = None
+    exit_path: Optional[str] = None
+    # Résultat remis à la tâche (fichier encodé, répertoire des renditions),
+    # repris après ré-adoption. None : processus intermédiaire (première passe),
+    # non ré-adoptable
+    deliverable: Optional[str] = None
+    # Processus enfant direct (None si adopté après un redémarrage à chaud)
+    proc: Optional[Any] = None
+    detached: bool = False
+    # Surveillance : dernière avancée de out_time, durée max autorisée, motif d'arrêt forcé
+    last_advance_at: float = 0.0
+    max_runtime: Optional[float] = None
+    kill_reason: Optional[str] = None
+    # Encodage segmenté : la tâche est un groupe sans pid propre, ses segments
+    # sont des processus enfants rattachés au groupe
+    is_group: bool = False
+    group: Optional[str] = None
+    # stderr vidé au fil de l'eau depuis le journal : tampon circulaire borné
+    stderr_tail: Deque[str] = field(default_factory=lambda: deque(maxlen=STDERR_TAIL_LINES))
+    stderr_offset: int = 0
+    stderr_pending: str = ""
+
+    @property
+    def is_paused(self) -> bool:
+        return self.paused_at is not None
+
+    def paused_seconds(self, now: Optional[float] = None) -> float:
+        now = now or time.time()
+        current = (now - self.paused_at) if self.paused_at else 0.0
+        return self.paused_total + current
+
+    def active_seconds(self, now: Optional[float] = None) -> float:
+        """Temps d'exécution réel, pauses exclues"""
+        now = now or time.time()
+        return max(0.0, now - self.started_at - self.paused_seconds(now))
+
+
+class ProcessRegistry:
+    """
+    Registre des processus d'encodage en cours.
+
+    Les processus sont lancés dans leur propre session (start_new_session=True),
+    ce qui permet de suspendre/reprendre tout le groupe via SIGSTOP/SIGCONT.
+    """
+
+    def __init__(self):
+        self.processes: Dict[str, ManagedProcess] = {}
+
+    def register(self, task_id: str, pid: int) -> ManagedProcess:
+        now = time.time()
+        managed = ManagedProcess(task_id=task_id, pid=pid, started_at=now, last_advance_at=now)
+        self.processes[task_id] = managed
+        return managed
+
+    def open_group(self, task_id: str) -> ManagedProcess:
+        """
+        Enregistre une tâche composée de plusieurs processus (encodage segmenté).
+        Pause, reprise et arrêt de la tâche s'appliquent à tous ses enfants.
+        """
+        managed = self.register(task_id, pid=0)
+        managed.is_group = True
+        return managed
+
+    def children(self, task_id: str) -> List[ManagedProcess]:
+        return [m for m in self.processes.values() if m.group == task_id]
+
+    # ==================== Processus détachables ====================
+    @staticmethod
+    def runtime_paths(task_id: str) -> Dict[str, str]:
+        os.makedirs(RUNTIME_DIR, exist_ok=True)
+        base = os.path.join(RUNTIME_DIR, task_id)
+        return {
+            "progress_path": f"{base}.progress",
+            "log_path": f"{base}.log",
+            "exit_path": f"{base}.exit",
+        }
+
+    async def spawn(
+        self,
+        task_id: str,
+        command: List[str],
+        group: Optional[str] = None,
+        deliverable: Optional[str] = None
+    ) -> ManagedProcess:
+        """
+        Lance une commande détachable : session dédiée, aucune pipe vers le bot.
+        La progression (-progress) et stderr vont dans des fichiers, et le code de
+        sortie est écrit par un shell enveloppe : le processus peut être ré-adopté
+        par une nouvelle instance du bot.
+        """
+        paths = self.runtime_paths(task_id)
+        for path in paths.values():
+            if os.path.exists(path):
+                os.remove(path)
+        wrapper = f'"$@"; rc=$?; echo $rc > {shlex.quote(paths["exit_path"])}; exit $rc'
+        with open(paths["log_path"], "wb") as log_file:
+            proc = await asyncio.create_subprocess_exec(
+                "sh", "-c", wrapper, "sh", *command,
+                stdin=asyncio.subprocess.DEVNULL,
+                stdout=asyncio.subprocess.DEVNULL,
+                stderr=log_file,
+                start_new_session=True
+            )
+        managed = self.register(task_id, proc.pid)
+        managed.proc = proc
+        managed.group = group
+        managed.progress_path = paths["progress_path"]
+        managed.log_path = paths["log_path"]
+        managed.exit_path = paths["exit_path"]
+        managed.deliverable = deliverable
+        return managed
+
+    def adopt(self, task_id: str, state: Dict[str, Any]) -> Optional[ManagedProcess]:
+        """Ré-adopte un processus lancé par une instance précédente du bot"""
+        managed = ManagedProcess(
+            task_id=task_id,
+            pid=state["pid"],
+            started_at=state.get("started_at") or time.time(),
+            paused_total=state.get("paused_total", 0.0),
+            out_time=state.get("out_time", 0.0),
+            progress_path=state.get("progress_path"),
+            log_path=state.get("log_path"),
+            exit_path=state.get("exit_path"),
+            deliverable=state.get("deliverable"),
+            last_advance_at=time.time(),
+            max_runtime=state.get("max_runtime"),
+        )
+        if not self._pid_alive(managed) and not (managed.exit_path and os.path.exists(managed.exit_path)):
+            return None
+        self.processes[task_id] = managed
+        logger.info(f"Processus ré-adopté: {task_id} (pid {managed.pid})")
+        return managed
+
+    def export_state(self, task_id: str) -> Optional[Dict[str, Any]]:
+        managed = self.processes.get(task_id)
+        # Les groupes (segments relancés) et les processus intermédiaires ne sont pas ré-adoptables
+        if not managed or managed.is_group or not managed.progress_path or not managed.deliverable:
+            return None
+        return {
+            "pid": managed.pid,
+            "started_at": managed.started_at,
+            "paused_total": managed.paused_seconds(),
+            "out_time": managed.out_time,
+            "progress_path": managed.progress_path,
+            "log_path": managed.log_path,
+            "exit_path": managed.exit_path,
+            "deliverable": managed.deliverable,
+            "max_runtime": managed.max_runtime,
+        }
+
+    def detach_all(self) -> None:
+        """Prépare un redémarrage à chaud : les processus ne seront pas tués et reprennent s'ils sont suspendus"""
+        for managed in list(self.processes.values()):
+            if managed.group or not (managed.is_group or managed.deliverable):
+                # Segment ou passe intermédiaire non ré-adoptable : arrêté, ré-encodé à la reprise
+                self.kill(managed.task_id)
+                continue
+            managed.detached = True
+            if managed.is_paused:
+                self.resume(managed.task_id)
+
+    def _pid_alive(self, managed: ManagedProcess) -> bool:
+        try:
+            os.kill(managed.pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            pass
+        # Protection contre la réutilisation du PID : la ligne de commande doit viser nos fichiers
+        try:
+            with open(f"/proc/{managed.pid}/cmdline", "rb") as f:
+                cmdline = f.read().decode(errors="ignore")
+            with open(f"/proc/{managed.pid}/stat", "rb") as f:
+                if f.read().split(b")")[-1].split()[0] == b"Z":
+                    return False
+            return not managed.exit_path or managed.exit_path in cmdline
+        except OSError:
+            return True
+
+    def is_running(self, task_id: str) -> bool:
+        managed = self.processes.get(task_id)
+        if not managed:
+            return False
+        if managed.is_group:
+            return any(self.is_running(child.task_id) for child in self.children(task_id))
+        if managed.proc is not None:
+            return managed.proc.returncode is None
+        return self._pid_alive(managed)
+
+    async def wait(self, task_id: str, poll_interval: float = 1.0) -> int:
+        """Attend la fin du processus et retourne son code de sortie (-1 si inconnu)"""
+        managed = self.processes.get(task_id)
+        if not managed:
+            return -1
+        if managed.proc is not None:
+            return await managed.proc.wait()
+        while self._pid_alive(managed):
+            await asyncio.sleep(poll_interval)
+        try:
+            with open(managed.exit_path, "r") as f:
+                return int(f.read().strip() or -1)
+        except (OSError, ValueError, TypeError):
+            return -1
+
+    def drain_stderr(self, task_id: str) -> None:
+        """
+        Lit la partie du journal stderr écrite depuis le dernier vidage et garde
+        ses dernières lignes dans le tampon du processus. Un stderr bavard ne
+        coûte que STDERR_READ_LIMIT octets par vidage.
+        """
+        managed = self.processes.get(task_id)
+        if not managed or not managed.log_path:
+            return
+        try:
+            size = os.path.getsize(managed.log_path)
+            if size <= managed.stderr_offset:
+                return
+            with open(managed.log_path, "rb") as f:
+                skipped = size - managed.stderr_offset > STDERR_READ_LIMIT
+                f.seek(size - STDERR_READ_LIMIT if skipped else managed.stderr_offset)
+                data = f.read(size - f.tell()).decode(errors="ignore")
+        except OSError:
+            return
+        managed.stderr_offset = size
+        text = data.split("\n", 1)[-1] if skipped else managed.stderr_pending + data
+        *lines, managed.stderr_pending = text.split("\n")
+        managed.stderr_tail.extend(line.rstrip("\r") for line in lines if line.strip())
+
+    def error_tail(self, task_id: str, limit: int = ERROR_TAIL_SIZE) -> str:
+        """Dernières lignes stderr d'un processus (message d'erreur FFmpeg)"""
+        managed = self.processes.get(task_id)
+        if not managed:
+            return ""
+        self.drain_stderr(task_id)
+        lines = list(managed.stderr_tail) + [managed.stderr_pending]
+        return "\n".join(line for line in lines if line.strip())[-limit:].strip()
+
+    def remove_runtime_files(self, task_id: str) -> None:
+        managed = self.processes.get(task_id)
+        if not managed:
+            return
+        for path in (managed.progress_path, managed.log_path, managed.exit_path):
+            if path and os.path.exists(path):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def unregister(self, task_id: str) -> None:
+        self.processes.pop(task_id, None)
+
+    def get(self, task_id: str) -> Optional[ManagedProcess]:
+        return self.processes.get(task_id)
+
+    def update_progress(self, task_id: str, out_time: float, speed: Optional[float]) -> None:
+        managed = self.processes.get(task_id)
+        if managed:
+            if out_time > managed.out_time:
+                managed.last_advance_at = time.time()
+            managed.out_time = out_time
+            managed.speed = speed
+
+    def _signal_group(self, managed: ManagedProcess, sig: int) -> bool:
+        try:
+            if hasattr(os, "killpg"):
+                os.killpg(os.getpgid(managed.pid), sig)
+            else:
+                os.kill(managed.pid, sig)
+            return True
+        except ProcessLookupError:
+            return False
+        except Exception as e:
+            logger.error(f"Signal {sig} impossible pour {managed.task_id} (pid {managed.pid}): {e}")
+            return False
+
+    def pause(self, task_id: str) -> bool:
+        """Suspend le groupe de processus d'une tâche (SIGSTOP)"""
+        managed = self.processes.get(task_id)
+        if not managed or managed.is_paused or not hasattr(signal, "SIGSTOP"):
+            return False
+        if managed.is_group:
+            for child in self.children(task_id):
+                self.pause(child.task_id)
+            managed.paused_at = time.time()
+            logger.info(f"Tâche suspendue: {task_id} (groupe de processus)")
+            return True
+        if self._signal_group(managed, signal.SIGSTOP):
+            managed.paused_at = time.time()
+            logger.info(f"Tâche suspendue: {task_id} (pid {managed.pid})")
+            return True
+        return False
+
+    def resume(self, task_id: str) -> bool:
+        """Reprend le groupe de processus d'une tâche (SIGCONT)"""
+        managed = self.processes.get(task_id)
+        if not managed or not managed.is_paused:
+            return False
+        if managed.is_group:
+            for child in self.children(task_id):
+                self.resume(child.task_id)
+        if managed.is_group or self._signal_group(managed, signal.SIGCONT):
+            now = time.time()
+            managed.paused_total += now - managed.paused_at
+            managed.paused_at = None
+            managed.resumed_at = now
+            # La suspension ne compte pas comme un blocage
+            managed.last_advance_at = now
+            logger.info(f"Tâche reprise: {task_id} (pid {managed.pid})")
+            return True
+        return False
+
+    def kill(self, task_id: str, reason: Optional[str] = None) -> None:
+        """Termine le groupe de processus d'une tâche, même suspendu"""
+        managed = self.processes.get(task_id)
+        if not managed:
+            return
+        managed.kill_reason = reason
+        if managed.is_group:
+            for child in self.children(task_id):
+                self.kill(child.task_id, reason=reason)
+            return
+        self._signal_group(managed, signal.SIGKILL)
+        if managed.is_paused and hasattr(signal, "SIGCONT"):
+            self._signal_group(managed, signal.SIGCONT)
+
+    def estimated_remaining(self, task_id: str, total_duration: float) -> Optional[float]:
+        """Estimation du temps restant (secondes réelles), pauses exclues"""
+        managed = self.processes.get(task_id)
+        if not managed or total_duration <= 0:
+            return None
+        active = managed.active_seconds()
+        if managed.out_time <= 0 or active <= 0:
+            return None
+        effective_speed = managed.out_time / active
+        return max(0.0, (total_duration - managed.out_time) / effective_speed)
+
+
+process_registry = ProcessRegistry()
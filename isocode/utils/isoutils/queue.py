@@ -1,14 +1,30 @@
 import asyncio
-import logging
 import os
 import time
 from collections import deque
-from typing import Dict, Deque, List, Optional, Any, Union
+from typing import Dict, Deque, List, Mapping, Optional, Any, Tuple
 from dataclasses import dataclass, field
-from isocode import logger
-from isocode.utils.isoutils.ffmpeg import encode_video, get_thumbnail, get_duration
-from isocode.utils.isoutils.progress import stylize_value
+from types import MappingProxyType
+from isocode import logger, settings
+from isocode.utils.isoutils.ffmpeg import encode_video, wait_encode, format_duration
+from isocode.utils.isoutils.progress import stylize_value, humanbytes
+from isocode.utils.isoutils.disk import disk_manager
+from isocode.utils.isoutils.process import process_registry
+from isocode.utils.isoutils.job import JobRecord
+from isocode.utils.isoutils.retry import run_stage, StageError, FatalStageError
+from isocode.utils.isoutils.watchdog import EncodeStalled, safe_settings
+from isocode.utils.isoutils.resources import ResourceClass, classify
+from isocode.utils.isoutils.metrics import metrics
+from isocode.utils.isoutils.offpeak import is_offpeak
+from isocode.utils.isoutils.targetsize import size_report
+from isocode.utils.isoutils.probe import probe
+from isocode.utils.isoutils.gain import SKIP, WARN, REMUX, REMUX_OVERRIDES, predict_gain, record_result
+from isocode.utils.isoutils.preview import PREVIEW_KEY, PreviewReport, encode_preview, full_settings
+from isocode.utils.isoutils.renditions import RENDITIONS_KEY
+from isocode.utils.isoutils import events
+from isocode.utils.isoutils.events import event_bus
 from isocode.utils.telegram.media import send_media
+from isocode.utils.telegram.keyboard import create_inline_kb
 from isocode.utils.telegram.message import send_msg, edit_msg, del_msg
 from pyrogram.enums import ParseMode
 
@@ -16,7 +32,7 @@ from pyrogram.enums import ParseMode
 class EncodingTask:
     """Représente une tâche d'encodage avec tous ses attributs"""
     id: str
-    data: Dict[str, Any]
+    job: JobRecord
     status: str = "QUEUED"
     position: int = 0
     progress: float = 0
@@ -25,18 +41,64 @@ class EncodingTask:
     end_time: Optional[float] = None
     output_file: Optional[str] = None
     error: Optional[str] = None
+    stage: Optional[str] = None
+    failed_stage: Optional[str] = None
+    resume_stage: Optional[str] = None
+    resource_class: ResourceClass = ResourceClass.CPU_LIGHT
+    # Encodage en cours lancé par l'instance précédente (redémarrage à chaud)
+    adopted: bool = False
+    # Relance sans accélération matérielle après un blocage détecté par le chien de garde
+    safe_mode: bool = False
+    # Gain de compression prévu, décision prise et taille obtenue (historisés)
+    gain: Optional[Dict[str, Any]] = None
+    # Renditions déjà envoyées (/multi) : une relance n'envoie que les suivantes
+    uploaded: List[str] = field(default_factory=list)
+
+@dataclass(frozen=True)
+class QueueSnapshot:
+    """État de la file figé à un instant donné, remplacé en bloc à chaque mutation"""
+    version: int = 0
+    created: float = 0.0
+    active: Tuple[Mapping[str, Any], ...] = ()
+    queued: Tuple[Mapping[str, Any], ...] = ()
+    tasks: Mapping[str, Mapping[str, Any]] = field(default_factory=lambda: MappingProxyType({}))
+    stats: Mapping[str, Any] = field(default_factory=lambda: MappingProxyType({}))
+
+
+def _refresh_elapsed(info: Mapping[str, Any]) -> Dict[str, Any]:
+    """Copie modifiable d'une entrée d'instantané, durées recalculées à l'instant de lecture"""
+    info = dict(info)
+    now = time.time()
+    if info.get('start_time'):
+        info['duration'] = (info.get('end_time') or now) - info['start_time']
+    if info.get('added_time'):
+        info['wait_time'] = now - info['added_time']
+    return info
+
+
+# Tâches suspendues (SIGSTOP) : elles ne consomment pas de slot
+# PAUSED = préemptée par une tâche courte, DEFERRED = suspendue hors heures creuses
+SUSPENDED_STATUSES = ("PAUSED", "DEFERRED")
 
 class EncodingQueue:
-    def __init__(self, max_concurrent: int = 1):
+    def __init__(self, max_concurrent: int = 1, class_limits: Optional[Dict[ResourceClass, int]] = None):
         self.queue: Deque[EncodingTask] = deque()
         self.active_tasks: Dict[str, EncodingTask] = {}
         self.running_tasks: Dict[str, asyncio.Task] = {}
+        self.failed_tasks: Dict[str, EncodingTask] = {}
+        # Aperçus terminés en attente de confirmation : (tâche, expiration)
+        self.previews: Dict[str, Tuple[JobRecord, float]] = {}
         self.max_concurrent = max(max_concurrent, 1)
+        # Budget de slots par classe de ressources (max_concurrent par défaut)
+        self.class_limits: Dict[ResourceClass, int] = class_limits or {}
         self.lock = asyncio.Lock()
         self.task_counter = 0
         self.queue_notifier = asyncio.Condition()
         self._stop_event = asyncio.Event()
         self._queue_processor: Optional[asyncio.Task] = None
+        self._snapshot = QueueSnapshot()
+        # Mutation non encore publiée : l'ordonnanceur ne reconstruit l'instantané que dans ce cas
+        self._dirty = False
 
     async def start(self) -> None:
         if self._queue_processor is None or self._queue_processor.done():
@@ -56,19 +118,25 @@ class EncodingQueue:
         if self._queue_processor and not self._queue_processor.done():
             await self._queue_processor
 
-    async def add_task(self, task_data: Dict[str, Any]) -> str:
+    async def add_task(self, job: JobRecord) -> str:
         async with self.lock:
             task_id = f"TASK-{self.task_counter}"
             self.task_counter += 1
 
             task = EncodingTask(
                 id=task_id,
-                data=task_data,
-                position=len(self.queue) + 1
+                job=job,
+                position=len(self.queue) + 1,
+                resource_class=classify(job.settings, job.duration)
             )
 
             self.queue.append(task)
-            logger.info(f"Nouvelle tâche ajoutée: {task_id} | Position: {len(self.queue)}")
+            self._publish(events.QUEUED, task, position=task.position)
+            self._publish_snapshot()
+            logger.info(
+                f"Nouvelle tâche ajoutée: {task_id} | Position: {len(self.queue)} | "
+                f"Classe: {task.resource_class.value}"
+            )
 
             async with self.queue_notifier:
                 self.queue_notifier.notify_all()
@@ -80,26 +148,9 @@ class EncodingQueue:
 
         while not self._stop_event.is_set():
             async with self.lock:
-                available_slots = self.max_concurrent - len(self.running_tasks)
-                tasks_to_start = min(available_slots, len(self.queue))
-
-                for _ in range(tasks_to_start):
-                    task = self.queue.popleft()
-                    task_id = task.id
-
-                    for idx, queued_task in enumerate(self.queue):
-                        queued_task.position = idx + 1
-
-                    task.status = "PROCESSING"
-                    task.start_time = time.time()
-
-                    task_obj = asyncio.create_task(
-                        self._execute_task(task),
-                        name=task_id
-                    )
-                    self.active_tasks[task_id] = task
-                    self.running_tasks[task_id] = task_obj
-                    logger.info(f"Tâche démarrée: {task_id}")
+                self._schedule()
+                if self._dirty:
+                    self._publish_snapshot()
 
             try:
                 async with self.queue_notifier:
@@ -110,37 +161,211 @@ class EncodingQueue:
 
         logger.info("Arrêt du processeur de file d'attente")
 
+    def _limit(self, resource_class: ResourceClass) -> int:
+        return max(self.class_limits.get(resource_class, self.max_concurrent), 1)
+
+    def _active_count(self, resource_class: ResourceClass) -> int:
+        """Nombre de slots occupés dans une classe (les tâches suspendues libèrent leur slot)"""
+        return sum(
+            1 for t in self.active_tasks.values()
+            if t.status not in SUSPENDED_STATUSES and t.resource_class == resource_class
+        )
+
+    def _has_slot(self, resource_class: ResourceClass) -> bool:
+        return self._active_count(resource_class) < self._limit(resource_class)
+
+    def _is_urgent(self, task: EncodingTask, now: float) -> bool:
+        """Tâche courte qui attend depuis trop longtemps"""
+        duration = task.job.duration or 0
+        return (
+            not task.job.deferrable
+            and 0 < duration <= settings.PREEMPT_SHORT_JOB
+            and now - task.added_time >= settings.PREEMPT_MAX_WAIT
+        )
+
+    def _pick_preemption_victim(self, now: float, resource_class: ResourceClass) -> Optional[EncodingTask]:
+        """
+        Choisit, dans la même classe de ressources, la tâche en cours dont le reste
+        estimé est le plus long (> PREEMPT_MIN_REMAINING)
+        """
+        victim = None
+        victim_remaining = settings.PREEMPT_MIN_REMAINING
+        for task in self.active_tasks.values():
+            if task.status != "PROCESSING" or task.resource_class != resource_class:
+                continue
+            managed = process_registry.get(task.id)
+            if not managed:
+                continue
+            # Évite les allers-retours : une tâche reprise récemment n'est pas re-suspendue
+            if managed.resumed_at and now - managed.resumed_at < settings.PREEMPT_MAX_WAIT:
+                continue
+            remaining = process_registry.estimated_remaining(task.id, task.job.duration or 0)
+            if remaining is not None and remaining > victim_remaining:
+                victim, victim_remaining = task, remaining
+        return victim
+
+    def _start_task(self, task: EncodingTask) -> None:
+        self.queue.remove(task)
+        for idx, queued_task in enumerate(self.queue):
+            queued_task.position = idx + 1
+
+        task.status = "PROCESSING"
+        task.start_time = time.time()
+        self._launch(task)
+        self._dirty = True
+        self._publish(events.STARTED, task, wait=task.start_time - task.added_time)
+        logger.info(f"Tâche démarrée: {task.id} ({task.resource_class.value})")
+
+    def _launch(self, task: EncodingTask) -> None:
+        task_obj = asyncio.create_task(
+            self._execute_task(task),
+            name=task.id
+        )
+        self.active_tasks[task.id] = task
+        self.running_tasks[task.id] = task_obj
+
+    def _defer_for(self, task: EncodingTask) -> bool:
+        """Suspend une tâche différable en cours pour libérer un slot de la classe de `task`"""
+        for active in self.active_tasks.values():
+            if (
+                active.job.deferrable
+                and active.status == "PROCESSING"
+                and active.resource_class == task.resource_class
+                and process_registry.pause(active.id)
+            ):
+                active.status = "DEFERRED"
+                self._dirty = True
+                logger.info(f"Tâche différée {active.id} suspendue hors heures creuses au profit de {task.id}")
+                return True
+        return False
+
+    def _schedule(self) -> None:
+        """
+        Attribue les slots libres de chaque classe de ressources. Ordre de priorité :
+        tâches courtes en attente prolongée, tâches suspendues, file FIFO interactive,
+        puis tâches différables.
+        Une tâche ne bloque jamais celles d'une autre classe : un remux n'attend
+        pas derrière un encodage lourd.
+        Si une tâche courte attend et qu'aucun slot de sa classe n'est libre, la tâche
+        en cours la plus longue de cette classe est suspendue (SIGSTOP) au lieu d'être tuée.
+        Les tâches différables ne tournent qu'en heures creuses ou quand aucune tâche
+        interactive n'attend ; sinon elles restent en file ou sont suspendues (DEFERRED).
+        """
+        now = time.time()
+        offpeak = is_offpeak(now)
+        interactive = [t for t in self.queue if not t.job.deferrable]
+
+        if not offpeak:
+            for task in interactive:
+                if not self._has_slot(task.resource_class):
+                    self._defer_for(task)
+
+        urgent = [t for t in interactive if self._is_urgent(t, now)] if settings.PREEMPT_ENABLED else []
+
+        for task in urgent:
+            if not self._has_slot(task.resource_class):
+                victim = self._pick_preemption_victim(now, task.resource_class)
+                if not victim or not process_registry.pause(victim.id):
+                    continue
+                victim.status = "PAUSED"
+                self._dirty = True
+                logger.info(f"Tâche {victim.id} préemptée au profit de {task.id}")
+            self._start_task(task)
+
+        for task in list(self.active_tasks.values()):
+            if task.status == "PAUSED" and self._has_slot(task.resource_class):
+                if process_registry.resume(task.id):
+                    task.status = "PROCESSING"
+                    self._dirty = True
+
+        for task in list(self.queue):
+            if not task.job.deferrable and self._has_slot(task.resource_class):
+                self._start_task(task)
+
+        if not offpeak and any(not t.job.deferrable for t in self.queue):
+            return
+
+        for task in list(self.active_tasks.values()):
+            if task.status == "DEFERRED" and self._has_slot(task.resource_class):
+                if process_registry.resume(task.id):
+                    task.status = "PROCESSING"
+                    self._dirty = True
+
+        for task in list(self.queue):
+            if self._has_slot(task.resource_class):
+                self._start_task(task)
+
     async def _execute_task(self, task: EncodingTask) -> None:
         task_id = task.id
         try:
-            # Exécution de la tâche d'encodage
-            output_file = await encode_video(
-                task.data['filepath'],
-                task.data['message'],
-                task.data['msg'],
+            if task.adopted:
+                # Encodage lancé avant un redémarrage à chaud : on le suit jusqu'au bout
+                task.adopted = False
+                self._set_stage(task, "encode")
+                try:
+                    task.output_file = await wait_encode(task.job, task_id, task.output_file)
+                    task.resume_stage = "upload"
+                except asyncio.CancelledError:
+                    raise
+                except EncodeStalled as e:
+                    task.safe_mode = True
+                    logger.warning(f"Encodage ré-adopté bloqué pour {task_id}, relance en mode sûr: {e}")
+                except Exception as e:
+                    logger.warning(f"Encodage ré-adopté en échec pour {task_id}, nouvel encodage: {e}")
+
+            # Étape encodage, sautée si la sortie d'une tentative précédente est réutilisable
+            reuse_output = (
+                task.resume_stage == "upload"
+                and task.output_file
+                and os.path.exists(task.output_file)
             )
+            if not reuse_output:
+                self._set_stage(task, "encode")
+                task.output_file = await run_stage("encode", self._encode, task)
+            task.progress = 100
+
+            if task.output_file is None:
+                # Encodage jugé inutile (gain prévu trop faible) : rien à envoyer
+                job = task.job
+                await edit_msg(
+                    job.get_client(),
+                    job.chat_id,
+                    job.status_message_id,
+                    f"⏭️ Encodage ignoré : {task.gain['reason']}"
+                )
+            elif task.job.settings.get(PREVIEW_KEY):
+                # Extraits et extrapolations, confirmation de l'encodage complet
+                self._set_stage(task, "upload")
+                await run_stage("upload", self._send_preview, task)
+            elif task.job.settings.get(RENDITIONS_KEY):
+                # Une vidéo par résolution, chacune envoyée dès que la précédente est partie
+                self._set_stage(task, "upload")
+                await run_stage("upload", self._send_renditions, task)
+            else:
+                # Envoi de la vidéo encodée à l'utilisateur
+                self._set_stage(task, "upload")
+                await run_stage("upload", self._send_encoded_video, task)
 
             task.status = "COMPLETED"
-            task.output_file = output_file
-            task.progress = 100
             task.end_time = time.time()
+            self._publish(events.FINISHED, task)
             logger.info(f"Tâche terminée avec succès: {task_id}")
 
-            # Envoi de la vidéo encodée à l'utilisateur
-            await self._send_encoded_video(task)
-
         except asyncio.CancelledError:
             task.status = "CANCELLED"
             task.end_time = time.time()
             logger.warning(f"Tâche annulée: {task_id}")
-            await self._notify_cancellation(task)
+            self._publish(events.CANCELLED, task)
 
         except Exception as e:
+            error = e.error if isinstance(e, StageError) else e
             task.status = "FAILED"
-            task.error = str(e)
+            task.failed_stage = task.stage
+            task.error = str(error)
             task.end_time = time.time()
-            logger.error(f"Échec de la tâche {task_id}: {str(e)}", exc_info=True)
-            await self._notify_failure(task)
+            self.failed_tasks[task_id] = task
+            logger.error(f"Échec de la tâche {task_id} à l'étape {task.stage}: {task.error}", exc_info=True)
+            self._publish(events.FAILED, task)
 
         finally:
             # Nettoyage des fichiers
@@ -149,164 +374,473 @@ class EncodingQueue:
             async with self.lock:
                 self.running_tasks.pop(task_id, None)
                 self.active_tasks.pop(task_id, None)
+                self._publish_snapshot()
 
                 async with self.queue_notifier:
                     self.queue_notifier.notify_all()
 
-    async def _send_encoded_video(self, task: EncodingTask) -> None:
-        """Envoie la vidéo encodée à l'utilisateur"""
+    async def _encode(self, task: EncodingTask) -> Optional[str]:
+        """Encode la tâche ; None si le gain prévu est trop faible et la tâche ignorée"""
+        job = task.job
+        if job.settings.get(PREVIEW_KEY):
+            return await encode_preview(job, task.id)
+        if task.gain is None and not job.settings.get(RENDITIONS_KEY):
+            # La prédiction ne doit jamais empêcher l'encodage
+            try:
+                prediction = await predict_gain(job.settings, await probe(job.filepath), task.id)
+            except Exception as e:
+                logger.warning(f"Prédiction du gain impossible pour {task.id}: {e}")
+                prediction = None
+            task.gain = prediction.to_record() if prediction else {}
+        action = (task.gain or {}).get("action")
+        if action == SKIP:
+            return None
+        if action == WARN:
+            await send_msg(
+                job.get_client(),
+                job.chat_id,
+                f"⚠️ Encodage peu utile ({task.gain['reason']}), poursuivi quand même",
+                reply_to=job.message_id
+            )
+
+        overrides = safe_settings(job.settings) if task.safe_mode else None
+        if action == REMUX:
+            overrides = {**(overrides or {}), **REMUX_OVERRIDES}
         try:
-            client = task.data['client']
-            userbot = task.data['userbot']
-            message = task.data['message']
-            status_msg = task.data['msg']
-            output_file = task.output_file
-            filename = os.path.basename(output_file)
+            output = await encode_video(job, task_id=task.id, overrides=overrides)
+        except EncodeStalled as e:
+            if settings.STALL_ACTION != "retry" or task.safe_mode:
+                raise FatalStageError(str(e)) from e
+            # Nouvelle tentative sans accélération matérielle (hwaccel init bloqué, etc.)
+            task.safe_mode = True
+            logger.warning(f"{e} : nouvelle tentative en mode sûr {overrides or safe_settings(job.settings)}")
+            raise
+        if task.gain:
+            record_result(task.gain, output)
+        return output
+
+    def _publish(self, event_type: str, task: EncodingTask, **data) -> None:
+        """Publie un événement de cycle de vie (non bloquant, traité par les abonnés)"""
+        event_bus.publish(
+            event_type,
+            task.id,
+            job=task.job,
+            status=task.status,
+            stage=task.stage,
+            resource_class=task.resource_class.value,
+            start_time=task.start_time,
+            end_time=task.end_time,
+            output_file=task.output_file,
+            error=task.error,
+            gain=task.gain,
+            **data
+        )
+
+    def _set_stage(self, task: EncodingTask, stage: str) -> None:
+        task.stage = stage
+        self._publish(events.STAGE, task)
+        self._publish_snapshot()
+
+    def class_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Occupation et débit de chaque classe de ressources"""
+        stats = {}
+        for resource_class in ResourceClass:
+            label = resource_class.value
+            busy = metrics.counter("busy_seconds", resource_class=label)
+            stats[label] = {
+                'limit': self._limit(resource_class),
+                'active': self._active_count(resource_class),
+                'paused': sum(
+                    1 for t in self.active_tasks.values()
+                    if t.status in SUSPENDED_STATUSES and t.resource_class == resource_class
+                ),
+                'queued': sum(1 for t in self.queue if t.resource_class == resource_class),
+                'completed': int(metrics.counter("jobs_completed", resource_class=label)),
+                'failed': int(metrics.counter("jobs_failed", resource_class=label)),
+                # Secondes de vidéo traitées par seconde de travail
+                'speed': metrics.counter("media_seconds", resource_class=label) / busy if busy else 0.0,
+                'jobs_per_hour': metrics.counter("jobs_completed", resource_class=label) * 3600 / busy if busy else 0.0,
+            }
+        return stats
+
+    async def _send_encoded_video(self, task: EncodingTask) -> None:
+        """Envoie la vidéo encodée à l'utilisateur (lève une exception en cas d'échec)"""
+        job = task.job
+        client = job.get_client()
+        userbot = job.get_client("userbot")
+        output_file = task.output_file
+        filename = os.path.basename(output_file)
+        caption = f"<b>{filename}</b>"
+        if job.settings.get("target_size"):
+            try:
+                caption += f"\n{await size_report(job.settings, job.filepath, output_file)}"
+            except Exception as e:
+                logger.warning(f"Rapport de taille indisponible pour {task.id}: {e}")
+        if task.gain and task.gain.get("action") in (WARN, REMUX):
+            caption += f"\nℹ️ {'Remux sans ré-encodage, ' if task.gain['action'] == REMUX else ''}{task.gain['reason']}"
+        await edit_msg(
+            client,
+            job.chat_id,
+            job.status_message_id,
+            "📤 Envoi de la vidéo encodée..."
+        )
+
+        # Réhydratation du message de statut pour la barre de progression d'envoi
+        status_msg = await job.get_status_message()
+
+        # Le fichier est conservé jusqu'au succès complet de la tâche (relance possible)
+        sent = await send_media(
+            client=client,
+            chat_id=job.chat_id,
+            media_type="video",
+            media=output_file,
+            caption=caption,
+            reply_to=job.message_id,
+            progress_msg=status_msg,
+            force_document=False,
+            userbot=userbot,
+            parse_mode=ParseMode.HTML,
+            delete_after_send=False
+        )
+        if not sent:
+            raise Exception(f"Échec de l'envoi de la vidéo: {filename}")
+
+        await del_msg(client, job.chat_id, job.status_message_id)
+
+    async def _send_renditions(self, task: EncodingTask) -> None:
+        """
+        Envoie les renditions d'une tâche /multi, la plus légère d'abord
+        (disponible au plus tôt) ; celles déjà envoyées sont sautées.
+        """
+        job = task.job
+        client = job.get_client()
+        userbot = job.get_client("userbot")
+        paths = sorted(
+            (os.path.join(task.output_file, name) for name in os.listdir(task.output_file)),
+            key=os.path.getsize
+        )
+        status_msg = await job.get_status_message()
+        for n, path in enumerate(paths, start=1):
+            filename = os.path.basename(path)
+            if filename in task.uploaded:
+                continue
             await edit_msg(
                 client,
-                message.chat.id,
-                status_msg.id,
-                "📤 Envoi de la vidéo encodée..."
+                job.chat_id,
+                job.status_message_id,
+                f"📤 Envoi de la rendition {n}/{len(paths)}..."
             )
-
-            await send_media(
+            sent = await send_media(
                 client=client,
-                chat_id=message.chat.id,
+                chat_id=job.chat_id,
                 media_type="video",
-                media=output_file,
+                media=path,
                 caption=f"<b>{filename}</b>",
-                reply_to=message.id,
+                reply_to=job.message_id,
                 progress_msg=status_msg,
                 force_document=False,
                 userbot=userbot,
-                parse_mode=ParseMode.HTML
+                parse_mode=ParseMode.HTML,
+                delete_after_send=False
             )
-
-            await del_msg(client, message.chat.id, status_msg.id)
-
-        except Exception as e:
-            logger.error(f"Erreur lors de l'envoi de la vidéo: {e}")
-            await send_msg(
-                client,
-                message.chat.id,
-                f"❌ Échec de l'envoi de la vidéo: {e}",
-                reply_to=message.id
-            )
-
-    async def _notify_cancellation(self, task: EncodingTask) -> None:
-        try:
-            client = task.data['client']
-            message = task.data['message']
-            await send_msg(
-                client,
-                message.chat.id,
-                f"❌ Tâche d'encodage annulée: {task.id}",
-                reply_to=message.id
+            if not sent:
+                raise Exception(f"Échec de l'envoi de la rendition: {filename}")
+            task.uploaded.append(filename)
+
+        await del_msg(client, job.chat_id, job.status_message_id)
+
+    async def _send_preview(self, task: EncodingTask) -> None:
+        """Envoie les extraits d'un aperçu et le rapport avec les boutons de confirmation"""
+        job = task.job
+        client = job.get_client()
+        report = PreviewReport.load(task.output_file)
+        for n, clip in enumerate(report.clips, start=1):
+            sent = await send_media(
+                client=client,
+                chat_id=job.chat_id,
+                media_type="video",
+                media=clip.path,
+                caption=f"🔬 Extrait {n} à {format_duration(int(clip.start))} : {humanbytes(clip.size)}",
+                reply_to=job.message_id,
+                delete_after_send=False
             )
-        except Exception as e:
-            logger.error(f"Erreur de notification d'annulation: {e}")
+            if not sent:
+                raise Exception(f"Échec de l'envoi de l'extrait {n}")
+
+        self.previews[task.id] = (job, time.time() + settings.PREVIEW_TTL)
+        kb = create_inline_kb([[
+            ("✅ ᴇɴᴄᴏᴅᴇʀ", f"preview_ok_{task.id}"),
+            ("❌ ᴀɴɴᴜʟᴇʀ", f"preview_no_{task.id}"),
+        ]])
+        await edit_msg(
+            client,
+            job.chat_id,
+            job.status_message_id,
+            stylize_value(report.describe()),
+            markup=kb,
+            parse=ParseMode.MARKDOWN
+        )
+
+    async def confirm_preview(self, preview_id: str, user_id: int) -> Optional[str]:
+        """
+        Met en file l'encodage complet d'un aperçu, sur la source déjà téléchargée.
+        Le message du rapport devient le message de statut de la tâche.
+        Retourne l'ID de la nouvelle tâche, None si l'aperçu a expiré.
+        """
+        entry = self.previews.get(preview_id)
+        if not entry or entry[1] < time.time() or entry[0].user_id != user_id:
+            return None
+        job = entry[0]
+        if not os.path.exists(job.filepath):
+            self.previews.pop(preview_id, None)
+            return None
+        self.previews.pop(preview_id, None)
+
+        full_job = JobRecord.from_dict({**job.to_dict(), "settings": full_settings(dict(job.settings))})
+        task_id = await self.add_task(full_job)
+        disk_manager.reassign(preview_id, task_id)
+        disk_manager.pin(task_id)
+        return task_id
+
+    def drop_preview(self, preview_id: str, user_id: int) -> bool:
+        """Abandonne un aperçu : la source est supprimée"""
+        entry = self.previews.get(preview_id)
+        if not entry or entry[0].user_id != user_id:
+            return False
+        self.previews.pop(preview_id, None)
+        disk_manager.discard(preview_id)
+        return True
 
-    async def _notify_failure(self, task: EncodingTask) -> None:
-        try:
-            client = task.data['client']
-            message = task.data['message']
-            await send_msg(
-                client,
-                message.chat.id,
-                f"❌ Échec de l'encodage: {task.error}\n"
-                f"ID Tâche: {task.id}",
-                reply_to=message.id
-            )
-        except Exception as e:
-            logger.error(f"Erreur de notification d'échec: {e}")
+    def _prune_previews(self) -> None:
+        now = time.time()
+        for preview_id, (_, expires) in list(self.previews.items()):
+            if expires < now:
+                self.previews.pop(preview_id, None)
 
     async def _cleanup_files(self, task: EncodingTask) -> None:
         try:
-            # Supprimer le fichier source téléchargé
-            if os.path.exists(task.data['filepath']):
-                os.remove(task.data['filepath'])
-
-            if task.output_file and os.path.exists(task.output_file):
-                asyncio.create_task(self._delayed_cleanup(task.output_file))
+            if task.status == "FAILED":
+                # Artefacts des étapes réussies conservés pour /retry jusqu'à expiration
+                disk_manager.release(task.id, ttl=settings.FAILED_JOB_TTL)
+            elif task.status == "COMPLETED" and task.job.settings.get(PREVIEW_KEY):
+                # Source conservée en attente de confirmation, extraits supprimés
+                self._prune_previews()
+                disk_manager.release(task.id, ttl=settings.PREVIEW_TTL, kinds=["source"])
+                disk_manager.discard(task.id, kinds=["preview", "subtitle", "workspace"])
+            else:
+                disk_manager.discard(task.id)
         except Exception as e:
             logger.error(f"Erreur de nettoyage des fichiers: {e}")
 
-    async def _delayed_cleanup(self, file_path: str, delay: int = 3600) -> None:
-        await asyncio.sleep(delay)
-        try:
-            if os.path.exists(file_path):
-                os.remove(file_path)
-                logger.info(f"Fichier temporaire supprimé: {file_path}")
-        except Exception as e:
-            logger.error(f"Échec de suppression de {file_path}: {e}")
+    def _prune_failed(self) -> None:
+        now = time.time()
+        for task_id, task in list(self.failed_tasks.items()):
+            if now - (task.end_time or now) > settings.FAILED_JOB_TTL:
+                self.failed_tasks.pop(task_id, None)
 
-    async def get_task_status(self, task_id: str) -> Optional[Dict[str, Any]]:
+    def get_failed_tasks(self) -> List[EncodingTask]:
+        self._prune_failed()
+        return list(self.failed_tasks.values())
+
+    async def retry_task(self, task_id: str) -> Optional[str]:
         """
-        Récupère le statut d'une tâche spécifique
+        Relance une tâche échouée à partir de l'étape en échec
 
-        :param task_id: ID de la tâche à rechercher
-        :return: Dictionnaire d'information ou None si non trouvée
+        :param task_id: ID de la tâche échouée
+        :return: Étape de reprise, ou None si tâche inconnue ou fichiers expirés
         """
         async with self.lock:
-            # Vérifier dans les tâches actives
-            if task_id in self.active_tasks:
-                return self._format_task_info(self.active_tasks[task_id])
+            self._prune_failed()
+            task = self.failed_tasks.get(task_id)
+            if not task:
+                return None
+
+            resume_stage = task.failed_stage or "encode"
+            if resume_stage == "upload" and not (task.output_file and os.path.exists(task.output_file)):
+                resume_stage = "encode"
+            if resume_stage == "encode" and not os.path.exists(task.job.filepath):
+                logger.warning(f"Relance impossible de {task_id}: fichier source expiré")
+                return None
+
+            self.failed_tasks.pop(task_id, None)
+            disk_manager.pin(task_id)
+
+            task.status = "QUEUED"
+            task.resume_stage = resume_stage
+            task.stage = None
+            task.failed_stage = None
+            task.error = None
+            task.progress = 0
+            task.added_time = time.time()
+            task.start_time = None
+            task.end_time = None
+            task.position = len(self.queue) + 1
+            self.queue.append(task)
+            self._publish_snapshot()
+            logger.info(f"Tâche relancée: {task_id} | Reprise à l'étape: {resume_stage}")
 
-            # Vérifier dans la file d'attente
-            for task in self.queue:
-                if task.id == task_id:
-                    return self._format_queued_info(task)
+            async with self.queue_notifier:
+                self.queue_notifier.notify_all()
 
-            return None
+            return resume_stage
+
+    # ==================== Redémarrage à chaud ====================
+    async def export_state(self) -> Dict[str, Any]:
+        """
+        Arrête l'ordonnanceur et décrit les tâches actives et en attente pour
+        qu'une nouvelle instance du bot les reprenne (encodages FFmpeg ré-adoptés par PID).
+        """
+        self._stop_event.set()
+        async with self.lock:
+            process_registry.detach_all()
+            entries = []
+            for task in list(self.active_tasks.values()) + list(self.queue):
+                entries.append({
+                    'id': task.id,
+                    'job': task.job.to_dict(),
+                    'status': task.status,
+                    'stage': task.stage,
+                    'added_time': task.added_time,
+                    'start_time': task.start_time,
+                    'output_file': task.output_file,
+                    'resume_stage': task.resume_stage,
+                    'uploaded': task.uploaded,
+                    'process': process_registry.export_state(task.id) if task.stage == "encode" else None,
+                })
+            return {'task_counter': self.task_counter, 'tasks': entries}
+
+    async def import_state(self, state: Dict[str, Any]) -> int:
+        """Reprend les tâches exportées par l'instance précédente, retourne le nombre d'encodages ré-adoptés"""
+        adopted = 0
+        async with self.lock:
+            self.task_counter = max(self.task_counter, state.get('task_counter', 0))
+            for entry in state.get('tasks', []):
+                job = JobRecord.from_dict(entry['job'])
+                task = EncodingTask(
+                    id=entry['id'],
+                    job=job,
+                    added_time=entry.get('added_time') or time.time(),
+                    output_file=entry.get('output_file'),
+                    resume_stage=entry.get('resume_stage'),
+                    uploaded=entry.get('uploaded', []),
+                    resource_class=classify(job.settings, job.duration)
+                )
+                process = entry.get('process')
+                managed = process_registry.adopt(task.id, process) if process else None
+                if managed:
+                    # Résultat de la tâche fixé au lancement du processus, avant la fin de l'encodage
+                    task.output_file = managed.deliverable
+                    task.status = "PROCESSING"
+                    task.start_time = entry.get('start_time') or time.time()
+                    task.adopted = True
+                    self._launch(task)
+                    adopted += 1
+                    continue
+
+                if entry.get('stage') == "upload":
+                    task.resume_stage = "upload"
+                task.position = len(self.queue) + 1
+                self.queue.append(task)
+
+            self._publish_snapshot()
+            logger.info(
+                f"Reprise après redémarrage à chaud: {adopted} encodage(s) ré-adopté(s), "
+                f"{len(self.queue)} tâche(s) en attente"
+            )
+        return adopted
+
+    def known_task_ids(self) -> List[str]:
+        """IDs de toutes les tâches connues (actives ou en attente)"""
+        return list(self.active_tasks) + [t.id for t in self.queue]
+
+    # ==================== Instantanés (lecture sans verrou) ====================
+    def _publish_snapshot(self) -> None:
+        """
+        Construit un nouvel instantané immuable de la file et le publie par simple
+        réaffectation : les lecteurs ne prennent jamais `self.lock`.
+        Appelé par les mutations ; l'ordonnanceur ne republie que si `_dirty`.
+        """
+        self._dirty = False
+        active = tuple(MappingProxyType(self._format_task_info(t)) for t in self.active_tasks.values())
+        queued = tuple(MappingProxyType(self._format_queued_info(t)) for t in self.queue)
+        self._snapshot = QueueSnapshot(
+            version=self._snapshot.version + 1,
+            created=time.time(),
+            active=active,
+            queued=queued,
+            tasks=MappingProxyType({info['id']: info for info in active + queued}),
+            stats=MappingProxyType({
+                'active_count': len(active),
+                'queued_count': len(queued),
+                'max_concurrent': self.max_concurrent,
+                'processed_count': self.task_counter - len(queued) - len(active),
+                'classes': self.class_stats()
+            })
+        )
+
+    @property
+    def snapshot(self) -> "QueueSnapshot":
+        return self._snapshot
+
+    async def get_task_status(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Récupère le statut d'une tâche spécifique (depuis le dernier instantané)
+
+        :param task_id: ID de la tâche à rechercher
+        :return: Dictionnaire d'information ou None si non trouvée
+        """
+        info = self._snapshot.tasks.get(task_id)
+        return _refresh_elapsed(info) if info else None
 
     async def get_queue_status(self) -> Dict[str, Any]:
         """
-        Retourne l'état complet de la file d'attente
+        Retourne l'état complet de la file d'attente (depuis le dernier instantané)
 
         :return: Dictionnaire avec l'état des tâches actives et en attente
         """
-        async with self.lock:
-            return {
-                'active': [self._format_task_info(t) for t in self.active_tasks.values()],
-                'queued': [self._format_queued_info(t) for t in self.queue],
-                'stats': {
-                    'active_count': len(self.active_tasks),
-                    'queued_count': len(self.queue),
-                    'max_concurrent': self.max_concurrent,
-                    'processed_count': self.task_counter - len(self.queue) - len(self.active_tasks)
-                }
-            }
+        snapshot = self._snapshot
+        return {
+            'active': [_refresh_elapsed(info) for info in snapshot.active],
+            'queued': [_refresh_elapsed(info) for info in snapshot.queued],
+            'stats': dict(snapshot.stats, version=snapshot.version)
+        }
 
     def _format_task_info(self, task: EncodingTask) -> Dict[str, Any]:
         """Formate les informations d'une tâche en cours"""
+        managed = process_registry.get(task.id)
         return {
             'id': task.id,
             'status': task.status,
+            'resource_class': task.resource_class.value,
+            'deferrable': task.job.deferrable,
             'progress': task.progress,
-            'file': os.path.basename(task.data['filepath']),
+            'file': os.path.basename(task.job.filepath),
             'start_time': task.start_time,
+            'end_time': task.end_time,
             'duration': (task.end_time or time.time()) - task.start_time if task.start_time else None,
+            'paused_time': managed.paused_seconds() if managed else 0,
+            'eta': process_registry.estimated_remaining(task.id, task.job.duration or 0),
             'output_file': task.output_file,
             'error': task.error
         }
-    async def get_task_position(self, task_id: str) -> int:
-        async with self.lock:
-            for idx, task in enumerate(self.queue):
-                if task.id == task_id:
-                    return idx + 1
-
-            if task_id in self.active_tasks:
-                return 0  # 0 = en cours de traitement
 
+    async def get_task_position(self, task_id: str) -> int:
+        info = self._snapshot.tasks.get(task_id)
+        if not info:
             return -1  # Non trouvée
+        return info.get('position', 0)  # 0 = en cours de traitement
+
     def _format_queued_info(self, task: EncodingTask) -> Dict[str, Any]:
         """Formate les informations d'une tâche en attente"""
         return {
             'id': task.id,
             'position': task.position,
+            'added_time': task.added_time,
             'wait_time': time.time() - task.added_time,
-            'file': os.path.basename(task.data['filepath']),
-            'status': task.status
+            'file': os.path.basename(task.job.filepath),
+            'status': task.status,
+            'resource_class': task.resource_class.value,
+            'deferrable': task.job.deferrable
         }
 
     async def notify_progress(self, task_id: str, progress: float) -> bool:
@@ -317,11 +851,15 @@ class EncodingQueue:
         :param progress: Valeur de progression (0-100)
         :return: True si mise à jour réussie, False sinon
         """
-        async with self.lock:
-            if task_id in self.active_tasks:
-                self.active_tasks[task_id].progress = max(0, min(100, progress))
-                return True
+        task = self.active_tasks.get(task_id)
+        if not task:
             return False
+        progress = max(0, min(100, progress))
+        # Progression inchangée (au dixième près) : instantané conservé
+        if round(progress, 1) != round(task.progress, 1):
+            task.progress = progress
+            self._publish_snapshot()
+        return True
 
     async def cancel_task(self, task_id: str) -> bool:
         """
@@ -337,18 +875,22 @@ class EncodingQueue:
                 return True
 
             # Retirer une tâche en attente
-            for idx, task in enumerate(self.queue):
+            for task in self.queue:
                 if task.id == task_id:
                     self.queue.remove(task)
                     # Mettre à jour les positions
-                    for i, t in enumerate(self.queue[idx:]):
-                        t.position = idx + i + 1
+                    for idx, queued_task in enumerate(self.queue):
+                        queued_task.position = idx + 1
+                    self._publish_snapshot()
                     return True
 
             return False
 
 # Initialisation globale de la file d'attente
-queue_system = EncodingQueue(max_concurrent=2)
+queue_system = EncodingQueue(
+    max_concurrent=2,
+    class_limits={resource_class: resource_class.slots for resource_class in ResourceClass}
+)
 
 async def initialize_queue_system():
     """Initialise et démarre le système de file d'attente"""
@@ -0,0 +1,203 @@
+from dataclasses import dataclass
+from typing import Any, Mapping, Optional, Tuple
+from isocode import settings
+from isocode.utils.database.database import Resolution
+from isocode.utils.isoutils.probe import MediaInfo, StreamInfo
+
+COPY = "copy"
+TRANSCODE = "transcode"
+
+# Encodeur FFmpeg -> codec tel que rapporté par ffprobe
+VIDEO_CODEC_NAMES = {
+    "libx264": "h264",
+    "h264_nvenc": "h264",
+    "libx265": "hevc",
+    "hevc_nvenc": "hevc",
+    "libvpx": "vp8",
+    "libvpx-vp9": "vp9",
+    "libaom-av1": "av1",
+    "mpeg4": "mpeg4",
+}
+AUDIO_CODEC_NAMES = {
+    "aac": "aac",
+    "opus": "opus",
+    "mp3": "mp3",
+    "flac": "flac",
+    "ac3": "ac3",
+}
+CHANNEL_COUNTS = {
+    "mono": "1",
+    "stereo": "2",
+    "2.1": "3",
+    "5.1": "6",
+    "7.1": "8",
+}
+# Codecs sans pertes : pas de débit plafond à respecter
+LOSSLESS_AUDIO = {"flac"}
+
+
+def requested_channels(value: Any) -> str:
+    """Nombre de canaux passé à -ac pour le réglage "channels" (stéréo à défaut)"""
+    return CHANNEL_COUNTS.get(str(value or "stereo").lower(), "2")
+
+
+def _kbps(value: Any) -> int:
+    text = str(value or "").strip().lower()
+    try:
+        if text.endswith("m"):
+            return int(float(text[:-1]) * 1000)
+        if text.endswith("k"):
+            return int(float(text[:-1]))
+        return int(float(text) / 1000)
+    except ValueError:
+        return 0
+
+
+def selected_audio(job_settings: Mapping[str, Any], info: MediaInfo) -> Tuple[StreamInfo, ...]:
+    """Pistes audio de la source gardées dans la sortie, dans l'ordre de sortie"""
+    action = job_settings.get("audio_track_action", "first")
+    if action == "none" or not info.audio:
+        return ()
+    if action == "all":
+        return info.audio
+    position = int(action.split("_")[1]) - 1 if action.startswith("track_") else 0
+    return info.audio[position:position + 1]
+
+
+def video_bitrate_ceiling(height: int) -> int:
+    """Débit vidéo max (kb/s) au-delà duquel une source est ré-encodée pour gagner en taille"""
+    ceilings = settings.REMUX_VIDEO_BITRATE_CEILING
+    for limit in sorted(ceilings):
+        if height <= limit:
+            return ceilings[limit]
+    return ceilings[max(ceilings)] if ceilings else 0
+
+
+@dataclass(frozen=True)
+class StreamDecision:
+    """Copie ou ré-encodage d'une piste de la source, avec son motif"""
+    specifier: str
+    action: str
+    reason: str
+
+    @property
+    def copy(self) -> bool:
+        return self.action == COPY
+
+    def __str__(self) -> str:
+        verb = "copie" if self.copy else "ré-encodage"
+        return f"{self.specifier} {verb} ({self.reason})"
+
+
+@dataclass(frozen=True)
+class RemuxPlan:
+    """Décisions par piste du mode "smart" : vidéo principale puis pistes audio gardées"""
+    video: Optional[StreamDecision]
+    audio: Tuple[StreamDecision, ...]
+
+    @property
+    def copies_video(self) -> bool:
+        return bool(self.video and self.video.copy)
+
+    @property
+    def copies_any(self) -> bool:
+        return self.copies_video or any(decision.copy for decision in self.audio)
+
+    @property
+    def decisions(self) -> Tuple[StreamDecision, ...]:
+        return ((self.video,) if self.video else ()) + self.audio
+
+    def describe(self) -> str:
+        return " | ".join(str(decision) for decision in self.decisions)
+
+
+def _plan_video(job_settings: Mapping[str, Any], stream: StreamInfo, fallback_kbps: int) -> StreamDecision:
+    specifier = "v:0"
+    target = job_settings.get("video_codec", "libx265")
+    if target == "copy":
+        return StreamDecision(specifier, COPY, "copie demandée")
+
+    # Tout ce qui modifie l'image ou vise un débit impose le ré-encodage
+    if job_settings.get("hardsub") or job_settings.get("subtitle_action") == "burn":
+        return StreamDecision(specifier, TRANSCODE, "sous-titres incrustés")
+    if job_settings.get("watermark"):
+        return StreamDecision(specifier, TRANSCODE, "filigrane")
+    if job_settings.get("target_size") or job_settings.get("video_bitrate"):
+        return StreamDecision(specifier, TRANSCODE, "taille cible")
+
+    codec = VIDEO_CODEC_NAMES.get(target)
+    if stream.codec_name != codec:
+        return StreamDecision(specifier, TRANSCODE, f"codec {stream.codec_name} au lieu de {codec or target}")
+
+    resolution = job_settings.get("resolution", "original")
+    if resolution != "original":
+        wanted = Resolution(resolution)
+        if (stream.width, stream.height) != (wanted.width, wanted.height):
+            return StreamDecision(
+                specifier, TRANSCODE,
+                f"résolution {stream.width}x{stream.height} au lieu de {wanted.width}x{wanted.height}"
+            )
+
+    pix_fmt = job_settings.get("pix_fmt", "yuv420p")
+    if stream.pix_fmt != pix_fmt:
+        return StreamDecision(specifier, TRANSCODE, f"pix_fmt {stream.pix_fmt} au lieu de {pix_fmt}")
+
+    # Débit de la piste, à défaut celui du fichier entier (majorant)
+    kbps = stream.bit_rate // 1000 or fallback_kbps
+    ceiling = video_bitrate_ceiling(stream.height)
+    if not kbps:
+        return StreamDecision(specifier, TRANSCODE, "débit source inconnu")
+    if kbps > ceiling:
+        return StreamDecision(specifier, TRANSCODE, f"{kbps} kb/s au-delà du plafond de {ceiling} kb/s")
+
+    return StreamDecision(
+        specifier, COPY,
+        f"{codec} {stream.width}x{stream.height} {stream.pix_fmt}, {kbps} kb/s ≤ {ceiling} kb/s"
+    )
+
+
+def _plan_audio(job_settings: Mapping[str, Any], position: int, stream: StreamInfo) -> StreamDecision:
+    specifier = f"a:{position}"
+    target = job_settings.get("audio_codec", "aac")
+    if target == "copy":
+        return StreamDecision(specifier, COPY, "copie demandée")
+    if job_settings.get("normalize_audio", True):
+        return StreamDecision(specifier, TRANSCODE, "normalisation demandée")
+
+    codec = AUDIO_CODEC_NAMES.get(target, target)
+    if stream.codec_name != codec:
+        return StreamDecision(specifier, TRANSCODE, f"codec {stream.codec_name} au lieu de {codec}")
+
+    channels = int(requested_channels(job_settings.get("channels")))
+    if stream.channels != channels:
+        return StreamDecision(specifier, TRANSCODE, f"{stream.channels} canaux au lieu de {channels}")
+
+    if codec not in LOSSLESS_AUDIO:
+        kbps = stream.bit_rate // 1000
+        ceiling = _kbps(job_settings.get("audio_bitrate", "192k")) * settings.REMUX_AUDIO_BITRATE_MARGIN
+        if not kbps:
+            return StreamDecision(specifier, TRANSCODE, "débit source inconnu")
+        if kbps > ceiling:
+            return StreamDecision(specifier, TRANSCODE, f"{kbps} kb/s au-delà de {ceiling:.0f} kb/s")
+        return StreamDecision(specifier, COPY, f"{codec} {channels} canaux, {kbps} kb/s")
+    return StreamDecision(specifier, COPY, f"{codec} {channels} canaux")
+
+
+def plan_streams(job_settings: Mapping[str, Any], info: Optional[MediaInfo]) -> Optional[RemuxPlan]:
+    """
+    Compare chaque piste gardée de la source à la sortie demandée (codec,
+    résolution, pix_fmt, plafond de débit, canaux) : une piste déjà conforme
+    est copiée telle quelle. None si le mode "smart" est désactivé.
+    """
+    if not job_settings.get("smart_remux") or not info:
+        return None
+
+    video = None
+    if info.video:
+        audio_kbps = sum(stream.bit_rate for stream in info.audio) // 1000
+        video = _plan_video(job_settings, info.video[0], max(info.bit_rate // 1000 - audio_kbps, 0))
+    audio = tuple(
+        _plan_audio(job_settings, position, stream)
+        for position, stream in enumerate(selected_audio(job_settings, info))
+    )
+    return RemuxPlan(video=video, audio=audio)
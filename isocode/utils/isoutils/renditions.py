@@ -0,0 +1,63 @@
+import re
+from typing import Any, List, Optional, Sequence
+from isocode import settings
+from isocode.utils.database.database import Resolution
+from isocode.utils.isoutils.probe import MediaInfo
+from isocode.utils.isoutils.watermark import WatermarkOverlay, attach
+
+# Clé des paramètres listant les résolutions d'une tâche multi-rendition
+RENDITIONS_KEY = "renditions"
+
+
+def parse_renditions(args: Sequence[str]) -> Optional[List[str]]:
+    """
+    Résolutions demandées ("1080p 720p", "1080,720"), RENDITIONS_DEFAULT sans
+    argument. Triées de la plus haute à la plus basse, None si l'une est inconnue.
+    """
+    values = [value for arg in args for value in re.split(r"[,\s]+", arg) if value]
+    resolutions = []
+    for value in values or settings.RENDITIONS_DEFAULT:
+        value = value.lower()
+        if value.isdigit():
+            value += "p"
+        try:
+            resolution = Resolution(value)
+        except ValueError:
+            return None
+        if resolution not in resolutions:
+            resolutions.append(resolution)
+    # La définition originale passe en premier (hauteur 0)
+    resolutions.sort(key=lambda r: -r.height if r != Resolution.ORIGINAL else float("-inf"))
+    return [resolution.value for resolution in resolutions]
+
+
+def playable_renditions(values: Sequence[Any], info: MediaInfo) -> List[Resolution]:
+    """Résolutions encodables pour la source : aucun agrandissement"""
+    resolutions = [Resolution(value) for value in values]
+    return [r for r in resolutions if r == Resolution.ORIGINAL or r.height <= info.height]
+
+
+def rendition_label(resolution: Resolution, info: MediaInfo) -> str:
+    return f"{info.height}p" if resolution == Resolution.ORIGINAL else resolution.value
+
+
+def filter_graph(
+    shared_filters: Sequence[str],
+    resolutions: Sequence[Resolution],
+    watermarks: Optional[Sequence[Optional[WatermarkOverlay]]] = None
+) -> str:
+    """
+    Graphe -filter_complex d'une sortie multiple : filtres communs (sous-titres
+    incrustés) appliqués une fois, puis split vers un scaler par rendition,
+    suivi du filigrane pré-rendu à sa définition. Les sorties sont étiquetées
+    [v0], [v1]...
+    """
+    head = ",".join(list(shared_filters) + [f"split={len(resolutions)}"])
+    graph = [f"[0:v:0]{head}{''.join(f'[s{n}]' for n in range(len(resolutions)))}"]
+    for n, resolution in enumerate(resolutions):
+        scale = "null" if resolution == Resolution.ORIGINAL else f"scale={resolution.ffmpeg_name}"
+        if watermarks is not None:
+            graph.append(attach(f"[s{n}]{scale}", watermarks[n], output=f"v{n}", tag=str(n)))
+        else:
+            graph.append(f"[s{n}]{scale}[v{n}]")
+    return ";".join(graph)
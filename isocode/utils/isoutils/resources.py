@@ -0,0 +1,79 @@
+from enum import Enum
+from typing import Any, Mapping
+from isocode import settings
+
+
+class ResourceClass(str, Enum):
+    """Classes de ressources : chaque classe dispose de son propre budget de slots"""
+    IO = "io"
+    CPU_LIGHT = "cpu_light"
+    CPU_HEAVY = "cpu_heavy"
+
+    @property
+    def display_name(self) -> str:
+        names = {
+            "io": "Remux (E/S)",
+            "cpu_light": "Encodage léger",
+            "cpu_heavy": "Encodage lourd",
+        }
+        return names[self.value]
+
+    @property
+    def slots(self) -> int:
+        limits = {
+            "io": settings.IO_SLOTS,
+            "cpu_light": settings.CPU_LIGHT_SLOTS,
+            "cpu_heavy": settings.CPU_HEAVY_SLOTS,
+        }
+        return max(limits[self.value], 1)
+
+    @property
+    def expected_speed(self) -> float:
+        """Vitesse d'encodage attendue (secondes de vidéo par seconde), pour les délais max"""
+        speeds = {
+            "io": 10.0,
+            "cpu_light": 1.0,
+            "cpu_heavy": 0.2,
+        }
+        return speeds[self.value]
+
+
+# Encodeurs logiciels coûteux quel que soit le preset. libx265 n'en fait pas
+# partie : en preset rapide (superfast par défaut) il reste une tâche légère,
+# les presets lents le classent lourd comme les autres encodeurs.
+HEAVY_CODECS = {"libaom-av1", "libvpx-vp9"}
+# Encodeurs matériels : le CPU ne fait que décoder/multiplexer
+GPU_CODECS = {"h264_nvenc", "hevc_nvenc"}
+SLOW_PRESETS = {"medium", "slow", "slower", "veryslow"}
+HEAVY_RESOLUTIONS = {"1440p", "2160p"}
+
+
+def classify(job_settings: Mapping[str, Any], duration: float = 0) -> ResourceClass:
+    """
+    Détermine la classe de ressources d'une tâche à partir de l'instantané
+    des paramètres utilisateur et de la durée sondée.
+    """
+    # Aperçu : quelques secondes encodées, quel que soit le codec
+    if job_settings.get("preview"):
+        return ResourceClass.CPU_LIGHT
+    # Plusieurs renditions : un encodeur par résolution dans le même processus
+    if len(job_settings.get("renditions") or ()) > 1:
+        return ResourceClass.CPU_HEAVY
+
+    codec = job_settings.get("video_codec")
+    # Les incrustations forcent un ré-encodage même en mode copie
+    burns = job_settings.get("hardsub") or job_settings.get("watermark")
+
+    if codec == "copy" and not burns:
+        return ResourceClass.IO
+    if codec in GPU_CODECS:
+        return ResourceClass.CPU_LIGHT
+    if codec in HEAVY_CODECS:
+        return ResourceClass.CPU_HEAVY
+    if job_settings.get("preset") in SLOW_PRESETS:
+        return ResourceClass.CPU_HEAVY
+    if job_settings.get("resolution") in HEAVY_RESOLUTIONS:
+        return ResourceClass.CPU_HEAVY
+    if duration > settings.HEAVY_JOB_DURATION:
+        return ResourceClass.CPU_HEAVY
+    return ResourceClass.CPU_LIGHT
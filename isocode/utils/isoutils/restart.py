@@ -0,0 +1,38 @@
+import json
+import os
+from isocode import logger, scratch_dir
+from isocode.utils.isoutils.queue import queue_system
+
+RESTART_STATE_FILE = os.path.join(scratch_dir, ".hot_restart.json")
+
+
+async def prepare_hot_restart() -> int:
+    """
+    Enregistre l'état de la file avant un redémarrage à chaud.
+    Les processus FFmpeg en cours ne sont pas tués : ils tournent dans leur propre
+    session et écrivent leur progression dans des fichiers.
+
+    :return: Nombre de tâches conservées
+    """
+    state = await queue_system.export_state()
+    tmp_path = f"{RESTART_STATE_FILE}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f, default=str)
+    os.replace(tmp_path, RESTART_STATE_FILE)
+    logger.info(f"État de redémarrage à chaud enregistré: {len(state['tasks'])} tâche(s)")
+    return len(state["tasks"])
+
+
+async def restore_hot_restart() -> int:
+    """Reprend les tâches d'un redémarrage à chaud, retourne le nombre d'encodages ré-adoptés"""
+    if not os.path.exists(RESTART_STATE_FILE):
+        return 0
+    try:
+        with open(RESTART_STATE_FILE, "r", encoding="utf-8") as f:
+            state = json.load(f)
+    except Exception as e:
+        logger.error(f"État de redémarrage à chaud illisible, ignoré: {e}")
+        return 0
+    finally:
+        os.remove(RESTART_STATE_FILE)
+    return await queue_system.import_state(state)
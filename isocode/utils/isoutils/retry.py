@@ -0,0 +1,74 @@
+import asyncio
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Tuple, Type
+from isocode import logger, settings
+
+
+class StageError(Exception):
+    """Échec définitif d'une étape d'une tâche (après épuisement des tentatives)"""
+
+    def __init__(self, stage: str, error: BaseException):
+        super().__init__(f"{stage}: {error}")
+        self.stage = stage
+        self.error = error
+
+
+class FatalStageError(Exception):
+    """Erreur qu'il est inutile de retenter : l'étape échoue immédiatement"""
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    """Politique de nouvelles tentatives avec backoff exponentiel"""
+    attempts: int = 3
+    base_delay: float = 5.0
+    factor: float = 2.0
+    max_delay: float = 300.0
+    retry_on: Tuple[Type[BaseException], ...] = (Exception,)
+
+    def delay(self, attempt: int) -> float:
+        return min(self.max_delay, self.base_delay * (self.factor ** (attempt - 1)))
+
+
+# Politiques par étape : le réseau est plus instable que l'encodage
+STAGE_POLICIES: Dict[str, RetryPolicy] = {
+    "download": RetryPolicy(
+        attempts=settings.RETRY_ATTEMPTS,
+        base_delay=settings.RETRY_BASE_DELAY,
+        max_delay=settings.RETRY_MAX_DELAY,
+    ),
+    "probe": RetryPolicy(attempts=2, base_delay=1.0, max_delay=10.0),
+    "encode": RetryPolicy(attempts=2, base_delay=settings.RETRY_BASE_DELAY, max_delay=60.0),
+    "upload": RetryPolicy(
+        attempts=settings.RETRY_ATTEMPTS,
+        base_delay=settings.RETRY_BASE_DELAY,
+        max_delay=settings.RETRY_MAX_DELAY,
+    ),
+}
+
+
+async def run_stage(
+    stage: str,
+    func: Callable[..., Awaitable[Any]],
+    *args,
+    policy: RetryPolicy = None,
+    **kwargs
+) -> Any:
+    """
+    Exécute une étape avec sa politique de nouvelles tentatives.
+
+    :raises StageError: si toutes les tentatives échouent
+    """
+    policy = policy or STAGE_POLICIES.get(stage, RetryPolicy())
+    for attempt in range(1, policy.attempts + 1):
+        try:
+            return await func(*args, **kwargs)
+        except asyncio.CancelledError:
+            raise
+        except policy.retry_on as e:
+            if attempt >= policy.attempts or isinstance(e, FatalStageError):
+                logger.error(f"Étape {stage} abandonnée après {attempt} tentative(s): {e}")
+                raise StageError(stage, e) from e
+            delay = policy.delay(attempt)
+            logger.warning(f"Étape {stage} échouée (tentative {attempt}/{policy.attempts}): {e} — nouvel essai dans {delay:.0f}s")
+            await asyncio.sleep(delay)
@@ -1,4 +1,8 @@
 from aiohttp import web
+from isocode.utils.isoutils.metrics import metrics
+from isocode.utils.isoutils.queue import queue_system
+from isocode.utils.isoutils.events import event_bus
+from isocode.utils.isoutils.executor import executor
 
 routes = web.RouteTableDef()
 
@@ -7,7 +11,16 @@ async def root_route_handler(request):
     return web.json_response("Je suis la bébé")
 
 
+@routes.get("/metrics")
+async def metrics_route_handler(request):
+    data = metrics.snapshot()
+    data["classes"] = queue_system.class_stats()
+    data["subscribers"] = event_bus.stats()
+    data["tools"] = executor.stats()
+    return web.json_response(data)
+
+
 async def web_server():
     web_app = web.Application(client_max_size=30000000)
     web_app.add_routes(routes)
-    return web_app
\ No newline at end of file
+    return web_app
@@ -0,0 +1,238 @@
+import asyncio
+import csv
+import hashlib
+import json
+import os
+import shutil
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, List, Mapping, Optional
+from isocode import settings
+from isocode.utils.isoutils.disk import disk_manager
+from isocode.utils.isoutils.executor import run_tool
+from isocode.utils.isoutils.probe import MediaInfo
+from isocode.utils.isoutils.remux import plan_streams
+from isocode.utils.isoutils.resources import GPU_CODECS
+
+# Sous-répertoire de scratch contenant les segments de chaque tâche
+SEGMENTS_DIR = "segments"
+SEGMENT_LIST = "segments.csv"
+CONCAT_LIST = "concat.txt"
+MANIFEST_FILE = "manifest.json"
+# Paramètres sans effet sur le flux encodé : leur changement n'invalide pas les points de reprise
+RESUME_IGNORED_KEYS = {"hwaccel", "threads"}
+
+
+class SegmentError(Exception):
+    """Encodage segmenté impossible : l'encodage classique prend le relais"""
+
+
+@dataclass
+class Segment:
+    """Portion de la piste vidéo source, découpée sur une image clé"""
+    index: int
+    source: str
+    start: float
+    end: float
+
+    @property
+    def duration(self) -> float:
+        return max(0.0, self.end - self.start)
+
+    @property
+    def output(self) -> str:
+        return os.path.join(os.path.dirname(self.source), f"enc_{self.index:03d}.mkv")
+
+
+def use_segmented(job_settings: Mapping[str, Any], info: Optional[MediaInfo]) -> bool:
+    """Une tâche est segmentée si elle est longue, ré-encodée en logiciel et sans incrustation"""
+    if not settings.SEGMENTED_ENCODING or not info or not info.video:
+        return False
+    if info.duration < settings.SEGMENT_MIN_DURATION:
+        return False
+    codec = job_settings.get("video_codec")
+    if codec == "copy" or codec in GPU_CODECS:
+        return False
+    # Sous-titres incrustés et filigrane sont calés sur la timeline complète
+    if job_settings.get("hardsub") or job_settings.get("watermark"):
+        return False
+    # Le mode taille cible répartit le débit sur toute la vidéo (two-pass)
+    if job_settings.get("target_size"):
+        return False
+    # Vidéo déjà conforme (mode "smart") : copiée, rien à paralléliser
+    plan = plan_streams(job_settings, info)
+    if plan and plan.copies_video:
+        return False
+    return True
+
+
+def segment_workers() -> int:
+    """Nombre de segments encodés en parallèle dans le budget de cœurs"""
+    budget = settings.SEGMENT_CORE_BUDGET or os.cpu_count() or 1
+    return max(1, budget // max(settings.SEGMENT_THREADS, 1))
+
+
+def segment_workdir(job_id: str) -> str:
+    return disk_manager.job_dir(job_id, SEGMENTS_DIR)
+
+
+def reset_workdir(workdir: str) -> None:
+    """Vide le répertoire de travail (segments d'une source ou de paramètres différents)"""
+    for entry in os.listdir(workdir):
+        path = os.path.join(workdir, entry)
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+        else:
+            os.remove(path)
+
+
+def split_command(source: str, workdir: str) -> List[str]:
+    """
+    Découpe la piste vidéo sans ré-encodage : le muxer segment ne coupe que sur
+    une image clé, à la première après chaque multiple de SEGMENT_DURATION.
+    """
+    return [
+        'ffmpeg', '-hide_banner', '-loglevel', 'error', '-y',
+        '-i', source,
+        '-map', '0:v:0', '-c', 'copy',
+        '-f', 'segment',
+        '-segment_time', str(settings.SEGMENT_DURATION),
+        '-reset_timestamps', '1',
+        '-segment_list', os.path.join(workdir, SEGMENT_LIST),
+        '-segment_list_type', 'csv',
+        os.path.join(workdir, 'src_%03d.mkv'),
+    ]
+
+
+def read_segments(workdir: str) -> List[Segment]:
+    """Segments produits par le découpage (nom, début, fin) dans l'ordre"""
+    segments = []
+    with open(os.path.join(workdir, SEGMENT_LIST), newline="") as f:
+        for index, row in enumerate(csv.reader(f)):
+            if len(row) < 3:
+                continue
+            segments.append(Segment(
+                index=index,
+                source=os.path.join(workdir, os.path.basename(row[0])),
+                start=float(row[1]),
+                end=float(row[2]),
+            ))
+    return segments
+
+
+async def starts_on_keyframe(path: str) -> bool:
+    """Vérifie que la première image vidéo d'un segment est une image clé"""
+    result = await run_tool([
+        'ffprobe', '-v', 'error', '-select_streams', 'v:0',
+        '-read_intervals', '%+#1',
+        '-show_entries', 'frame=key_frame',
+        '-of', 'csv=p=0', path
+    ], timeout=60)
+    return result.ok and result.text.strip().startswith("1")
+
+
+async def misaligned_segments(segments: List[Segment]) -> List[int]:
+    """Index des segments ne commençant pas sur une image clé"""
+    aligned = await asyncio.gather(*(starts_on_keyframe(segment.source) for segment in segments))
+    return [segment.index for segment, ok in zip(segments, aligned) if not ok]
+
+
+def segment_fingerprint(source: str, job_settings: Mapping[str, Any]) -> str:
+    """Empreinte de la source et des paramètres d'encodage d'un jeu de segments"""
+    st = os.stat(source)
+    payload = {
+        "size": st.st_size,
+        "mtime": st.st_mtime,
+        "segment_duration": settings.SEGMENT_DURATION,
+        "settings": {k: v for k, v in job_settings.items() if k not in RESUME_IGNORED_KEYS},
+    }
+    return hashlib.sha1(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class SegmentManifest:
+    """
+    Points de reprise d'un encodage segmenté.
+
+    Liste les segments découpés (vérifiés sur images clés) et les fichiers
+    encodés avec succès ; réécrit atomiquement après chaque fichier terminé.
+    """
+
+    def __init__(self, workdir: str, fingerprint: str, segments: List[Segment]):
+        self.workdir = workdir
+        self.fingerprint = fingerprint
+        self.segments = segments
+        self.completed: Dict[str, int] = {}
+
+    @property
+    def path(self) -> str:
+        return os.path.join(self.workdir, MANIFEST_FILE)
+
+    @classmethod
+    def load(cls, workdir: str, fingerprint: str) -> Optional["SegmentManifest"]:
+        """Manifeste existant, s'il correspond à la même source et aux mêmes paramètres"""
+        try:
+            with open(os.path.join(workdir, MANIFEST_FILE), "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if data.get("fingerprint") != fingerprint:
+            return None
+        segments = [
+            Segment(**dict(entry, source=os.path.join(workdir, entry["source"])))
+            for entry in data.get("segments", [])
+        ]
+        manifest = cls(workdir, fingerprint, segments)
+        manifest.completed = data.get("completed", {})
+        return manifest
+
+    def save(self) -> None:
+        data = {
+            "fingerprint": self.fingerprint,
+            "segments": [
+                dict(asdict(segment), source=os.path.basename(segment.source))
+                for segment in self.segments
+            ],
+            "completed": self.completed,
+        }
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.path)
+
+    def is_done(self, path: str) -> bool:
+        """Fichier encodé lors d'une tentative précédente et intact depuis"""
+        size = self.completed.get(os.path.basename(path))
+        return size is not None and os.path.exists(path) and os.path.getsize(path) == size
+
+    def mark_done(self, path: str) -> None:
+        self.completed[os.path.basename(path)] = os.path.getsize(path)
+        self.save()
+
+
+def write_concat_list(paths: List[str], list_path: str) -> str:
+    """Liste pour le démultiplexeur concat de FFmpeg"""
+    with open(list_path, "w") as f:
+        for path in paths:
+            escaped = os.path.abspath(path).replace("'", "'\\''")
+            f.write(f"file '{escaped}'\n")
+    return list_path
+
+
+def verify_output(source: MediaInfo, output: Optional[MediaInfo], tolerance: float) -> Optional[str]:
+    """
+    Compare la sortie assemblée à la source : durée vidéo identique et écart
+    audio/vidéo inchangé. Retourne le problème constaté, None si conforme.
+    """
+    if output is None or not output.video:
+        return "sortie illisible ou sans piste vidéo"
+
+    source_video = source.video[0].duration or source.duration
+    output_video = output.video[0].duration or output.duration
+    if abs(output_video - source_video) > tolerance:
+        return f"durée vidéo {output_video:.2f}s au lieu de {source_video:.2f}s"
+
+    if source.audio and output.audio:
+        source_drift = (source.audio[0].duration or source.duration) - source_video
+        output_drift = (output.audio[0].duration or output.duration) - output_video
+        if abs(output_drift - source_drift) > tolerance:
+            return f"décalage audio/vidéo de {output_drift - source_drift:+.2f}s"
+    return None
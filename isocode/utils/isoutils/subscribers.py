@@ -0,0 +1,101 @@
+import html
+from datetime import datetime
+from pyrogram.enums import ParseMode
+from isocode import logger, settings
+from isocode.utils.isoutils import events
+from isocode.utils.isoutils.events import TaskEvent, event_bus
+from isocode.utils.isoutils.metrics import metrics
+from isocode.utils.isoutils.queue import queue_system
+from isocode.utils.isoutils.dbutils import add_task_history
+from isocode.utils.telegram.message import send_msg, send_log
+
+TERMINAL_EVENTS = (events.FINISHED, events.FAILED, events.CANCELLED)
+LIFECYCLE_EVENTS = (events.QUEUED, events.STARTED, events.STAGE) + TERMINAL_EVENTS
+
+
+async def log_event(event: TaskEvent) -> None:
+    logger.debug(f"Événement {event.type}: {event.task_id} | étape={event.data.get('stage')}")
+
+
+async def record_metrics(event: TaskEvent) -> None:
+    """Débit par classe de ressources (durée média traitée / temps réel)"""
+    data = event.data
+    resource_class = data["resource_class"]
+    if event.type == events.QUEUED:
+        metrics.incr("jobs_queued", resource_class=resource_class)
+    elif event.type == events.STARTED:
+        metrics.observe("queue_wait_seconds", data.get("wait", 0), resource_class=resource_class)
+    elif event.type == events.FAILED:
+        metrics.incr("stage_failures", stage=data.get("stage"))
+        metrics.incr("jobs_failed", resource_class=resource_class)
+    elif event.type == events.FINISHED:
+        job = data["job"]
+        elapsed = (data.get("end_time") or event.timestamp) - (data.get("start_time") or event.timestamp)
+        metrics.incr("jobs_completed", resource_class=resource_class)
+        metrics.incr("busy_seconds", elapsed, resource_class=resource_class)
+        metrics.incr("media_seconds", job.duration or 0, resource_class=resource_class)
+        metrics.incr("bytes_in", job.file_size or 0, resource_class=resource_class)
+        metrics.observe("job_seconds", elapsed, resource_class=resource_class)
+
+
+async def track_progress(event: TaskEvent) -> None:
+    await queue_system.notify_progress(event.task_id, event.data.get("progress", 0))
+
+
+async def notify_user(event: TaskEvent) -> None:
+    job = event.data["job"]
+    if event.type == events.CANCELLED:
+        text = f"❌ Tâche d'encodage annulée: {event.task_id}"
+    else:
+        text = (
+            f"❌ Échec de l'étape {event.data.get('stage')}: {event.data.get('error')}\n"
+            f"ID Tâche: {event.task_id}\n"
+            f"♻️ Fichiers conservés, relance possible par un admin: /retry {event.task_id}"
+        )
+    await send_msg(job.get_client(), job.chat_id, text, reply_to=job.message_id)
+
+
+async def persist_history(event: TaskEvent) -> None:
+    data = event.data
+    job = data["job"]
+    record = job.to_dict()
+    record.update(
+        task_id=event.task_id,
+        status=data.get("status"),
+        stage=data.get("stage"),
+        resource_class=data.get("resource_class"),
+        error=data.get("error"),
+        gain=data.get("gain"),
+        start_time=data.get("start_time"),
+        end_time=data.get("end_time") or event.timestamp,
+        recorded_at=datetime.utcnow(),
+    )
+    await add_task_history(record)
+
+
+async def ship_to_log_channel(event: TaskEvent) -> None:
+    data = event.data
+    job = data["job"]
+    level = "INFO" if event.type == events.FINISHED else "ERROR"
+    elapsed = (data.get("end_time") or event.timestamp) - (data.get("start_time") or event.timestamp)
+    # HTML : _ * ` sans effet, seuls <, > et & des noms de fichiers et du stderr FFmpeg sont échappés
+    text = (
+        f"Tâche {event.task_id} : {data.get('status')}\n"
+        f"Fichier : {html.escape(job.file_name or job.filepath)}\n"
+        f"Utilisateur : {job.user_id} | Chat : {job.chat_id}\n"
+        f"Classe : {data.get('resource_class')} | Durée : {elapsed:.0f}s"
+    )
+    if data.get("error"):
+        text += f"\nÉtape : {data.get('stage')} | Erreur : {html.escape(str(data.get('error')))}"
+    await send_log(job.get_client(), text, level=level, parse=ParseMode.HTML)
+
+
+def setup_event_subscribers() -> None:
+    """Branche les abonnés du cycle de vie des tâches sur le bus d'événements"""
+    event_bus.subscribe("log", log_event, LIFECYCLE_EVENTS, maxsize=500)
+    event_bus.subscribe("metrics", record_metrics, LIFECYCLE_EVENTS, maxsize=1000)
+    event_bus.subscribe("progress", track_progress, [events.PROGRESS], maxsize=50)
+    event_bus.subscribe("notify", notify_user, [events.FAILED, events.CANCELLED], maxsize=200, workers=2)
+    event_bus.subscribe("history", persist_history, TERMINAL_EVENTS, maxsize=500)
+    if settings.LOG_CHANNELS:
+        event_bus.subscribe("log_channel", ship_to_log_channel, [events.FINISHED, events.FAILED], maxsize=100)
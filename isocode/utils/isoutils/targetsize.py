@@ -0,0 +1,103 @@
+import os
+import re
+from dataclasses import dataclass
+from typing import Any, Mapping, Optional
+from isocode import settings
+from isocode.utils.isoutils.probe import MediaInfo, probe
+from isocode.utils.isoutils.progress import humanbytes
+from isocode.utils.isoutils.remux import selected_audio
+
+MB = 1024 * 1024
+GB = 1024 * MB
+
+# Encodeurs logiciels gérant le two-pass (journal de première passe)
+TWO_PASS_CODECS = {"libx264", "libx265"}
+# Codecs audio dont le débit ne se règle pas : le débit de la source sert d'estimation
+SOURCE_BITRATE_AUDIO = {"copy", "flac"}
+DEFAULT_AUDIO_KBPS = 192
+
+SIZE_PATTERN = re.compile(r"^(\d+(?:[.,]\d+)?)\s*([kmg]?)(?:i?[bo])?$", re.I)
+SIZE_UNITS = {"": MB, "k": 1024, "m": MB, "g": GB}
+
+
+class TargetSizeError(ValueError):
+    """Taille cible inatteignable (durée trop longue, audio trop lourd...)"""
+
+
+def parse_size(text: str) -> Optional[int]:
+    """Convertit une taille saisie ("700M", "1.5G", "700 Mo", "700") en octets (Mo par défaut)"""
+    match = SIZE_PATTERN.match((text or "").strip())
+    if not match:
+        return None
+    value = float(match.group(1).replace(",", "."))
+    return int(value * SIZE_UNITS[match.group(2).lower()]) or None
+
+
+def size_cap() -> int:
+    """Taille max d'un envoi Telegram (TG_SPLIT_SIZE)"""
+    return int(settings.TG_SPLIT_SIZE * GB)
+
+
+def _kbps(value: str) -> float:
+    match = re.match(r"^(\d+(?:\.\d+)?)\s*([km]?)", str(value or ""), re.I)
+    if not match:
+        return DEFAULT_AUDIO_KBPS
+    rate = float(match.group(1))
+    unit = match.group(2).lower()
+    return rate * 1000 if unit == "m" else rate if unit == "k" else rate / 1000
+
+
+def audio_kbps(job_settings: Mapping[str, Any], info: MediaInfo) -> float:
+    """Débit audio total de la sortie, selon les pistes gardées et le codec choisi"""
+    tracks = selected_audio(job_settings, info)
+    if not tracks:
+        return 0.0
+
+    codec = job_settings.get("audio_codec", "aac")
+    if codec in SOURCE_BITRATE_AUDIO:
+        return sum((track.bit_rate / 1000) or DEFAULT_AUDIO_KBPS for track in tracks)
+    return _kbps(job_settings.get("audio_bitrate", "192k")) * len(tracks)
+
+
+@dataclass(frozen=True)
+class SizePlan:
+    """Débits calculés pour tenir dans une taille cible"""
+    target: int
+    duration: float
+    video_kbps: int
+    audio_kbps: float
+
+    @property
+    def predicted(self) -> int:
+        """Taille prévue (octets) : débits x durée, surcoût du conteneur inclus"""
+        payload = (self.video_kbps + self.audio_kbps) * 1000 / 8 * self.duration
+        return int(payload / (1 - settings.TARGET_SIZE_OVERHEAD))
+
+
+def plan_target_size(job_settings: Mapping[str, Any], info: Optional[MediaInfo]) -> SizePlan:
+    """
+    Débit vidéo permettant de tenir dans la taille demandée (plafonnée à
+    TG_SPLIT_SIZE), déduction faite de l'audio et du surcoût du conteneur.
+    """
+    if not info or info.duration <= 0:
+        raise TargetSizeError("durée de la vidéo inconnue")
+    target = min(job_settings.get("target_size") or size_cap(), size_cap())
+    audio = audio_kbps(job_settings, info)
+    budget_kbps = target * (1 - settings.TARGET_SIZE_OVERHEAD) * 8 / 1000 / info.duration
+    video = int(budget_kbps - audio)
+    if video < settings.TARGET_MIN_VIDEO_BITRATE:
+        raise TargetSizeError(
+            f"{humanbytes(target)} pour {info.duration / 60:.0f} min laisse {max(video, 0)} kb/s à la vidéo "
+            f"(minimum {settings.TARGET_MIN_VIDEO_BITRATE} kb/s)"
+        )
+    return SizePlan(target=target, duration=info.duration, video_kbps=video, audio_kbps=audio)
+
+
+async def size_report(job_settings: Mapping[str, Any], source_path: str, output_path: str) -> str:
+    """Taille cible, prévue et obtenue d'un encodage en mode taille cible"""
+    plan = plan_target_size(job_settings, await probe(source_path))
+    actual = os.path.getsize(output_path)
+    return (
+        f"🎯 Cible: {humanbytes(plan.target)} | Prévue: {humanbytes(plan.predicted)} | "
+        f"Obtenue: {humanbytes(actual)} ({(actual - plan.predicted) / plan.predicted:+.1%})"
+    )
@@ -0,0 +1,119 @@
+import asyncio
+import time
+from typing import Any, Dict, Mapping, Optional
+from isocode import logger, settings
+from isocode.utils.isoutils.metrics import metrics
+from isocode.utils.isoutils.process import ManagedProcess, process_registry
+from isocode.utils.isoutils.resources import classify
+
+STALLED = "stalled"
+TIMEOUT = "timeout"
+
+# Équivalents logiciels des encodeurs matériels
+SOFTWARE_CODECS = {
+    "h264_nvenc": "libx264",
+    "hevc_nvenc": "libx265",
+}
+
+
+class EncodeStalled(Exception):
+    """Encodage arrêté par le chien de garde (blocage ou dépassement de durée)"""
+
+    def __init__(self, task_id: str, reason: str):
+        super().__init__(f"Encodage {task_id} arrêté par le chien de garde ({reason})")
+        self.task_id = task_id
+        self.reason = reason
+
+
+def max_runtime(job_settings: Mapping[str, Any], duration: float) -> Optional[float]:
+    """Durée d'exécution max d'un encodage, proportionnelle à la durée et à la vitesse attendue"""
+    if not duration:
+        return None
+    expected = duration / classify(job_settings, duration).expected_speed
+    return max(settings.ENCODE_TIMEOUT_MIN, expected * settings.ENCODE_TIMEOUT_FACTOR)
+
+
+def safe_settings(job_settings: Mapping[str, Any]) -> Dict[str, Any]:
+    """Paramètres de repli après un blocage : pas d'accélération matérielle"""
+    overrides = {"hwaccel": "none"}
+    codec = job_settings.get("video_codec")
+    if codec in SOFTWARE_CODECS:
+        overrides["video_codec"] = SOFTWARE_CODECS[codec]
+    return overrides
+
+
+class EncodeWatchdog:
+    """
+    Chien de garde des encodages FFmpeg.
+
+    - Blocage : out_time n'avance plus depuis STALL_TIMEOUT secondes (pour un
+      groupe : aucun de ses processus enfants n'avance)
+    - Dépassement : temps d'exécution (pauses exclues) supérieur à la durée max
+    Le groupe de processus est tué avec un motif ; l'étape d'encodage décide
+    ensuite de relancer en mode sûr ou d'échouer.
+    """
+
+    def __init__(self, interval: int, stall_timeout: int):
+        self.interval = max(interval, 5)
+        self.stall_timeout = stall_timeout
+        self._task: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def last_advance(managed: ManagedProcess, now: float) -> float:
+        """
+        Dernière avancée de out_time. Un groupe avance tant que l'un de ses
+        enfants avance (vidéo, audio, segments) ; sans enfant en cours (analyses
+        loudness, assemblage), ses commandes sont bornées par le délai de l'exécuteur.
+        """
+        if not managed.is_group:
+            return managed.last_advance_at
+        children = process_registry.children(managed.task_id)
+        if not children:
+            return now
+        return max([managed.last_advance_at] + [child.last_advance_at for child in children])
+
+    def diagnose(self, managed: ManagedProcess, now: Optional[float] = None) -> Optional[str]:
+        now = now or time.time()
+        if managed.is_paused or managed.detached or managed.kill_reason:
+            return None
+        if now - self.last_advance(managed, now) > self.stall_timeout:
+            return STALLED
+        if managed.max_runtime and managed.active_seconds(now) > managed.max_runtime:
+            return TIMEOUT
+        return None
+
+    def check(self) -> None:
+        now = time.time()
+        for managed in list(process_registry.processes.values()):
+            reason = self.diagnose(managed, now)
+            if not reason:
+                continue
+            logger.warning(
+                f"Chien de garde: encodage {managed.task_id} {reason} "
+                f"(out_time={managed.out_time:.0f}s, actif={managed.active_seconds(now):.0f}s), arrêt forcé"
+            )
+            metrics.incr("encode_watchdog_kills", reason=reason)
+            process_registry.kill(managed.task_id, reason=reason)
+
+    async def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name="EncodeWatchdog")
+
+    async def stop(self) -> None:
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                self.check()
+            except Exception as e:
+                logger.error(f"Erreur du chien de garde: {e}", exc_info=True)
+
+
+watchdog = EncodeWatchdog(interval=settings.WATCHDOG_INTERVAL, stall_timeout=settings.STALL_TIMEOUT)
@@ -0,0 +1,225 @@
+import asyncio
+import glob
+import hashlib
+import os
+import re
+import shutil
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+from PIL import Image, ImageChops
+from isocode import logger, watermark_dir
+from isocode.utils.database.database import Resolution
+from isocode.utils.isoutils.executor import ToolError, run_tool
+from isocode.utils.isoutils.fonts import escape_filter_path
+from isocode.utils.isoutils.metrics import metrics
+from isocode.utils.isoutils.probe import MediaInfo
+
+# Script ASS du filigrane (PlayRes 1920x1080, mis à l'échelle par libass)
+WATERMARK_SCRIPT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "extras", "watermark.ass"))
+# Sous-répertoire du cache recevant les rendus en cours
+INCOMING_DIR = ".incoming"
+RENDER_TIMEOUT = 60 # in seconds
+RENDER_RATE = 25
+# Rendus mis en cache : <empreinte du script>-<largeur>x<hauteur>+<x>+<y>.png
+RENDER_PATTERN = re.compile(r"-(\d+)x(\d+)\+(\d+)\+(\d+)\.png$")
+TIME_PATTERN = re.compile(r"(\d+):(\d{1,2}):(\d{1,2}(?:\.\d+)?)")
+
+
+def _ass_time(value: str) -> float:
+    """Horodatage ASS H:MM:SS.cc en secondes"""
+    match = TIME_PATTERN.fullmatch(value.strip())
+    if not match:
+        raise ValueError(f"horodatage ASS invalide: {value}")
+    hours, minutes, seconds = match.groups()
+    return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+
+def script_windows(path: str) -> List[Tuple[float, float]]:
+    """Intervalles d'affichage des lignes Dialogue du script"""
+    windows = []
+    with open(path, encoding="utf-8-sig", errors="ignore") as f:
+        for line in f:
+            if not line.startswith("Dialogue:"):
+                continue
+            fields = line.split(":", 1)[1].split(",", 9)
+            try:
+                windows.append((_ass_time(fields[1]), _ass_time(fields[2])))
+            except (IndexError, ValueError):
+                continue
+    return sorted(windows)
+
+
+def legacy_filter() -> str:
+    """Rendu libass à chaque image (repli si le PNG n'a pas pu être produit)"""
+    return f"subtitles='{escape_filter_path(WATERMARK_SCRIPT)}'"
+
+
+def output_size(job_settings: Mapping[str, Any], info: Optional[MediaInfo]) -> Tuple[int, int]:
+    """Définition de la vidéo en sortie, celle de la source sans redimensionnement"""
+    resolution = Resolution(job_settings.get("resolution", "original"))
+    if resolution != Resolution.ORIGINAL:
+        return resolution.width, resolution.height
+    if info and info.video:
+        return info.width, info.height
+    return 0, 0
+
+
+@dataclass(frozen=True)
+class WatermarkOverlay:
+    """Filigrane pré-rendu pour une définition : PNG RGBA recadré et sa position"""
+    path: str
+    x: int
+    y: int
+    windows: Tuple[Tuple[float, float], ...]
+
+    def overlay_filter(self) -> str:
+        """overlay actif sur les seuls intervalles du script (t suit la timeline de la source)"""
+        vf = f"overlay=x={self.x}:y={self.y}:eof_action=repeat"
+        if self.windows:
+            vf += ":enable='" + "+".join(f"between(t,{start:g},{end:g})" for start, end in self.windows) + "'"
+        return vf
+
+
+def attach(chain: str, overlay: Optional[WatermarkOverlay], output: str = "", tag: str = "") -> str:
+    """
+    Filigrane ajouté en fin de chaîne de filtres vidéo. Avec un PNG pré-rendu,
+    la chaîne devient un graphe : movie lit l'image une fois, overlay la répète.
+    Sans rendu disponible, libass dessine le script à chaque image.
+
+    :param output: étiquette de sortie (graphe -filter_complex), aucune pour -vf
+    :param tag: suffixe des étiquettes internes, unique par sortie du graphe
+    """
+    label = f"[{output}]" if output else ""
+    if overlay is None:
+        return f"{chain},{legacy_filter()}{label}" if chain else f"{legacy_filter()}{label}"
+    base, image = f"wmbase{tag}", f"wm{tag}"
+    return (
+        f"{chain or 'null'}[{base}];movie='{escape_filter_path(overlay.path)}'[{image}];"
+        f"[{base}][{image}]{overlay.overlay_filter()}{label}"
+    )
+
+
+def _matte(black_path: str, white_path: str, width: int, height: int, prefix: str) -> Optional[Tuple[str, int, int]]:
+    """
+    Couche alpha par différence des rendus sur fond noir et sur fond blanc
+    (alpha = 1 - (blanc - noir)), couleurs dé-prémultipliées, image recadrée
+    sur les pixels visibles. None si le script n'affiche rien.
+    """
+    with Image.open(black_path) as black, Image.open(white_path) as white:
+        black = black.convert("RGB")
+        white = white.convert("RGB")
+    alpha = ImageChops.invert(ImageChops.subtract(white, black).convert("L"))
+    box = alpha.getbbox()
+    if not box:
+        return None
+    red, green, blue = black.split()
+    image = Image.merge("RGBa", (red, green, blue, alpha)).convert("RGBA").crop(box)
+    x, y = box[0], box[1]
+    path = f"{prefix}-{width}x{height}+{x}+{y}.png"
+    partial = os.path.join(os.path.dirname(black_path), os.path.basename(path))
+    image.save(partial, "PNG")
+    os.replace(partial, path)
+    return path, x, y
+
+
+class WatermarkCache:
+    """
+    Filigranes pré-rendus par définition de sortie, sur disque et en mémoire.
+    Le nom des fichiers porte l'empreinte du script : le modifier invalide les rendus.
+    """
+
+    def __init__(self, root: str, script: str):
+        self.root = root
+        self.script = script
+        self.overlays: Dict[Tuple[int, int], WatermarkOverlay] = {}
+        self.locks: Dict[Tuple[int, int], asyncio.Lock] = {}
+        self._digest: Optional[str] = None
+        self._windows: Tuple[Tuple[float, float], ...] = ()
+
+    def _load_script(self) -> str:
+        if self._digest is None:
+            with open(self.script, "rb") as f:
+                self._digest = hashlib.sha256(f.read()).hexdigest()[:16]
+            self._windows = tuple(script_windows(self.script))
+        return self._digest
+
+    def _cached(self, digest: str, width: int, height: int) -> Optional[WatermarkOverlay]:
+        for path in glob.glob(os.path.join(self.root, f"{digest}-{width}x{height}+*.png")):
+            match = RENDER_PATTERN.search(path)
+            if match:
+                return WatermarkOverlay(path, int(match.group(3)), int(match.group(4)), self._windows)
+        return None
+
+    async def overlay(self, width: int, height: int) -> Optional[WatermarkOverlay]:
+        """Filigrane pour la définition donnée, rendu à la première demande"""
+        if width <= 0 or height <= 0:
+            return None
+        key = (width, height)
+        lock = self.locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            overlay = self.overlays.get(key)
+            if overlay and os.path.exists(overlay.path):
+                metrics.incr("watermark_cache_hits")
+                return overlay
+            try:
+                digest = self._load_script()
+            except OSError as e:
+                logger.warning(f"Script de filigrane illisible ({self.script}): {e}")
+                return None
+            overlay = self._cached(digest, width, height)
+            if overlay is None:
+                metrics.incr("watermark_cache_misses")
+                overlay = await self._render(digest, width, height)
+            if overlay:
+                self.overlays[key] = overlay
+            return overlay
+
+    async def _render(self, digest: str, width: int, height: int) -> Optional[WatermarkOverlay]:
+        """
+        Rendu libass d'une image du script sur fond noir et sur fond blanc (un
+        seul processus FFmpeg), à l'instant milieu de la première ligne affichée.
+        Position et taille découlent de la mise à l'échelle PlayRes -> définition.
+        """
+        start, end = self._windows[0] if self._windows else (0.0, 1.0)
+        at = (start + end) / 2
+        source = f"subtitles='{escape_filter_path(self.script)}',trim=start={at:.3f},setpts=PTS-STARTPTS"
+        graph = ";".join(
+            f"color=c={color}:s={width}x{height}:r={RENDER_RATE}:d={at + 1:.3f},format=rgb24,{source}[{color}]"
+            for color in ("black", "white")
+        )
+        incoming = os.path.join(self.root, INCOMING_DIR, f"{os.getpid()}-{time.time_ns()}")
+        os.makedirs(incoming, exist_ok=True)
+        black, white = os.path.join(incoming, "black.png"), os.path.join(incoming, "white.png")
+        cmd = [
+            'ffmpeg', '-hide_banner', '-loglevel', 'error', '-y',
+            '-filter_complex', graph,
+            '-map', '[black]', '-frames:v', '1', black,
+            '-map', '[white]', '-frames:v', '1', white
+        ]
+        try:
+            try:
+                await run_tool(cmd, timeout=RENDER_TIMEOUT, capture_stdout=False, check=True)
+            except ToolError as e:
+                logger.warning(f"Rendu du filigrane {width}x{height} impossible: {e}")
+                return None
+            loop = asyncio.get_event_loop()
+            try:
+                rendered = await loop.run_in_executor(
+                    None, _matte, black, white, width, height, os.path.join(self.root, digest)
+                )
+            except OSError as e:
+                logger.warning(f"Rendu du filigrane {width}x{height} illisible: {e}")
+                return None
+        finally:
+            shutil.rmtree(incoming, ignore_errors=True)
+
+        if rendered is None:
+            logger.warning(f"Filigrane vide en {width}x{height}, script {self.script}")
+            return None
+        path, x, y = rendered
+        logger.info(f"Filigrane pré-rendu en {width}x{height}: {os.path.basename(path)}")
+        return WatermarkOverlay(path, x, y, self._windows)
+
+
+watermark_cache = WatermarkCache(watermark_dir, WATERMARK_SCRIPT)
@@ -1,6 +1,7 @@
 from pyrogram import Client
 from config import settings, logger
 from isocode.utils.isoutils.progress import create_progress_bar, humanbytes
+from isocode.utils.isoutils.executor import ToolError, ToolNotFound, run_tool
 import os
 import hashlib
 import zipfile
@@ -11,7 +12,6 @@ import tempfile
 import re
 from typing import Tuple, Optional, Dict, List, Union, BinaryIO, Callable
 from pathlib import Path
-import subprocess
 import mimetypes
 import aiohttp
 import aiofiles
@@ -451,7 +451,7 @@ def get_file_info(file_path: str) -> Dict[str, Union[str, int]]:
         "mime_type": get_mime_type(str(file_path))
     }
 
-def create_thumbnail(
+async def create_thumbnail(
     video_path: str,
     output_path: str,
     size: Tuple[int, int] = (320, 320),
@@ -472,9 +472,6 @@ def create_thumbnail(
     if not video_path.exists():
         raise FileNotFoundError(f"Fichier source introuvable: {video_path}")
 
-    if not shutil.which("ffmpeg"):
-        raise RuntimeError("ffmpeg n'est pas installé ou n'est pas dans le PATH")
-
     width, height = size
     quality_val = max(2, min(31, 31 - quality // 3))  # Conversion qualité ffmpeg
 
@@ -491,16 +488,11 @@ def create_thumbnail(
     ]
 
     try:
-        subprocess.run(
-            ffmpeg_cmd,
-            check=True,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True
-        )
-    except subprocess.CalledProcessError as e:
-        error_msg = e.stderr if isinstance(e.stderr, str) else e.stderr.decode()
-        raise RuntimeError(f"Erreur ffmpeg: {error_msg}") from e
+        await run_tool(ffmpeg_cmd, timeout=60, check=True)
+    except ToolNotFound as e:
+        raise RuntimeError("ffmpeg n'est pas installé ou n'est pas dans le PATH") from e
+    except ToolError as e:
+        raise RuntimeError(f"Erreur ffmpeg: {e.stderr or e}") from e
 
     if not Path(output_path).exists():
         raise RuntimeError("La miniature n'a pas été créée.")
@@ -15,14 +15,13 @@ from pyrogram.types import (
     InputMediaDocument,
     InputMediaAnimation,
 )
-from isocode import logger, settings
+from isocode import logger, settings, scratch_dir
 from isocode.utils.isoutils.progress import create_progress_bar, humanbytes
 from isocode.utils.telegram.message import send_msg, send_log, send_progress
 from typing import Optional, Union, List, Callable, BinaryIO
 import asyncio
 import os
 import time
-import tempfile
 from isocode.utils.isoutils.ffmpeg import (
     encode_video,
     get_ffmpeg_video_width_and_height,
@@ -166,8 +165,7 @@ async def _upload_media_single(
 
             if not thumb:
                 try:
-                    temp_dir = tempfile.gettempdir()
-                    temp_thumb = await get_thumbnail(file_path, temp_dir, 5)
+                    temp_thumb = await get_thumbnail(file_path, scratch_dir, 5)
                     if temp_thumb and os.path.exists(temp_thumb):
                         thumb = temp_thumb
                         logger.info(f"Miniature générée automatiquement: {thumb}")
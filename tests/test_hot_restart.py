@@ -0,0 +1,136 @@
+"""
+Redémarrage à chaud : la file est exportée pendant un encodage puis reprise
+par une nouvelle file. Les commandes FFmpeg sont remplacées par `sleep` : le
+test porte sur ce que l'état exporté permet de ré-adopter, pas sur l'encodage.
+"""
+import asyncio
+import json
+import os
+from types import SimpleNamespace
+
+import pytest
+
+from isocode.utils.isoutils import ffmpeg, process
+from isocode.utils.isoutils.disk import disk_manager
+from isocode.utils.isoutils.job import JobRecord, snapshot_settings
+from isocode.utils.isoutils.process import process_registry
+from isocode.utils.isoutils.queue import EncodingQueue, EncodingTask
+from isocode.utils.isoutils.targetsize import SizePlan
+
+FAKE_COMMAND = ["sleep", "30"]
+
+
+def job(**job_settings) -> JobRecord:
+    return JobRecord(
+        chat_id=-100123,
+        message_id=1,
+        status_message_id=2,
+        user_id=42,
+        filepath="/app/download/42/source.mkv",
+        settings=snapshot_settings({"video_codec": "libx264", "preset": "veryfast", **job_settings}),
+        duration=1400.0,
+    )
+
+
+@pytest.fixture(autouse=True)
+def sandbox(tmp_path, monkeypatch):
+    """Répertoires, registre et suivi disque isolés ; progression jamais terminée"""
+    monkeypatch.setattr(process, "RUNTIME_DIR", str(tmp_path / "ffmpeg"))
+    monkeypatch.setattr(process_registry, "processes", {})
+    monkeypatch.setattr(disk_manager, "jobs_root", str(tmp_path / "jobs"))
+    monkeypatch.setattr(disk_manager, "manifest_path", str(tmp_path / "manifest.json"))
+    monkeypatch.setattr(disk_manager, "artifacts", {})
+    monkeypatch.setattr(ffmpeg, "encode_dir", str(tmp_path / "encode"))
+
+    async def follow_forever(*args, **kwargs):
+        await asyncio.sleep(3600)
+
+    monkeypatch.setattr(ffmpeg, "handle_progress", follow_forever)
+    yield tmp_path
+    for managed in list(process_registry.processes.values()):
+        if managed.pid:
+            process_registry.kill(managed.task_id)
+
+
+@pytest.fixture
+def fake_ffmpeg(monkeypatch):
+    """Commandes construites sans ffprobe ni ffmpeg"""
+    async def build(*args, **kwargs):
+        return list(FAKE_COMMAND)
+
+    async def no_probe(filepath):
+        return None
+
+    monkeypatch.setattr(ffmpeg.FFmpegCommandBuilder, "build_command", staticmethod(build))
+    monkeypatch.setattr(ffmpeg.FFmpegCommandBuilder, "build_multi_command", staticmethod(build))
+    monkeypatch.setattr(ffmpeg, "probe", no_probe)
+
+
+async def hot_restart(encode, task_id: str) -> EncodingQueue:
+    """
+    Lance `encode`, exporte la file dès que son premier processus tourne, puis
+    reprend l'état (passé par JSON, comme sur disque) dans une nouvelle file.
+    """
+    running = asyncio.ensure_future(encode)
+    while not process_registry.get(task_id):
+        await asyncio.sleep(0.01)
+
+    old = EncodingQueue()
+    old.active_tasks[task_id] = EncodingTask(id=task_id, job=job(), status="PROCESSING", stage="encode")
+    state = json.loads(json.dumps(await old.export_state(), default=str))
+    running.cancel()
+    await asyncio.gather(running, return_exceptions=True)
+
+    # Nouvelle instance du bot : registre vide, tâches ré-adoptées suivies sans être exécutées
+    process_registry.processes.clear()
+    new = EncodingQueue()
+    new._launch = lambda task: new.active_tasks.__setitem__(task.id, task)
+    await new.import_state(state)
+    return new
+
+
+def test_encode_adopted_with_its_deliverable(sandbox):
+    output = str(sandbox / "encode" / "sortie.mkv")
+    queue = asyncio.run(hot_restart(
+        ffmpeg._run_encode(job(), "T1", FAKE_COMMAND, {}, output, output),
+        "T1"
+    ))
+    task = queue.active_tasks["T1"]
+    assert task.adopted
+    assert task.output_file == output
+
+
+def test_intermediate_pass_not_adopted(sandbox):
+    queue = asyncio.run(hot_restart(
+        ffmpeg._run_encode(job(), "T1", FAKE_COMMAND, {}, os.devnull, None),
+        "T1"
+    ))
+    assert not queue.active_tasks
+    assert [task.id for task in queue.queue] == ["T1"]
+    assert queue.queue[0].output_file is None
+
+
+def test_target_size_first_pass_not_adopted(sandbox, fake_ffmpeg, monkeypatch):
+    monkeypatch.setattr(
+        ffmpeg, "plan_target_size",
+        lambda job_settings, info: SizePlan(target=50 << 20, duration=1400.0, video_kbps=200, audio_kbps=96)
+    )
+    record = job(target_size="50M")
+    output = str(sandbox / "encode" / "sortie.mkv")
+    queue = asyncio.run(hot_restart(ffmpeg.encode_target_size(record, "T1", dict(record.settings), output), "T1"))
+    # Première passe (-f null /dev/null) : rien à envoyer, l'encodage est repris depuis le début
+    assert not queue.active_tasks
+    assert queue.queue[0].output_file is None
+
+
+def test_renditions_adopted_with_their_directory(sandbox, fake_ffmpeg, monkeypatch):
+    async def source(filepath):
+        return SimpleNamespace(video=[object()], height=1080, duration=1400.0)
+
+    monkeypatch.setattr(ffmpeg, "probe", source)
+    record = job(renditions=["1080p", "720p", "480p"])
+    queue = asyncio.run(hot_restart(ffmpeg.encode_renditions(record, "T1", dict(record.settings)), "T1"))
+    # _send_renditions liste ce répertoire : une seule rendition ne doit pas tenir lieu de sortie
+    task = queue.active_tasks["T1"]
+    assert task.adopted
+    assert task.output_file == os.path.join(ffmpeg.encode_dir, "T1")